@@ -1,3 +1,5 @@
+import utils.res as res
+
 audio = None
 
 
@@ -8,3 +10,9 @@ def set_audio(player):
 
 def get_audio():
     return audio
+
+
+def play_effect(name):
+    """Mix a UI sound (a file in res/wav) into whatever is playing."""
+    if audio is not None:
+        return audio.play_effect(res.WAV_DIR + name)
@@ -0,0 +1,104 @@
+"""
+IMA ADPCM (WAV format 0x11) decoding.
+
+A 4-bit ADPCM stream is a quarter of the size of 16-bit PCM, so SD reads
+and Wi-Fi traffic drop accordingly. The data is a sequence of independent
+blocks of `block_align` bytes. Each block starts with a 4-byte header per
+channel (first sample as int16, step index, reserved) followed by the
+channels' nibbles interleaved in 4-byte groups, low nibble first.
+
+AdpcmDecoder is a pipeline stage like audio_dsp.WidthConverter: it decodes
+whole blocks to signed 16-bit PCM and chains in front of the Resampler.
+tools/adpcm_encode.py converts assets and holds the reference decoder that
+tools/dsp_benchmark.py checks this one against.
+"""
+
+from array import array
+
+_STEPS = array("H", (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41,
+    45, 50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190,
+    209, 230, 253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724,
+    796, 876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272,
+    2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132,
+    7845, 8630, 9493, 10442, 11487, 12635, 13899, 15289, 16818, 18500,
+    20350, 22385, 24623, 27086, 29794, 32767,
+))
+
+# Step index adjustment for the low three bits of a nibble, biased by one
+# so the table fits a ptr8.
+_INDEX_ADJ = bytes((0, 0, 0, 0, 3, 5, 7, 9))
+
+
+@micropython.viper
+def adpcm_decode_viper(src: ptr8, blocks: int, dst: ptr16, st: ptr32) -> int:
+    steps = ptr16(_STEPS)
+    adj = ptr8(_INDEX_ADJ)
+    align = int(st[0])
+    ch = int(st[1])
+    groups = (align // ch - 4) // 4
+    spb = groups * 8 + 1
+    out = 0
+    for b in range(blocks):
+        base = b * align
+        for c in range(ch):
+            h = base + c * 4
+            pred = ((int(src[h]) | (int(src[h + 1]) << 8)) ^ 0x8000) - 0x8000
+            idx = int(src[h + 2])
+            if idx > 88:
+                idx = 88
+            o = out + c
+            dst[o] = pred & 0xFFFF
+            o += ch
+            for g in range(groups):
+                p = base + ch * 4 + (g * ch + c) * 4
+                for k in range(8):
+                    nib = (int(src[p + (k >> 1)]) >> ((k & 1) << 2)) & 0xF
+                    step = int(steps[idx])
+                    diff = step >> 3
+                    if nib & 1:
+                        diff += step >> 2
+                    if nib & 2:
+                        diff += step >> 1
+                    if nib & 4:
+                        diff += step
+                    if nib & 8:
+                        pred -= diff
+                        if pred < -32768:
+                            pred = -32768
+                    else:
+                        pred += diff
+                        if pred > 32767:
+                            pred = 32767
+                    idx += int(adj[nib & 7]) - 1
+                    if idx < 0:
+                        idx = 0
+                    elif idx > 88:
+                        idx = 88
+                    dst[o] = pred & 0xFFFF
+                    o += ch
+        out += spb * ch
+    return out
+
+
+class AdpcmDecoder:
+    """IMA ADPCM blocks to 16-bit PCM; converts whole blocks only."""
+    identity = False
+
+    def __init__(self):
+        self._st = array("i", [0, 1])
+        self.block = 0
+        self.out_block = 0
+
+    def configure(self, block_align, channels):
+        self._st[0] = block_align
+        self._st[1] = channels
+        self.block = block_align
+        self.out_block = ((block_align // channels - 4) * 2 + 1) * channels * 2
+
+    def in_bytes(self, out_bytes):
+        return (out_bytes // self.out_block) * self.block
+
+    def convert(self, src, n, dst):
+        blocks = min(n // self.block, len(dst) // self.out_block)
+        return adpcm_decode_viper(src, blocks, dst, self._st) * 2
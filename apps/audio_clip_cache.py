@@ -0,0 +1,151 @@
+import os
+import uasyncio as asyncio
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ucollections import OrderedDict
+
+from audio_sources.file_wav_source import FileWavSource
+from audio_sources.wav import parse_wav_bytes
+from utils import trace
+from utils.trace import CAT_AUDIO, DEBUG_ERROR
+
+
+class MemoryWavSource:
+    """Serves a cached clip like FileWavSource, with its header pre-parsed."""
+
+    def __init__(self, clip, info=None, offset_bytes=0):
+        self.clip = clip
+        self.info = info
+        self.offset_bytes = offset_bytes if offset_bytes and offset_bytes > 0 else 0
+        self._mv = None
+        self._pos = 0
+
+    async def open(self):
+        self._mv = memoryview(self.clip)
+        self._pos = 0
+
+    async def seek_data_offset(self, data_start, offset_bytes):
+        if self._mv is not None:
+            offset = offset_bytes if offset_bytes and offset_bytes > 0 else 0
+            self._pos = min(len(self._mv), data_start + offset)
+
+    async def readinto(self, mv):
+        n = min(len(mv), len(self._mv) - self._pos)
+        if n <= 0:
+            return 0
+        mv[:n] = self._mv[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    async def close(self):
+        self._mv = None
+
+
+class AudioClipCache:
+    """
+    Memory-budgeted LRU pool of short WAV clips.
+
+    source(path) returns a MemoryWavSource for cached clips. A miss plays
+    from a FileWavSource and queues the file to be loaded in the
+    background, so a UI handler never waits for the card; small files (up
+    to `max_clip` bytes) then play from RAM next time. preload() warms the
+    pool the same way so the first announcement already plays from RAM.
+    Least recently used clips are evicted to make room.
+    """
+    BUDGET = 160 * 1024
+    MAX_CLIP = 48 * 1024
+
+    def __init__(self, budget=BUDGET, max_clip=MAX_CLIP):
+        self.budget = budget
+        self.max_clip = max_clip
+        self._clips = OrderedDict()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._pending = []
+        self._loading = False
+
+    def get(self, path):
+        clip = self._clips.pop(path, None)
+        if clip is not None:
+            self._clips[path] = clip    # most recently used goes last
+        return clip
+
+    def _evict_for(self, size):
+        while self._clips and self.used + size > self.budget:
+            path = next(iter(self._clips))
+            self.used -= len(self._clips.pop(path)[0])
+            self.evictions += 1
+
+    def load(self, path, evict=True):
+        """Read `path` into the pool; returns (clip, info) or None if unsuitable."""
+        clip = self.get(path)
+        if clip is not None:
+            return clip
+        try:
+            size = os.stat(path)[6]
+            if size > self.max_clip or size > self.budget:
+                return None
+            if not evict and self.used + size > self.budget:
+                return None
+            # Evict before allocating, so pool + new clip stay within budget.
+            self._evict_for(size)
+            clip = bytearray(size)
+            with open(path, "rb") as f:
+                n = f.readinto(clip)
+            if n < size:
+                return None
+            info = parse_wav_bytes(clip)
+        except (OSError, ValueError) as e:
+            trace.log(CAT_AUDIO, DEBUG_ERROR, "clip load error:", path, type(e).__name__, e)
+            return None
+        self._clips[path] = (clip, info)
+        self.used += size
+        return self._clips[path]
+
+    def source(self, path):
+        clip = self.get(path)
+        if clip is None:
+            self.misses += 1
+            self._queue(path)
+            return FileWavSource(path)
+        self.hits += 1
+        return MemoryWavSource(clip[0], clip[1])
+
+    def _queue(self, path):
+        if path not in self._pending:
+            self._pending.append(path)
+        if not self._loading:
+            self._loading = True
+            asyncio.create_task(self._load_pending())
+
+    async def _load_pending(self):
+        try:
+            while self._pending:
+                await asyncio.sleep_ms(0)   # let the miss start playing first
+                self.load(self._pending.pop(0))
+        finally:
+            self._loading = False
+
+    async def preload(self, paths):
+        # Fill free space only: preloading must not evict what is in use.
+        for path in paths:
+            self.load(path, evict=False)
+            await asyncio.sleep_ms(0)
+
+    def clear(self):
+        self._clips = OrderedDict()
+        self.used = 0
+
+    def stats(self):
+        return {
+            "clips": len(self._clips),
+            "used": self.used,
+            "budget": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
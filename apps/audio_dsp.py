@@ -0,0 +1,277 @@
+"""
+In-place DSP on signed 16-bit little-endian PCM.
+
+Kernels address the buffer as ptr16 and use Q8 gains (UNITY = 256), so a
+sample costs one load, one multiply, one shift and one store. Ramps keep
+the gain in Q16.16 and add a fixed step per frame instead of dividing per
+sample, and fade and volume are applied in the same pass. Gains are capped
+at UNITY, which keeps every product inside 16 bits without clamping.
+
+tools/dsp_benchmark.py checks these bit-exact against a pure-Python model.
+"""
+
+UNITY = 256
+
+VOLUME_TABLE = [0, 3, 10, 23, 41, 64, 92, 125, 164, 207, 256]
+
+
+def volume_user_to_hw(volume):
+    volume = max(0, min(10, volume))
+    return VOLUME_TABLE[volume]
+
+
+@micropython.viper
+def gain16_viper(buf: ptr16, samples: int, gain: int):
+    for i in range(samples):
+        s = (int(buf[i]) ^ 0x8000) - 0x8000
+        buf[i] = ((s * gain) >> 8) & 0xFFFF
+
+
+@micropython.viper
+def ramp16_mono_viper(buf: ptr16, frames: int, acc: int, step: int):
+    for i in range(frames):
+        g = acc >> 16
+        s = (int(buf[i]) ^ 0x8000) - 0x8000
+        buf[i] = ((s * g) >> 8) & 0xFFFF
+        acc += step
+
+
+@micropython.viper
+def ramp16_stereo_viper(buf: ptr16, frames: int, acc: int, step: int):
+    i = 0
+    for _ in range(frames):
+        g = acc >> 16
+        s = (int(buf[i]) ^ 0x8000) - 0x8000
+        buf[i] = ((s * g) >> 8) & 0xFFFF
+        s = (int(buf[i + 1]) ^ 0x8000) - 0x8000
+        buf[i + 1] = ((s * g) >> 8) & 0xFFFF
+        i += 2
+        acc += step
+
+
+@micropython.viper
+def mix16_viper(dst: ptr16, src: ptr16, samples: int, gain: int):
+    for i in range(samples):
+        d = (int(dst[i]) ^ 0x8000) - 0x8000
+        s = (int(src[i]) ^ 0x8000) - 0x8000
+        v = d + ((s * gain) >> 8)
+        if v > 32767:
+            v = 32767
+        elif v < -32768:
+            v = -32768
+        dst[i] = v & 0xFFFF
+
+
+def _clamp_gain(gain):
+    return 0 if gain < 0 else (UNITY if gain > UNITY else gain)
+
+
+def apply_gain(buf, n, gain):
+    """Scale the first n bytes of buf by gain/256. Unity gain is a no-op."""
+    gain = _clamp_gain(gain)
+    if gain == UNITY or n < 2:
+        return
+    gain16_viper(buf, n >> 1, gain)
+
+
+def mix_into(dst, src, n, gain):
+    """Add the first n bytes of src, scaled by gain/256, to dst; saturates."""
+    gain = _clamp_gain(gain)
+    if gain == 0 or n < 2:
+        return
+    mix16_viper(dst, src, n >> 1, gain)
+
+
+def apply_ramp(buf, n, channels, g0, g1):
+    """
+    Linear gain ramp from g0 to g1 (Q8) over the whole frames in n bytes;
+    channels is 1 or 2.
+
+    Fade-in at volume v is apply_ramp(buf, n, ch, 0, v); fade-out is
+    apply_ramp(buf, n, ch, v, 0). The step is truncated towards zero so
+    the gain never overshoots g1.
+    """
+    g0 = _clamp_gain(g0)
+    g1 = _clamp_gain(g1)
+    frames = (n >> 1) // channels
+    if frames <= 0:
+        return
+    if g0 == g1:
+        apply_gain(buf, frames * channels * 2, g0)
+        return
+    delta = (g1 - g0) << 16
+    step = delta // frames if delta >= 0 else -((-delta) // frames)
+    if channels == 2:
+        ramp16_stereo_viper(buf, frames, g0 << 16, step)
+    else:
+        ramp16_mono_viper(buf, frames, g0 << 16, step)
+
+
+# ---------------------------
+# format conversion
+# ---------------------------
+# Stages share one interface: `identity`, `block` (input frame bytes),
+# in_bytes(out_bytes) for the input that fits an output buffer, and
+# convert(src, n, dst) returning the output byte count.
+
+
+@micropython.viper
+def widen8_viper(src: ptr8, samples: int, dst: ptr16):
+    for i in range(samples):
+        dst[i] = ((int(src[i]) - 128) << 8) & 0xFFFF
+
+
+@micropython.viper
+def narrow16_viper(src: ptr8, samples: int, dst: ptr16, width: int):
+    # Keep the top 16 bits of each 24/32-bit little-endian sample.
+    j = width - 2
+    for i in range(samples):
+        dst[i] = int(src[j]) | (int(src[j + 1]) << 8)
+        j += width
+
+
+class WidthConverter:
+    """8-bit unsigned and 24/32-bit signed PCM to 16-bit."""
+
+    def __init__(self):
+        self.configure(16, 2)
+
+    def configure(self, bits, channels):
+        self.width = bits // 8
+        self.block = self.width * channels
+        self.identity = bits == 16
+
+    def in_bytes(self, out_bytes):
+        return (out_bytes // (2 * self.block // self.width)) * self.block
+
+    def convert(self, src, n, dst):
+        samples = min(n // self.width, len(dst) // 2)
+        if self.width == 1:
+            widen8_viper(src, samples, dst)
+        else:
+            narrow16_viper(src, samples, dst, self.width)
+        return samples * 2
+
+
+class ConvChain:
+    """Two stages back to back through an intermediate buffer."""
+    identity = False
+
+    def __init__(self, buf_size=8192):
+        self._mid = bytearray(buf_size)
+        self.first = None
+        self.second = None
+
+    def set(self, first, second):
+        self.first = first
+        self.second = second
+        self.block = first.block
+
+    def in_bytes(self, out_bytes):
+        return self.first.in_bytes(min(self.second.in_bytes(out_bytes), len(self._mid)))
+
+    def convert(self, src, n, dst):
+        m = self.first.convert(src, n, self._mid)
+        return self.second.convert(self._mid, m, dst)
+
+
+# Resampler state words (ptr32): read position in Q16 input frames, step per
+# output frame, last input frame (raw u16 left/right), in/out channels and
+# destination capacity in frames.
+_POS = 0
+_STEP = 1
+_PREV_L = 2
+_PREV_R = 3
+_IN_CH = 4
+_OUT_CH = 5
+_CAP = 6
+
+
+@micropython.viper
+def resample16_viper(src: ptr16, frames: int, dst: ptr16, st: ptr32) -> int:
+    pos = int(st[0])
+    step = int(st[1])
+    in_ch = int(st[4])
+    out_ch = int(st[5])
+    cap = int(st[6])
+    end = frames << 16
+    out = 0
+    j = 0
+    while pos < end and out < cap:
+        # Input frame i of the chunk is y[i + 1]; y[0] is the last frame of
+        # the previous chunk, so interpolation runs across chunk borders.
+        i = pos >> 16
+        frac = (pos & 0xFFFF) >> 1
+        if i == 0:
+            l0 = (int(st[2]) ^ 0x8000) - 0x8000
+            r0 = (int(st[3]) ^ 0x8000) - 0x8000
+        else:
+            k = (i - 1) * in_ch
+            l0 = (int(src[k]) ^ 0x8000) - 0x8000
+            r0 = (int(src[k + in_ch - 1]) ^ 0x8000) - 0x8000
+        k = i * in_ch
+        l1 = (int(src[k]) ^ 0x8000) - 0x8000
+        r1 = (int(src[k + in_ch - 1]) ^ 0x8000) - 0x8000
+        l = l0 + (((l1 - l0) * frac) >> 15)
+        r = r0 + (((r1 - r0) * frac) >> 15)
+        if out_ch == 2:
+            dst[j] = l & 0xFFFF
+            dst[j + 1] = r & 0xFFFF
+            j += 2
+        else:
+            dst[j] = ((l + r) >> 1) & 0xFFFF
+            j += 1
+        out += 1
+        pos += step
+    st[0] = pos - end if pos >= end else 0
+    if frames > 0:
+        k = (frames - 1) * in_ch
+        st[2] = src[k]
+        st[3] = src[k + in_ch - 1]
+    return out
+
+
+class Resampler:
+    """
+    Linear-interpolating rate and channel converter to a fixed output format.
+
+    configure() per source, then convert() consecutive chunks; the fractional
+    position and last frame carry over so chunk borders are seamless. Mono
+    input is duplicated to both output channels, stereo to mono is averaged.
+    in_bytes() tells how much input fits one output buffer.
+    """
+
+    def __init__(self, out_rate=16000, out_channels=2):
+        from array import array
+        self._st = array("i", [0] * 7)
+        self.set_output(out_rate, out_channels)
+
+    def set_output(self, out_rate, out_channels):
+        self.out_rate = out_rate
+        self.out_channels = out_channels
+        self.configure(out_rate, out_channels)
+
+    def configure(self, in_rate, in_channels):
+        self.in_rate = in_rate
+        self.in_channels = in_channels
+        self.identity = in_rate == self.out_rate and in_channels == self.out_channels
+        self.block = 2 * in_channels
+        st = self._st
+        st[_POS] = 1 << 16
+        st[_STEP] = (in_rate << 16) // self.out_rate
+        st[_PREV_L] = 0
+        st[_PREV_R] = 0
+        st[_IN_CH] = in_channels
+        st[_OUT_CH] = self.out_channels
+
+    def in_bytes(self, out_bytes):
+        out_frames = out_bytes // (2 * self.out_channels)
+        in_frames = ((out_frames - 2) * self.in_rate) // self.out_rate
+        return max(0, in_frames) * 2 * self.in_channels
+
+    def convert(self, src, n, dst):
+        """Convert n bytes of src into dst; returns the output byte count."""
+        st = self._st
+        st[_CAP] = len(dst) // (2 * self.out_channels)
+        frames = resample16_viper(src, n // (2 * self.in_channels), dst, st)
+        return frames * 2 * self.out_channels
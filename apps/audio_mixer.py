@@ -0,0 +1,152 @@
+from audio_adpcm import AdpcmDecoder
+from audio_dsp import UNITY, ConvChain, Resampler
+from audio_sources.wav import WAVE_FORMAT_IMA_ADPCM, read_wav_info
+from utils import trace
+from utils.trace import CAT_AUDIO, DEBUG_ERROR
+
+
+class AudioMixer:
+    """
+    Effect voices summed into the running music stream.
+
+    add() queues a PlaybackHandle of short clips; they play one after the
+    other. AudioService calls render(n) for every music chunk of n bytes,
+    mixes out[:m] into it and then consume(m). Clips are converted to the
+    current output format with their own Resampler (after an ADPCM decoder
+    for compressed clips); converted frames that
+    do not fit the chunk carry over to the next one, so a clip plays out
+    without holes. While a voice is active the music is ducked to the
+    voice's `duck` gain (Q8, UNITY = no ducking).
+    """
+    DUCK = 96
+
+    def __init__(self, buf_size=8192):
+        self.buf_size = buf_size
+        self.out = bytearray(buf_size * 2)
+        self._out_mv = memoryview(self.out)
+        self._in_mv = memoryview(bytearray(buf_size))
+        self._hdr = bytearray(44)
+        self.resampler = Resampler()
+        self._conv = self.resampler
+        self._adpcm = None
+        self._chain = None
+        self.voices = []
+        self._src = None
+        self._in_fmt = None
+        self._remain = -1
+        self._have = 0
+
+    def set_output(self, rate, channels):
+        r = self.resampler
+        if r.out_rate == rate and r.out_channels == channels:
+            return
+        r.set_output(rate, channels)
+        if self._in_fmt is not None:
+            r.configure(*self._in_fmt)
+        self._have = 0
+
+    def add(self, handle, duck=DUCK):
+        handle.duck = duck
+        handle.state = handle.PLAYING
+        self.voices.append(handle)
+
+    def duck(self):
+        """Music gain (Q8) while the current voice plays."""
+        return self.voices[0].duck if self.voices else UNITY
+
+    # ---------- voices ----------
+    async def _close_source(self):
+        src = self._src
+        self._src = None
+        self._in_fmt = None
+        if src is not None:
+            try:
+                await src.close()
+            except Exception:
+                pass
+
+    async def _next_source(self):
+        """Open the next clip of the current voice; False when none is left."""
+        while self.voices:
+            handle = self.voices[0]
+            if handle.state == handle.STOPPED or handle.source_index >= len(handle.source_list):
+                handle.state = handle.STOPPED
+                self.voices.pop(0)
+                continue
+            src = handle.source_list[handle.source_index]
+            handle.source_index += 1
+            try:
+                await src.open()
+                info = getattr(src, "info", None)
+                if info is None:
+                    info = await read_wav_info(src, self._hdr)
+                elif hasattr(src, "seek_data_offset"):
+                    await src.seek_data_offset(info.data_offset, 0)
+                if info.fmt != WAVE_FORMAT_IMA_ADPCM and info.bits != 16:
+                    raise ValueError("only 16-bit or adpcm wav supported")
+                ch, rate = info.channels, info.rate
+            except Exception as e:
+                trace.log(CAT_AUDIO, DEBUG_ERROR, "mixer open error:", type(e).__name__, e)
+                try:
+                    await src.close()
+                except Exception:
+                    pass
+                continue
+            self._src = src
+            self._in_fmt = (rate, ch)
+            self._remain = info.data_len if info.data_len else -1
+            self.resampler.configure(rate, ch)
+            self._conv = self.resampler
+            if info.fmt == WAVE_FORMAT_IMA_ADPCM:
+                if self._chain is None:
+                    self._adpcm = AdpcmDecoder()
+                    self._chain = ConvChain(self.buf_size)
+                self._adpcm.configure(info.block_align, ch)
+                self._chain.set(self._adpcm, self.resampler)
+                self._conv = self._chain
+            return True
+        return False
+
+    async def render(self, n):
+        """Make up to n bytes of effect PCM ready in `out`; returns the count."""
+        while self._have < n:
+            if self._src is None:
+                if not await self._next_source():
+                    break
+            if self.voices[0].state == self.voices[0].STOPPED:
+                await self._close_source()
+                continue
+            dst = self._out_mv[self._have:]
+            want = min(self.buf_size, self._conv.in_bytes(len(dst)))
+            if want <= 0:
+                # Not even one ADPCM block fits; wait for consume().
+                break
+            if 0 <= self._remain < want:
+                want = self._remain
+            mv = self._in_mv[:want]
+            got = 0
+            while got < want:
+                r = await self._src.readinto(mv if got == 0 else mv[got:])
+                if not r:
+                    break
+                got += r
+            if got:
+                self._have += self._conv.convert(mv, got, dst)
+            if self._remain > 0:
+                self._remain -= got
+            if got < want or self._remain == 0:
+                await self._close_source()
+        return self._have if self._have < n else n
+
+    def consume(self, m):
+        rest = self._have - m
+        if rest > 0:
+            self._out_mv[:rest] = self._out_mv[m:self._have]
+        self._have = rest if rest > 0 else 0
+
+    async def stop(self):
+        await self._close_source()
+        for handle in self.voices:
+            handle.state = handle.STOPPED
+        self.voices = []
+        self._have = 0
@@ -0,0 +1,124 @@
+import time
+
+
+class AudioMonitor:
+    """
+    I2S ring fill estimator and stream health counters.
+
+    The DMA ring drains at a fixed byte rate, so its fill level can be
+    modelled from the bytes we queued and the time since the last write.
+    check() samples the level just before a write and counts underruns (ring
+    ran dry mid-stream) and near-underruns (less than `near_ms` left);
+    wrote() books the bytes after drain(). All arithmetic is small-int so the
+    per-chunk calls do not allocate; for that reason chunk timing and byte
+    counts restart with every stream while the health counters accumulate.
+    """
+    NEAR_MS = 40
+    MAX_ELAPSED_US = 5_000_000   # keep products in small-int range
+
+    def __init__(self, ibuf_size, near_ms=NEAR_MS):
+        self.ibuf_size = ibuf_size
+        self.near_ms = near_ms
+        self.bytes_per_ms = 64
+        self._level = 0
+        self._tick = time.ticks_us()
+        self._running = False
+        self.reset()
+
+    def configure(self, rate, channels, bits):
+        self.bytes_per_ms = max(1, (rate * channels * (bits // 8)) // 1000)
+        self._level = 0
+        self._tick = time.ticks_us()
+
+    def reset(self):
+        self.streams = 0
+        self.underruns = 0
+        self.near_underruns = 0
+        self.dry_ms = 0
+        self.min_level_ms = -1
+        self._reset_stream()
+
+    def _reset_stream(self):
+        self.chunks = 0
+        self.bytes = 0
+        self.read_us_total = 0
+        self.read_us_max = 0
+        self.dsp_us_total = 0
+        self.dsp_us_max = 0
+
+    # ---------- ring model ----------
+    def _decay(self, now):
+        elapsed = time.ticks_diff(now, self._tick)
+        if elapsed > self.MAX_ELAPSED_US:
+            elapsed = self.MAX_ELAPSED_US
+        drained = (elapsed * self.bytes_per_ms) // 1000
+        self._tick = now
+        if drained >= self._level:
+            dry = drained - self._level
+            self._level = 0
+            return dry
+        self._level -= drained
+        return 0
+
+    def level(self):
+        """Estimated bytes still queued in the ring."""
+        self._decay(time.ticks_us())
+        return self._level
+
+    def level_ms(self):
+        return self.level() // self.bytes_per_ms
+
+    # ---------- stream hooks ----------
+    def begin(self):
+        # The first write of a stream may legitimately find the ring empty.
+        self._running = False
+        self.streams += 1
+        self._reset_stream()
+
+    def end(self):
+        self._running = False
+
+    def check(self):
+        dry = self._decay(time.ticks_us())
+        if not self._running:
+            return
+        level_ms = self._level // self.bytes_per_ms
+        if self._level == 0:
+            self.underruns += 1
+            self.dry_ms += dry // self.bytes_per_ms
+        elif level_ms < self.near_ms:
+            self.near_underruns += 1
+        if self.min_level_ms < 0 or level_ms < self.min_level_ms:
+            self.min_level_ms = level_ms
+
+    def wrote(self, n):
+        self._decay(time.ticks_us())
+        level = self._level + n
+        self._level = level if level < self.ibuf_size else self.ibuf_size
+        self._running = True
+        self.bytes += n
+
+    def chunk(self, read_us, dsp_us):
+        self.chunks += 1
+        self.read_us_total += read_us
+        self.dsp_us_total += dsp_us
+        if read_us > self.read_us_max:
+            self.read_us_max = read_us
+        if dsp_us > self.dsp_us_max:
+            self.dsp_us_max = dsp_us
+
+    def snapshot(self):
+        n = self.chunks or 1
+        return {
+            "streams": self.streams,
+            "chunks": self.chunks,
+            "bytes": self.bytes,
+            "underruns": self.underruns,
+            "near_underruns": self.near_underruns,
+            "dry_ms": self.dry_ms,
+            "min_level_ms": self.min_level_ms,
+            "read_us_avg": self.read_us_total // n,
+            "read_us_max": self.read_us_max,
+            "dsp_us_avg": self.dsp_us_total // n,
+            "dsp_us_max": self.dsp_us_max,
+        }
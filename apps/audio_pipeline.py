@@ -0,0 +1,146 @@
+import uasyncio as asyncio
+
+
+class AudioPipeline:
+    """
+    Rotating PCM buffers between a source reader task and the I2S writer.
+
+    `depth` buffers of `buf_size` bytes are allocated once. start() spawns a
+    reader that fills free buffers in order while the writer drains filled
+    ones through get()/release(), so source latency (SD seeks, Wi-Fi stalls)
+    overlaps with output instead of adding to it. The reader blocks when all
+    buffers are full (backpressure); the writer blocks when none is ready.
+    With a converter (audio_dsp.Resampler) the reader reads into a scratch
+    buffer and converts into the pipeline buffer; `in_lens` keeps the source
+    byte count of each buffer for resume offsets. A non-zero `limit` stops
+    reading after that many source bytes (the end of the WAV data chunk).
+    """
+    DEPTH = 2
+
+    def __init__(self, depth=DEPTH, buf_size=8192):
+        self.depth = max(1, depth)
+        self.buf_size = buf_size
+        self.bufs = [bytearray(buf_size) for _ in range(self.depth)]
+        self.mvs = [memoryview(b) for b in self.bufs]
+        self.lens = [0] * self.depth
+        self.in_lens = [0] * self.depth
+        self._scratch = None
+        self._conv = None
+        self._filled = asyncio.Event()
+        self._freed = asyncio.Event()
+        self._task = None
+        self.stalls = 0      # writer found no buffer ready
+        self.full = 0        # reader found no buffer free
+        self._reset()
+
+    def _reset(self):
+        self._head = 0       # next buffer to drain
+        self._tail = 0       # next buffer to fill
+        self._count = 0
+        self._eof = False
+        self._error = None
+        self._filled.clear()
+        self._freed.clear()
+
+    # ---------- reader ----------
+    def start(self, source, quit_cond, conv=None, limit=0):
+        self._reset()
+        if conv is not None and conv.identity:
+            conv = None
+        if conv is not None and self._scratch is None:
+            self._scratch = memoryview(bytearray(self.buf_size))
+        self._conv = conv
+        self._task = asyncio.create_task(self._reader(source, quit_cond, limit))
+
+    async def _reader(self, source, quit_cond, limit):
+        conv = self._conv
+        size = self.buf_size
+        if conv is not None:
+            size = min(size, conv.in_bytes(size))
+            size -= size % conv.block
+            scratch = self._scratch[:size]
+        if size <= 0:
+            # A converter block (ADPCM) that decodes to more than a buffer.
+            self._error = ValueError("conversion block exceeds buffer")
+            self._eof = True
+            self._filled.set()
+            return
+        remaining = limit if limit > 0 else -1
+        try:
+            while remaining and not quit_cond():
+                if self._count == self.depth:
+                    self.full += 1
+                    while self._count == self.depth:
+                        self._freed.clear()
+                        await self._freed.wait()
+                    if quit_cond():
+                        break
+
+                i = self._tail
+                mv = self.mvs[i] if conv is None else scratch
+                n = 0
+                eof = False
+                want = size if remaining < 0 or remaining > size else remaining
+                while n < want:
+                    r = await source.readinto(mv if n == 0 and want == size else mv[n:want])
+                    if not r:
+                        eof = True
+                        break
+                    n += r
+                    if quit_cond():
+                        break
+
+                if remaining > 0:
+                    remaining -= n
+                if n:
+                    self.in_lens[i] = n
+                    if conv is not None:
+                        n = conv.convert(scratch, n, self.bufs[i])
+                if n:
+                    self.lens[i] = n
+                    self._tail = (i + 1) % self.depth
+                    self._count += 1
+                    self._filled.set()
+                if eof:
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._error = e
+        finally:
+            self._eof = True
+            self._filled.set()
+
+    # ---------- writer ----------
+    async def get(self):
+        """Index of the next filled buffer, or -1 at end of stream."""
+        if self._count == 0:
+            if not self._eof:
+                self.stalls += 1
+            while self._count == 0:
+                if self._eof:
+                    if self._error is not None:
+                        raise self._error
+                    return -1
+                self._filled.clear()
+                await self._filled.wait()
+        return self._head
+
+    def release(self):
+        self._head = (self._head + 1) % self.depth
+        self._count -= 1
+        self._freed.set()
+
+    async def stop(self):
+        task = self._task
+        self._task = None
+        if task is None:
+            return
+        if not task.done():
+            task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            pass
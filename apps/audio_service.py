@@ -7,10 +7,20 @@ import time
 import uasyncio as asyncio
 from machine import Pin, I2S
 from utils.queue import EventQueue
+from utils import trace
+from utils.trace import CAT_AUDIO, DEBUG_DBG, DEBUG_ERROR, DEBUG_INFO
 import board_config as hw
 from config import config
+from audio_clip_cache import AudioClipCache
+from audio_mixer import AudioMixer
+from audio_monitor import AudioMonitor
+from audio_pipeline import AudioPipeline
+from audio_adpcm import AdpcmDecoder
+from audio_dsp import UNITY, ConvChain, Resampler, WidthConverter, apply_gain, apply_ramp, mix_into, volume_user_to_hw
 from audio_sources.file_wav_source import FileWavSource
+from audio_sources.wav import WAVE_FORMAT_IMA_ADPCM, read_wav_info
 from audio_sources.http_wav_source import HttpWavSource
+from audio_sources.jitter_buffer import JitterBuffer
 
 
 I2S_ID = hw.AUDIO_I2S_ID
@@ -20,97 +30,6 @@ SD_PIN = hw.AUDIO_I2S_SD
 SHUTDOWN = hw.AUDIO_I2S_SHUTDOWN
 
 
-VOLUME_TABLE = [0, 3, 10, 23, 41, 64, 92, 125, 164, 207, 256]
-
-
-def volume_user_to_hw(volume):
-    volume = max(0, min(10, volume))
-    return VOLUME_TABLE[volume]
-
-
-@micropython.viper
-def adjust_volume_viper(buf: ptr8, length: int, volume: int):
-    for i in range(0, length, 2):
-        sample = buf[i] | (buf[i + 1] << 8)
-        if sample >= 32768:
-            sample -= 65536
-        sample = (sample * volume) >> 8
-        if sample > 32767:
-            sample = 32767
-        elif sample < -32768:
-            sample = -32768
-        buf[i] = sample & 0xFF
-        buf[i + 1] = (sample >> 8) & 0xFF
-
-
-@micropython.viper
-def fade16_in_viper(buf: ptr8, length: int):
-    samples = length // 2
-    if samples <= 1:
-        return
-    for i in range(samples):
-        idx = i * 2
-        sample = buf[idx] | (buf[idx + 1] << 8)
-        if sample >= 32768:
-            sample -= 65536
-        sample = (sample * i) // samples
-        if sample > 32767:
-            sample = 32767
-        elif sample < -32768:
-            sample = -32768
-        buf[idx] = sample & 0xFF
-        buf[idx + 1] = (sample >> 8) & 0xFF
-
-
-@micropython.viper
-def fade_out_viper(buf: ptr8, length: int):
-    samples = length // 2
-    if samples <= 1:
-        return
-    for i in range(samples):
-        idx = i * 2
-        sample = buf[idx] | (buf[idx + 1] << 8)
-        if sample >= 32768:
-            sample -= 65536
-        gain = samples - i
-        sample = (sample * gain) // samples
-        if sample > 32767:
-            sample = 32767
-        elif sample < -32768:
-            sample = -32768
-        buf[idx] = sample & 0xFF
-        buf[idx + 1] = (sample >> 8) & 0xFF
-
-
-@micropython.viper
-def fade_out_tail_viper(buf: ptr8, start: int, length: int):
-    samples = length // 2
-    if samples <= 1:
-        return
-    for i in range(samples):
-        idx = start + i * 2
-        sample = buf[idx] | (buf[idx + 1] << 8)
-        if sample >= 32768:
-            sample -= 65536
-        gain = samples - i
-        sample = (sample * gain) // samples
-        if sample > 32767:
-            sample = 32767
-        elif sample < -32768:
-            sample = -32768
-        buf[idx] = sample & 0xFF
-        buf[idx + 1] = (sample >> 8) & 0xFF
-
-
-def parse_wav_header_bytes(b):
-    if b is None or len(b) < 44:
-        raise ValueError("wav header too short")
-    num_channels = int.from_bytes(b[22:24], "little")
-    sample_rate = int.from_bytes(b[24:28], "little")
-    bits_per_sample = int.from_bytes(b[34:36], "little")
-    return num_channels, sample_rate, bits_per_sample, 44
-
-
 class PlaybackHandle:
     IDLE = 0
     PLAYING = 1
@@ -120,6 +39,7 @@ class PlaybackHandle:
 
     MODE_NORMAL = 0
     MODE_INSERT = 1
+    MODE_MIX = 2
 
     def __init__(self, service, source_list, mode=MODE_NORMAL):
         self._service = service
@@ -131,6 +51,14 @@ class PlaybackHandle:
         self.start_offset_bytes = 0
         self.interrupted = False
 
+    @property
+    def rebuffering(self):
+        """True while the current network source waits for its buffer to refill."""
+        i = self.source_index
+        if self.state != self.PLAYING or i >= len(self.source_list):
+            return False
+        return getattr(self.source_list[i], "rebuffering", False)
+
     def pause(self):
         self._service.pause_handle(self)
 
@@ -141,37 +69,40 @@ class PlaybackHandle:
         self._service.stop_handle(self)
 
 
-async def _read_exact(source, mv, quit_cond=None, timeout=None):
-    total_read = 0
-    length = len(mv)
-    start = time.ticks_ms() if timeout else None
-
-    while total_read < length:
-        if quit_cond and quit_cond():
-            break
-        if timeout:
-            if time.ticks_diff(time.ticks_ms(), start) > timeout * 1000:
-                raise asyncio.TimeoutError(f"read_exact timeout after {total_read}/{length} bytes")
-
-        n = await source.readinto(mv[total_read:])
-        if n == 0:  # EOF
-            break
-        total_read += n
-    return total_read
-
 class AudioService:
     IBUF_SIZE = 40000
     BUF_SIZE = 8192
+    PIPE_DEPTH = AudioPipeline.DEPTH
     FADE_MS = 60
-
-    def __init__(self):
+    PREFETCH_MS = 5000
+
+    def __init__(self, pipe_depth=PIPE_DEPTH, output=None):
+        """
+        output: optional (rate, channels). The I2S is then configured once
+        and every source is converted to that format instead of
+        re-initialising it; defaults to config 'audio_output'.
+        """
         self.queue = EventQueue()
         self.current_handle = None
         self.wait_resume = None
-        self._buf = bytearray(self.BUF_SIZE)
-
-        self.sample_rate = 16000
-        self.channels = 2
+        # Source reads run one or more buffers ahead of the I2S writer; the
+        # buffers are allocated once so the playback loop does not allocate.
+        self.pipe = AudioPipeline(pipe_depth, self.BUF_SIZE)
+        self._hdr = bytearray(44)
+        self._prefetch_hdr = bytearray(44)
+        self._prefetch = None     # (source, task) opening the next source
+        self._width = WidthConverter()
+        self._adpcm = AdpcmDecoder()
+        self._chain = ConvChain(self.BUF_SIZE)
+        self._volume = config.value('volume', int, 0, 10, on_change=self._on_volume)
+        self._gain = volume_user_to_hw(self._volume.value)
+
+        if output is None:
+            output = config.get('audio_output')
+        self.resampler = Resampler(output[0], output[1]) if output else None
+
+        self.sample_rate = output[0] if output else 16000
+        self.channels = output[1] if output else 2
         self.bits_per_sample = 16
         self.i2s = I2S(
             I2S_ID,
@@ -187,29 +118,79 @@ class AudioService:
         self.shutdown = Pin(SHUTDOWN, Pin.OUT)
         self.shutdown.value(1)
         self.swriter = asyncio.StreamWriter(self.i2s, {})
-        self._last_write_tick = 0
+        self.monitor = AudioMonitor(self.IBUF_SIZE)
+        self.mixer = AudioMixer(self.BUF_SIZE)
+        # Short prompt clips (play_files / play_effect) are served from RAM.
+        self.clips = AudioClipCache(config.get('audio_clip_cache_kb') * 1024)
+        self._duck = UNITY
+        self._jitters = []
+        self.monitor.configure(self.sample_rate, self.channels, self.bits_per_sample)
 
     def start(self):
         asyncio.create_task(self._task())
 
-    def play_file(self, filepath, offset_bytes=0, emerge=False):
-        handle = PlaybackHandle(self, [FileWavSource(filepath, offset_bytes=offset_bytes)], mode=PlaybackHandle.MODE_NORMAL if not emerge else PlaybackHandle.MODE_INSERT)
+    def play_file(self, filepath, offset_bytes=0, emerge=False, info=None):
+        """info: optional WavInfo (e.g. from the WavLibrary TrackList) to skip header parsing."""
+        handle = PlaybackHandle(self, [FileWavSource(filepath, offset_bytes=offset_bytes, info=info)], mode=PlaybackHandle.MODE_NORMAL if not emerge else PlaybackHandle.MODE_INSERT)
         handle.bytes_played = offset_bytes if offset_bytes and offset_bytes > 0 else 0
         handle.start_offset_bytes = handle.bytes_played
         self.queue.put(("PLAY", handle))
         return handle
 
     def play_files(self, file_list, emerge=False):
-        sources = [FileWavSource(f) for f in file_list]
+        sources = [self.clips.source(f) for f in file_list]
         handle = PlaybackHandle(self, sources, mode=PlaybackHandle.MODE_NORMAL if not emerge else PlaybackHandle.MODE_INSERT)
         self.queue.put(("PLAY", handle))
         return handle
 
-    def play_http_wav(self, url):
-        handle = PlaybackHandle(self, [HttpWavSource(url)], mode=PlaybackHandle.MODE_NORMAL)
+    def play_effect(self, file_list, duck=AudioMixer.DUCK):
+        """
+        Overlay short clips on the music that is playing, ducking it to
+        `duck` (Q8, 256 = no ducking), instead of interrupting it. With
+        nothing playing this is play_files(..., emerge=True).
+        """
+        if isinstance(file_list, str):
+            file_list = [file_list]
+        cur = self.current_handle
+        if cur is None or cur.mode != PlaybackHandle.MODE_NORMAL or cur.state != PlaybackHandle.PLAYING:
+            return self.play_files(file_list, emerge=True)
+        handle = PlaybackHandle(self, [self.clips.source(f) for f in file_list], mode=PlaybackHandle.MODE_MIX)
+        self.mixer.add(handle, duck)
+        return handle
+
+    def _net_buffer(self, exclude=None):
+        # Two rings at most, allocated on first use: the playing stream and
+        # the next one being prefetched take turns.
+        for jb in self._jitters:
+            if jb is not exclude:
+                return jb
+        kb = JitterBuffer.KB
+        jb = JitterBuffer(config.get('net_buffer_kb') * kb, config.get('net_prefill_kb') * kb)
+        self._jitters.append(jb)
+        return jb
+
+    def play_http_wav(self, url, offset_bytes=0, info=None):
+        """
+        offset_bytes: start inside the data chunk. With `info` (the WavInfo
+        of an earlier play) the stream starts with a range request there.
+        """
+        source = HttpWavSource(url, jitter=self._net_buffer(), info=info)
+        handle = PlaybackHandle(self, [source], mode=PlaybackHandle.MODE_NORMAL)
+        handle.bytes_played = offset_bytes if offset_bytes and offset_bytes > 0 else 0
+        handle.start_offset_bytes = handle.bytes_played
         self.queue.put(("PLAY", handle))
         return handle
 
+    def append_http_wav(self, handle, url):
+        """
+        Queue `url` after the last source of `handle`. It plays gaplessly
+        and is prefetched during the last PREFETCH_MS of the one before.
+        """
+        last = handle.source_list[-1] if handle.source_list else None
+        source = HttpWavSource(url, jitter=self._net_buffer(getattr(last, "jitter", None)))
+        handle.source_list.append(source)
+        return source
+
     def stop_fg(self):
         if self.current_handle is not None:
             self.current_handle.state = PlaybackHandle.STOPPED
@@ -221,10 +202,15 @@ class AudioService:
             self.queue.put(("PAUSE", None))
 
     def resume_handle(self, handle):
+        if handle.mode == PlaybackHandle.MODE_MIX:
+            return
         self.queue.put(("RESUME", handle))
 
     def stop_handle(self, handle):
-        if self.current_handle == handle:
+        if handle.mode == PlaybackHandle.MODE_MIX:
+            # The mixer drops it at the next chunk.
+            handle.state = PlaybackHandle.STOPPED
+        elif self.current_handle == handle:
             self.queue.put(("STOP", None))
 
     async def _task(self):
@@ -236,14 +222,14 @@ class AudioService:
                 if self.current_handle is not None:
                     next = self.current_handle
                     self.current_handle = None
-                    print("restore current_handle playback")
+                    trace.log(CAT_AUDIO, DEBUG_DBG, "restore current_handle playback")
                 elif self.wait_resume is not None:
                     next = self.wait_resume
                     self.wait_resume = None
-                    print("restore wait resume playback")
+                    trace.log(CAT_AUDIO, DEBUG_DBG, "restore wait resume playback")
 
                 if next is not None:
-                    print(f"resume interrupted playback: {next}")
+                    trace.log(CAT_AUDIO, DEBUG_DBG, "resume interrupted playback", next)
                     await self._play_handle(next)
                     continue
 
@@ -270,19 +256,19 @@ class AudioService:
             return
 
     async def _play_handle(self, handle):
-        print(f"[DEBUG] Playing handle: {handle}")
+        trace.log(CAT_AUDIO, DEBUG_DBG, "Playing handle", handle)
         if self.current_handle is not None \
          and self.current_handle.mode == handle.mode:
             # same mode: stop current and set new
             self.current_handle.state = PlaybackHandle.STOPPED
             self.current_handle = handle
-            print("replace current with new handle")
+            trace.log(CAT_AUDIO, DEBUG_DBG, "replace current with new handle")
         elif self.wait_resume is not None \
          and self.wait_resume.mode == handle.mode:
             # normal interrupt, save to resume handle
             self.wait_resume.state = PlaybackHandle.STOPPED
             self.wait_resume = handle
-            print("save new handle to wait_resume")
+            trace.log(CAT_AUDIO, DEBUG_DBG, "save new handle to wait_resume")
             return
         elif handle.mode == PlaybackHandle.MODE_INSERT \
             and self.current_handle is not None \
@@ -290,7 +276,7 @@ class AudioService:
             # insert mode: resume current playback
             self.wait_resume = self.current_handle
             self.current_handle = handle
-            print("save current to wait_resume")
+            trace.log(CAT_AUDIO, DEBUG_DBG, "save current to wait_resume")
         elif handle.mode == PlaybackHandle.MODE_NORMAL \
             and self.current_handle is not None \
             and self.current_handle.mode == PlaybackHandle.MODE_INSERT:
@@ -298,22 +284,26 @@ class AudioService:
             if self.wait_resume is not None:
                 self.wait_resume.state = PlaybackHandle.STOPPED
             self.wait_resume = handle
-            print("save new handle to wait_resume")
+            trace.log(CAT_AUDIO, DEBUG_DBG, "save new handle to wait_resume")
         else:
             self.current_handle = handle
-            print("set new handle")
+            trace.log(CAT_AUDIO, DEBUG_DBG, "set new handle")
 
         if self.current_handle is None:
             return
 
         handle.state = PlaybackHandle.PLAYING
 
-        for i in range(handle.source_index, len(handle.source_list)):
+        first = handle.source_index
+        i = first
+        # Sources may be appended while the handle plays.
+        while i < len(handle.source_list):
             handle.source_index = i
             src = handle.source_list[i]
             if handle.state == PlaybackHandle.STOPPED:
                 break
-            ok = await self._play_source(src, handle)
+            await self._join_prefetch(src)
+            ok = await self._play_source(src, handle, gapless=i > first)
             if not ok:
                 handle.start_offset_bytes = handle.bytes_played
                 break
@@ -321,158 +311,270 @@ class AudioService:
             handle.source_index = i + 1
             handle.bytes_played = 0
             handle.start_offset_bytes = 0
+            i += 1
+        await self._drop_prefetch()
 
         # All tracks played
         if handle.source_index == len(handle.source_list):
             handle.state = PlaybackHandle.STOPPED
-            print("all tracks played")
+            trace.log(CAT_AUDIO, DEBUG_INFO, "all tracks played")
 
         # reset current to None
         if handle.state == PlaybackHandle.STOPPED:
             self.current_handle = None
-            print("playback stopped")
+            trace.log(CAT_AUDIO, DEBUG_INFO, "playback stopped")
+
+        # Effects only live on top of the music they were mixed into.
+        if self.mixer.voices:
+            await self.mixer.stop()
+        self._duck = UNITY
+
+    # ---------- prefetch ----------
+    def _start_prefetch(self, handle):
+        """Open the source after the current one; False if there is none yet."""
+        i = handle.source_index + 1
+        if i >= len(handle.source_list):
+            return False
+        src = handle.source_list[i]
+        if getattr(src, "prefetch", False) and self._prefetch is None:
+            self._prefetch = (src, asyncio.create_task(self._prefetch_source(src)))
+        return True
+
+    async def _prefetch_source(self, src):
+        # Connect, parse the header and let the jitter buffer fill while
+        # the current source plays out.
+        try:
+            await src.open()
+            if src.info is None:
+                src.info = await read_wav_info(src, self._prefetch_hdr)
+        except Exception as e:
+            trace.log(CAT_AUDIO, DEBUG_ERROR, "prefetch error:", type(e).__name__, e)
+            try:
+                await src.close()
+            except Exception:
+                pass
+
+    async def _join_prefetch(self, src):
+        if self._prefetch is not None and self._prefetch[0] is src:
+            task = self._prefetch[1]
+            self._prefetch = None
+            await task
+
+    async def _drop_prefetch(self):
+        if self._prefetch is None:
+            return
+        src, task = self._prefetch
+        self._prefetch = None
+        if not task.done():
+            task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        try:
+            await src.close()
+        except Exception:
+            pass
 
     async def _drain_i2s(self):
-        bytes_per_sec = (
-            self.sample_rate *
-            self.channels *
-            (self.bits_per_sample // 8)
-        )
-
-        max_buffer_ms = (self.IBUF_SIZE * 1000) // bytes_per_sec
-
-        elapsed = time.ticks_diff(
-            time.ticks_ms(),
-            self._last_write_tick
-        )
-
-        remain = max_buffer_ms - elapsed
-        print(f"[DEBUG] Drain I2S: elapsed={elapsed}ms, remain={remain}ms")
+        remain = self.monitor.level_ms()
+        trace.log(CAT_AUDIO, DEBUG_DBG, "Drain I2S remain ms", remain)
 
         if remain > 0:
             await asyncio.sleep_ms(remain)
 
     def _get_drain_i2s_ms(self):
-        bytes_per_sec = (
-            self.sample_rate *
-            self.channels *
-            (self.bits_per_sample // 8)
-        )
-
-        max_buffer_ms = (self.IBUF_SIZE * 1000) // bytes_per_sec
-
-        elapsed = time.ticks_diff(
-            time.ticks_ms(),
-            self._last_write_tick
+        return self.monitor.level_ms()
+
+    def busy(self):
+        """True while anything is queued, playing or still draining to I2S."""
+        return self.current_handle is not None or self.wait_resume is not None \
+            or not self.queue.empty() or self.monitor.level_ms() > 0
+
+    def stats(self):
+        stats = self.monitor.snapshot()
+        stats["pipe_depth"] = self.pipe.depth
+        stats["pipe_stalls"] = self.pipe.stalls
+        stats["pipe_full"] = self.pipe.full
+        for jb in self._jitters:
+            st = jb.stats()
+            if "net_stalls" in stats:
+                # Second ring: add up the stall counters.
+                for key in ("net_stalls", "net_stall_ms"):
+                    stats[key] += st[key]
+                stats["net_max_stall_ms"] = max(stats["net_max_stall_ms"], st["net_max_stall_ms"])
+            else:
+                stats.update(st)
+        return stats
+
+    def _on_volume(self, volume):
+        self._gain = volume_user_to_hw(volume)
+
+    def _mix(self, buf, n, channels, m):
+        # Duck (or restore) the music with a ramp across the chunk, then add
+        # m bytes of effect at the same volume.
+        gain = self._gain
+        target = self.mixer.duck()
+        g0 = (gain * self._duck) >> 8
+        g1 = (gain * target) >> 8
+        if g0 == g1:
+            apply_gain(buf, n, g0)
+        else:
+            apply_ramp(buf, n, channels, g0, g1)
+        self._duck = target
+        if m:
+            mix_into(buf, self.mixer.out, m, gain)
+            self.mixer.consume(m)
+
+    def _init_i2s(self, rate, ch, bits):
+        self.sample_rate = rate
+        self.channels = ch
+        self.bits_per_sample = bits
+        self.i2s.init(
+            sck=Pin(SCK_PIN),
+            ws=Pin(WS_PIN),
+            sd=Pin(SD_PIN),
+            mode=I2S.TX,
+            bits=bits,
+            format=I2S.STEREO if ch == 2 else I2S.MONO,
+            rate=rate,
+            ibuf=self.IBUF_SIZE,
         )
-
-        remain = max_buffer_ms - elapsed
-
-        return remain if remain > 0 else 0
-
-    async def _play_source(self, source, handle):
-
+        self.monitor.configure(rate, ch, bits)
+
+    async def _play_source(self, source, handle, gapless=False):
+        """
+        Play one source. With `gapless` (the previous source of the same
+        handle ran to its end) the fade-in is skipped as long as the output
+        format does not change, so clip sequences join without a dip.
+        """
         finish = False
         try:
             await source.open()
             # Apply resume offset only for the current source, not for every track in a list.
             resume_offset = handle.start_offset_bytes if (handle.start_offset_bytes and handle.start_offset_bytes > 0) else 0
 
-            header = bytearray(44)
-            total = await _read_exact(source, memoryview(header),
-                                      lambda: handle.state == PlaybackHandle.STOPPED)
-            if handle.state == PlaybackHandle.STOPPED:
-                return True
-            if not self.queue.empty():
-                return False
-
-            if total < 44:
-                raise ValueError("Incomplete WAV header")
-
-            ch, rate, bits, _ = parse_wav_header_bytes(header)
-            if bits != 16:
-                raise ValueError("only 16-bit wav supported")
+            # Sources that come with a parsed header (clip cache, WAV index)
+            # skip the chunk walk and seek straight to the samples.
+            info = getattr(source, "info", None)
+            if info is None:
+                info = await read_wav_info(source, self._hdr)
+                if hasattr(source, "info"):
+                    # Kept for a resume: it then seeks straight to the data.
+                    source.info = info
+                if handle.state == PlaybackHandle.STOPPED:
+                    return True
+                if not self.queue.empty():
+                    return False
+            ch, rate, bits = info.channels, info.rate, info.bits
 
-            # For local file sources: parse header first, then seek into data area.
-            if resume_offset and hasattr(source, "seek_data_offset"):
-                await source.seek_data_offset(44, resume_offset)
+            # Resume inside the data chunk, on a frame boundary.
+            resume_offset -= resume_offset % info.block_align
+            if hasattr(source, "seek_data_offset") and (resume_offset or getattr(source, "info", None) is not None):
+                await source.seek_data_offset(info.data_offset, resume_offset)
                 handle.bytes_played = resume_offset
-
-            if self.sample_rate != rate or self.channels != ch or self.bits_per_sample != bits:
+            limit = info.data_len - resume_offset if info.data_len > resume_offset else 0
+
+            fade = not gapless
+            if info.fmt == WAVE_FORMAT_IMA_ADPCM:
+                self._adpcm.configure(info.block_align, ch)
+                stage = self._adpcm
+            else:
+                self._width.configure(bits, ch)
+                stage = self._width
+            if self.resampler is not None:
+                # Fixed output: convert instead of re-initialising the I2S.
+                self.resampler.configure(rate, ch)
+                conv = self.resampler
+            elif self.sample_rate != rate or self.channels != ch:
                 if handle.mode == PlaybackHandle.MODE_NORMAL:
                     drain_ms = self._get_drain_i2s_ms()
                     if drain_ms > 0:
-                        print(f"[DEBUG] Drain I2S: {drain_ms}ms")
-                        while time.ticks_diff(time.ticks_ms(), self._last_write_tick) < drain_ms:
+                        trace.log(CAT_AUDIO, DEBUG_DBG, "Drain I2S ms", drain_ms)
+                        while drain_ms > 0:
                             if not self.queue.empty():
                                 return False
-                            await asyncio.sleep_ms(100)
+                            await asyncio.sleep_ms(min(100, drain_ms))
+                            drain_ms = self._get_drain_i2s_ms()
                     #await self._drain_i2s()
-                self.sample_rate = rate
-                self.channels = ch
-                self.bits_per_sample = bits
-                self.i2s.init(
-                    sck=Pin(SCK_PIN),
-                    ws=Pin(WS_PIN),
-                    sd=Pin(SD_PIN),
-                    mode=I2S.TX,
-                    bits=bits,
-                    format=I2S.STEREO if ch == 2 else I2S.MONO,
-                    rate=rate,
-                    ibuf=self.IBUF_SIZE,
-                )
-
-            # fade in for 16-bit audio
-            frame_bytes = (bits // 8) * ch
-            fade_frames = int(rate * self.FADE_MS / 1000)
-            fade_bytes = fade_frames * frame_bytes
-
-            n = await _read_exact(source, memoryview(self._buf)[:fade_bytes],
-                                    lambda: handle.state == PlaybackHandle.STOPPED or not self.queue.empty())
-            if handle.state == PlaybackHandle.STOPPED:
-                return True
-            if not self.queue.empty():
-                return False
-
-            if n > 0:
-                if bits == 16:
-                    fade16_in_viper(self._buf, n)
+                self._init_i2s(rate, ch, 16)
+                conv = None
+                fade = True
+            else:
+                conv = None
+            # ADPCM and other sample widths become 16-bit PCM first.
+            if not stage.identity:
+                if conv is None or conv.identity:
+                    conv = stage
                 else:
-                    pass # TODO support
-
-                audio_volume = config.get('volume')
-                if audio_volume != 10:
-                    adjust_volume_viper(self._buf, n, volume_user_to_hw(audio_volume))
-
-                await self.swriter.awrite(memoryview(self._buf)[:n])
-                handle.bytes_played += n
-
+                    self._chain.set(stage, conv)
+                    conv = self._chain
+
+            # fade in for 16-bit audio, at the output format
+            out_ch = self.channels
+            mixer = self.mixer
+            mixer.set_output(self.sample_rate, out_ch)
+            fade_bytes = int(self.sample_rate * self.FADE_MS / 1000) * 2 * out_ch
+
+            queue = self.queue
+            pipe = self.pipe
+            monitor = self.monitor
+            swriter = self.swriter
+            buf_size = pipe.buf_size
+            quit_cond = lambda: handle.state == PlaybackHandle.STOPPED or not queue.empty()
+
+            # Open the next source once this one is PREFETCH_MS from its end.
+            prefetch_at = 0
+            if info.data_len:
+                bytes_per_s = info.rate * info.block_align // info.samples_per_block
+                prefetch_at = max(1, info.data_len - bytes_per_s * self.PREFETCH_MS // 1000)
+
+            monitor.begin()
+            # The reader refills buffers while the previous one drains; read
+            # time below is only what the writer had to wait for.
+            pipe.start(source, quit_cond, conv, limit)
             while True:
-                start = time.ticks_ms()
-                n = await _read_exact(source, memoryview(self._buf),
-                                      lambda: handle.state == PlaybackHandle.STOPPED or not self.queue.empty())
+                t_read = time.ticks_us()
+                i = await pipe.get()
                 if handle.state == PlaybackHandle.STOPPED:
                     return True
-                if not self.queue.empty():
+                if not queue.empty():
                     return False
 
-                #print(f"[DEBUG] swriter read: {n} bytes cost { time.ticks_ms() - start}")
-                if not n:
+                if i < 0:
                     return True
 
-                audio_volume = config.get('volume')
-                if audio_volume != 10:
-                    adjust_volume_viper(self._buf, n, volume_user_to_hw(audio_volume))
-
-                self.swriter.out_buf = memoryview(self._buf)[:n]
-                start = time.ticks_ms()
-                await self.swriter.drain()
-                #print(f"[DEBUG] swriter after drain: {n} bytes cost { time.ticks_ms() - start}")
-                self._last_write_tick = time.ticks_ms()
-                handle.bytes_played += n
+                n = pipe.lens[i]
+                out = pipe.mvs[i]
+                t_dsp = time.ticks_us()
+                if fade:
+                    # Fade in and volume in one pass over the first chunk.
+                    f = min(n, fade_bytes)
+                    apply_ramp(pipe.bufs[i], f, out_ch, 0, self._gain)
+                    if f < n:
+                        apply_gain(out[f:], n - f, self._gain)
+                    fade = False
+                elif mixer.voices or self._duck != UNITY:
+                    m = await mixer.render(n) if mixer.voices else 0
+                    self._mix(pipe.bufs[i], n, out_ch, m)
+                else:
+                    apply_gain(pipe.bufs[i], n, self._gain)
+                t_write = time.ticks_us()
+
+                monitor.check()
+                swriter.out_buf = out if n == buf_size else out[:n]
+                await swriter.drain()
+                pipe.release()
+                monitor.wrote(n)
+                monitor.chunk(time.ticks_diff(t_dsp, t_read), time.ticks_diff(t_write, t_dsp))
+                handle.bytes_played += pipe.in_lens[i]
+                if prefetch_at and handle.bytes_played >= prefetch_at and self._start_prefetch(handle):
+                    prefetch_at = 0
 
         except Exception as e:
-            print("[AudioService] play error:", e)
+            trace.log(CAT_AUDIO, DEBUG_ERROR, "play error:", type(e).__name__, e)
             return True
         finally:
+            await self.pipe.stop()
+            self.monitor.end()
             await source.close()
@@ -1,80 +1,127 @@
-import uasyncio as asyncio
+from http_client import http_pool
 
 
 class HttpWavSource:
-    def __init__(self, url, timeout_connect_ms=3000, timeout_send_ms=2000):
+    """
+    WAV over plain HTTP, through the shared keep-alive pool. With a
+    `jitter` buffer (JitterBuffer) the body is read ahead by a filler task
+    and readinto() is served from the ring; without one reads go straight
+    to the response.
+
+    Seeking uses a `Range: bytes=N-` request. Once the header has been
+    parsed (`info` is set), open() defers the request to the first seek or
+    read, so a resume asks for the data at its offset and never downloads
+    the head again. A short forward seek on an open stream, or a server
+    that ignores ranges, is served by reading and discarding instead.
+    """
+    DISCARD_MAX = 32 * 1024
+    prefetch = True         # AudioService may open it ahead of time
+
+    def __init__(self, url, timeout_connect_ms=3000, timeout_ms=5000, jitter=None, info=None):
         self.url = url
+        self.jitter = jitter
+        self.info = info
         self.timeout_connect_ms = timeout_connect_ms
-        self.timeout_send_ms = timeout_send_ms
-        self.reader = None
-        self.writer = None
-        self._leftover = b""
+        self.timeout_ms = timeout_ms
+        self.response = None
+        self._streaming = False  # a request is open at _pos
+        self._pos = 0           # file offset of the next byte readinto() returns
+        self._eof = False
+        self.range_requests = 0
+        self.discarded = 0
 
-    def _parse_http_url(self):
-        if not self.url.startswith("http://"):
-            raise ValueError("only http:// is supported")
-        rest = self.url[7:]
-        slash = rest.find("/")
-        hostport = rest if slash < 0 else rest[:slash]
-        path = "/" if slash < 0 else rest[slash:]
-        if ":" in hostport:
-            host, port_s = hostport.split(":", 1)
-            port = int(port_s)
-        else:
-            host, port = hostport, 80
-        return host, port, path
+    @property
+    def rebuffering(self):
+        return self.jitter is not None and self.jitter.rebuffering
 
     async def open(self):
-        host, port, path = self._parse_http_url()
-        try:
-            self.reader, self.writer = await asyncio.wait_for_ms(asyncio.open_connection(host, port), self.timeout_connect_ms)
-        except asyncio.TimeoutError:
-            raise OSError("connect timeout")
+        if self._streaming:
+            return          # already opened by a prefetch
+        self._pos = 0
+        self._eof = False
+        if self.info is None:
+            await self._open_at(0)
 
-        host_hdr = host if port == 80 else "{}:{}".format(host, port)
-        req = "GET {} HTTP/1.0\r\nHost: {}\r\nConnection: close\r\n\r\n".format(path, host_hdr)
-        self.writer.write(req.encode())
-        try:
-            await asyncio.wait_for_ms(self.writer.drain(), self.timeout_send_ms)
-        except asyncio.TimeoutError:
-            raise OSError("send timeout")
+    async def _open_at(self, start):
+        self._eof = False
+        pos = await self._request(start)
+        if pos is None:
+            # Range past the end: nothing left to play.
+            self._pos = start
+            self._eof = True
+            return
+        self._pos = pos
+        self._streaming = True
+        if self.jitter is not None:
+            self.jitter.start(self._recv)
+        if pos < start:
+            await self._discard(start - pos)
 
-        headers, rest = await self._read_http_headers(self.reader)
-        status = headers.split(b"\r\n", 1)[0]
-        if b"200" not in status:
-            raise ValueError("http status not 200")
-        self._leftover = rest
+    async def _request(self, start):
+        """Request the body from `start`; returns where it really starts, None past the end."""
+        headers = None
+        if start > 0:
+            headers = {"Range": "bytes={}-".format(start)}
+            self.range_requests += 1
+        resp = await http_pool.get(self.url, timeout_connect_ms=self.timeout_connect_ms,
+                                   timeout_ms=self.timeout_ms, headers=headers)
+        if resp.status == 416:
+            await resp.close()
+            return None
+        if resp.status not in (200, 206):
+            await resp.close()
+            raise ValueError("http status {}".format(resp.status))
+        self.response = resp
+        if resp.status == 206 and resp.headers.get("content-range", "").startswith("bytes {}-".format(start)):
+            return start
+        return 0
 
-    async def _read_http_headers(self, reader):
-        buf = b""
-        while True:
-            chunk = await reader.read(256)
-            if not chunk:
+    async def _discard(self, n):
+        buf = bytearray(min(n, 1024))
+        mv = memoryview(buf)
+        while n > 0:
+            r = await self.readinto(mv[:min(n, len(buf))])
+            if not r:
                 break
-            buf += chunk
-            p = buf.find(b"\r\n\r\n")
-            if p >= 0:
-                return buf[: p + 4], buf[p + 4 :]
-            if len(buf) > 4096:
-                raise ValueError("http header too large")
-        raise ValueError("http header incomplete")
+            n -= r
+            self.discarded += r
+
+    async def seek_data_offset(self, data_start, offset_bytes):
+        target = data_start + (offset_bytes if offset_bytes and offset_bytes > 0 else 0)
+        if self._streaming and not self._eof:
+            if target == self._pos:
+                return
+            if self._pos < target <= self._pos + self.DISCARD_MAX:
+                await self._discard(target - self._pos)
+                return
+            await self._drop()
+        await self._open_at(target)
 
     async def readinto(self, mv):
-        if self._leftover:
-            n = min(len(self._leftover), len(mv))
-            mv[:n] = self._leftover[:n]
-            self._leftover = self._leftover[n:]
-            return n
-        return await self.reader.readinto(mv)
+        if self._eof:
+            return 0
+        if not self._streaming:
+            await self._open_at(self._pos)
+            if self._eof:
+                return 0
+        if self.jitter is not None:
+            n = await self.jitter.readinto(mv)
+        else:
+            n = await self._recv(mv)
+        self._pos += n
+        return n
 
-    async def close(self):
-        if self.writer is not None:
-            try:
-                self.writer.close()
-                await self.writer.wait_closed()
-            except Exception:
-                pass
-        self.reader = None
-        self.writer = None
-        self._leftover = b""
+    async def _recv(self, mv):
+        return await self.response.readinto(mv)
 
+    async def _drop(self):
+        self._streaming = False
+        if self.jitter is not None:
+            await self.jitter.stop()
+        if self.response is not None:
+            # A body read to the end returns its connection to the pool.
+            await self.response.close()
+            self.response = None
+
+    async def close(self):
+        await self._drop()
@@ -0,0 +1,155 @@
+import time
+import uasyncio as asyncio
+
+
+class JitterBuffer:
+    """
+    Network read-ahead ring between a socket and the audio pipeline.
+
+    start(read) spawns a filler task that reads into the ring through the
+    async `read(mv)` callable. The filler stops once `high` bytes are
+    buffered and resumes when playback has drained it to `low`, so the
+    socket is read in bursts rather than per packet. readinto() serves the
+    consumer: the first read waits for `prefill` bytes (or the end of the
+    stream), and a read that finds the ring empty enters rebuffering and
+    waits for `prefill` bytes again, so a Wi-Fi hiccup costs one pause
+    instead of a run of underruns.
+
+    The ring is allocated once; reuse the object across streams.
+    """
+    KB = 1024
+
+    def __init__(self, size=32 * KB, prefill=16 * KB, low=None, high=None):
+        self.size = size
+        self.prefill = min(prefill, size)
+        self.low = size // 2 if low is None else min(low, size)
+        self.high = size if high is None else min(high, size)
+        self._buf = bytearray(size)
+        self._mv = memoryview(self._buf)
+        self._data = asyncio.Event()
+        self._space = asyncio.Event()
+        self._task = None
+        self.reset_stats()
+        self._reset()
+
+    def _reset(self):
+        self._r = 0
+        self._w = 0
+        self.level = 0
+        self._eof = False
+        self._error = None
+        self._started = False
+        self.rebuffering = False
+        self._data.clear()
+        self._space.clear()
+
+    def reset_stats(self):
+        self.streams = 0
+        self.stalls = 0          # underflows after playback had started
+        self.stall_ms = 0        # total time spent rebuffering
+        self.max_stall_ms = 0
+        self.prefill_ms = 0      # start-up wait of the last stream
+        self.min_level = -1      # lowest level a read found after start-up
+
+    # ---------- filler ----------
+    def start(self, read):
+        self._reset()
+        self.streams += 1
+        self._task = asyncio.create_task(self._fill(read))
+
+    async def _fill(self, read):
+        size = self.size
+        try:
+            while True:
+                if self.level >= self.high:
+                    while self.level > self.low:
+                        self._space.clear()
+                        await self._space.wait()
+                w = self._w
+                n = size - self.level
+                if n > size - w:
+                    n = size - w
+                n = await read(self._mv[w:w + n])
+                if not n:
+                    break
+                self._w = (w + n) % size
+                self.level += n
+                self._data.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._error = e
+        finally:
+            self._eof = True
+            self._data.set()
+
+    async def stop(self):
+        task = self._task
+        self._task = None
+        if task is None:
+            return
+        if not task.done():
+            task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            pass
+
+    # ---------- consumer ----------
+    async def _wait_prefill(self):
+        self.rebuffering = True
+        t0 = time.ticks_ms()
+        while self.level < self.prefill and not self._eof:
+            self._data.clear()
+            await self._data.wait()
+        dt = time.ticks_diff(time.ticks_ms(), t0)
+        if self._started:
+            self.stall_ms += dt
+            if dt > self.max_stall_ms:
+                self.max_stall_ms = dt
+        else:
+            self.prefill_ms = dt
+            self._started = True
+        self.rebuffering = False
+
+    async def readinto(self, mv):
+        if not self._started:
+            await self._wait_prefill()
+        else:
+            if self.min_level < 0 or self.level < self.min_level:
+                self.min_level = self.level
+            if not self.level and not self._eof:
+                self.stalls += 1
+                await self._wait_prefill()
+        level = self.level
+        n = len(mv)
+        if n > level:
+            n = level
+        if not n:
+            if self._error is not None:
+                raise self._error
+            return 0
+        r = self._r
+        first = self.size - r
+        if first > n:
+            first = n
+        mv[:first] = self._mv[r:r + first]
+        if first < n:
+            mv[first:n] = self._mv[:n - first]
+        self._r = (r + n) % self.size
+        self.level -= n
+        self._space.set()
+        return n
+
+    def stats(self):
+        return {
+            "net_buffer": self.size,
+            "net_level": self.level,
+            "net_min_level": self.min_level,
+            "net_prefill_ms": self.prefill_ms,
+            "net_stalls": self.stalls,
+            "net_stall_ms": self.stall_ms,
+            "net_max_stall_ms": self.max_stall_ms,
+        }
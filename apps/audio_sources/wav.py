@@ -0,0 +1,220 @@
+"""
+RIFF/WAVE container parsing.
+
+The header is walked chunk by chunk: `fmt ` gives the format (PCM,
+WAVE_FORMAT_EXTENSIBLE with a PCM sub-format, or 4-bit IMA ADPCM), `data` gives the offset and
+length of the samples, everything else (LIST/INFO, fact, cue ...) is
+skipped. read_wav_info() works on any source with async readinto(), so it
+also handles HTTP streams that cannot seek; parse_wav_bytes() does the same
+on a buffer and read_wav_info_file() on a seekable file.
+"""
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IMA_ADPCM = 0x11
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# A data length of 0 or 0xFFFFFFFF is what streaming encoders write when
+# the size is unknown.
+UNKNOWN_LENGTH = 0
+
+
+def _u16(b, i):
+    return b[i] | (b[i + 1] << 8)
+
+
+def _u32(b, i):
+    return b[i] | (b[i + 1] << 8) | (b[i + 2] << 16) | (b[i + 3] << 24)
+
+
+class WavInfo:
+    """
+    Format of a WAV file. `block_align` is the smallest unit the data can be
+    cut at: one frame for PCM, one block of `samples_per_block` frames for
+    ADPCM.
+    """
+
+    def __init__(self, channels=0, rate=0, bits=0, data_offset=0, data_len=UNKNOWN_LENGTH,
+                 fmt=WAVE_FORMAT_PCM, block_align=0):
+        self.channels = channels
+        self.rate = rate
+        self.bits = bits
+        self.data_offset = data_offset
+        self.data_len = data_len
+        self.fmt = fmt
+        self.block_align = block_align or channels * (bits // 8)
+
+    @property
+    def samples_per_block(self):
+        if self.fmt == WAVE_FORMAT_IMA_ADPCM:
+            # 4-byte header per channel holding the first sample, then
+            # two samples per byte.
+            return (self.block_align // self.channels - 4) * 2 + 1
+        return 1
+
+    def duration_ms(self):
+        if not self.rate or not self.block_align or self.data_len == UNKNOWN_LENGTH:
+            return 0
+        frames = self.data_len // self.block_align * self.samples_per_block
+        return frames * 1000 // self.rate
+
+    def to_list(self):
+        return [self.data_offset, self.data_len, self.rate, self.channels, self.bits,
+                self.fmt, self.block_align]
+
+    @classmethod
+    def from_list(cls, v):
+        if len(v) < 7:
+            return cls(channels=v[3], rate=v[2], bits=v[4], data_offset=v[0], data_len=v[1])
+        return cls(channels=v[3], rate=v[2], bits=v[4], data_offset=v[0], data_len=v[1],
+                   fmt=v[5], block_align=v[6])
+
+    def __repr__(self):
+        return "WavInfo({}Hz {}ch {}bit{} data@{}+{})".format(
+            self.rate, self.channels, self.bits,
+            " adpcm" if self.fmt == WAVE_FORMAT_IMA_ADPCM else "",
+            self.data_offset, self.data_len)
+
+
+def _parse_fmt(info, b, size):
+    if size < 16:
+        raise ValueError("wav fmt chunk too short")
+    tag = _u16(b, 0)
+    if tag == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+        tag = _u16(b, 24)    # first two bytes of the sub-format GUID
+    if tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IMA_ADPCM):
+        raise ValueError("unsupported wav format {}".format(tag))
+    info.fmt = tag
+    info.channels = _u16(b, 2)
+    info.rate = _u32(b, 4)
+    info.bits = _u16(b, 14)
+    if info.channels not in (1, 2):
+        raise ValueError("unsupported wav {}ch".format(info.channels))
+    if tag == WAVE_FORMAT_IMA_ADPCM:
+        info.block_align = _u16(b, 12)
+        if info.bits != 4 or info.block_align % (4 * info.channels) or info.block_align <= 4 * info.channels:
+            raise ValueError("unsupported adpcm {}bit block {}".format(info.bits, info.block_align))
+    else:
+        if info.bits not in (8, 16, 24, 32):
+            raise ValueError("unsupported wav {}bit".format(info.bits))
+        info.block_align = info.channels * (info.bits // 8)
+
+
+def _check_riff(b):
+    if b[0:4] != b"RIFF" or b[8:12] != b"WAVE":
+        raise ValueError("not a RIFF/WAVE file")
+
+
+def _data_len(size):
+    return UNKNOWN_LENGTH if size == 0xFFFFFFFF else size
+
+
+def parse_wav_bytes(b):
+    """Walk the chunks of a WAV held in memory."""
+    if len(b) < 12:
+        raise ValueError("wav header too short")
+    _check_riff(b)
+    info = WavInfo()
+    pos = 12
+    while pos + 8 <= len(b):
+        cid = bytes(b[pos:pos + 4])
+        size = _u32(b, pos + 4)
+        pos += 8
+        if cid == b"fmt ":
+            _parse_fmt(info, b[pos:pos + 40], size)
+        elif cid == b"data":
+            if not info.bits:
+                raise ValueError("wav data before fmt")
+            info.data_offset = pos
+            info.data_len = min(_data_len(size) or len(b) - pos, len(b) - pos)
+            return info
+        pos += size + (size & 1)
+    raise ValueError("wav data chunk not found")
+
+
+def read_wav_info_file(path):
+    """Walk the chunks of a WAV file, seeking over the ones not needed."""
+    buf = bytearray(40)
+    mv = memoryview(buf)
+    with open(path, "rb") as f:
+        if f.readinto(mv[:12]) < 12:
+            raise ValueError("wav header too short")
+        _check_riff(buf)
+        info = WavInfo()
+        pos = 12
+        while True:
+            if f.readinto(mv[:8]) < 8:
+                raise ValueError("wav data chunk not found")
+            cid = bytes(buf[0:4])
+            size = _u32(buf, 4)
+            pos += 8
+            if cid == b"fmt ":
+                n = min(size, 40)
+                f.readinto(mv[:n])
+                _parse_fmt(info, buf, size)
+                f.seek(pos + size + (size & 1))
+            elif cid == b"data":
+                if not info.bits:
+                    raise ValueError("wav data before fmt")
+                info.data_offset = pos
+                info.data_len = _data_len(size)
+                return info
+            else:
+                f.seek(pos + size + (size & 1))
+            pos += size + (size & 1)
+
+
+async def _fill(source, mv):
+    got = 0
+    while got < len(mv):
+        n = await source.readinto(mv if got == 0 else mv[got:])
+        if not n:
+            break
+        got += n
+    return got
+
+
+async def read_wav_info(source, buf):
+    """
+    Walk the chunks from a source positioned at the start of the file and
+    leave it positioned at the first sample. `buf` is scratch space of at
+    least 40 bytes.
+    """
+    mv = memoryview(buf)
+    if await _fill(source, mv[:12]) < 12:
+        raise ValueError("wav header too short")
+    _check_riff(buf)
+    info = WavInfo()
+    pos = 12
+    while True:
+        if await _fill(source, mv[:8]) < 8:
+            raise ValueError("wav data chunk not found")
+        cid = bytes(buf[0:4])
+        size = _u32(buf, 4)
+        pos += 8
+        if cid == b"data":
+            if not info.bits:
+                raise ValueError("wav data before fmt")
+            info.data_offset = pos
+            info.data_len = _data_len(size)
+            return info
+        skip = size + (size & 1)
+        if cid == b"fmt ":
+            n = min(skip, 40)
+            await _fill(source, mv[:n])
+            _parse_fmt(info, buf, size)
+            skip -= n
+        pos += size + (size & 1)
+        while skip > 0:
+            n = await _fill(source, mv[:min(skip, len(mv))])
+            if not n:
+                raise ValueError("wav header truncated")
+            skip -= n
+
+
+def read_wav_info_sized(path, size):
+    """read_wav_info_file() with the data length clamped to the file size."""
+    info = read_wav_info_file(path)
+    if info.data_len == UNKNOWN_LENGTH or info.data_offset + info.data_len > size:
+        info.data_len = max(0, size - info.data_offset)
+    return info
+
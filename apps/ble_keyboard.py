@@ -1,7 +1,12 @@
-import asyncio
+import uasyncio as asyncio
+import time
 import aioble
 import bluetooth
-from utils.trace import *
+from hid_report import compile_map, PAGE_CONSUMER, PAGE_DESKTOP, USAGE_X, USAGE_Y
+from utils import trace
+from utils.trace import CAT_BLE, DEBUG_DBG, DEBUG_ERROR, DEBUG_INFO
+
+_TRACE = const(1)
 
 
 # UUIDs for HID
@@ -16,48 +21,146 @@ _REPORT_TYPE_INPUT   = 1
 _REPORT_TYPE_OUTPUT  = 2
 _REPORT_TYPE_FEATURE = 3
 
+# What the callback gets: callback(REPORT_POINTER, [status, x, y]) or
+# callback(REPORT_CONSUMER, usage index). The pointer list is reused for
+# every report, so the callback must not keep it.
+REPORT_POINTER  = 1
+REPORT_CONSUMER = 2
+
 TARGET_NAME = "NSKJ-D2"
 
-_callback = None # callback(report_id, data)
+SCAN_MS            = 3000    # one scan window
+CONNECT_TIMEOUT_MS = 5000
+RETRY_MIN_MS       = 500     # backoff between attempts, doubled after each failure
+RETRY_MAX_MS       = 30000
+DIRECT_TRIES       = 3       # reconnects to the known device before scanning again
+
+# Layout the NSKJ-D2 reports were decoded with before the report map was
+# used: report 1 is an 8-bit button mask, X, Y, W, H (16 bit each);
+# report 2 a 16-bit consumer usage index 1..12. Used when the map can't be read.
+_FALLBACK_MAP = bytes((
+    0x05, 0x0D, 0x09, 0x04, 0xA1, 0x01, 0x85, 0x01,
+    0x05, 0x09, 0x19, 0x01, 0x29, 0x08, 0x15, 0x00, 0x25, 0x01, 0x75, 0x01, 0x95, 0x08, 0x81, 0x02,
+    0x05, 0x01, 0x09, 0x30, 0x09, 0x31, 0x26, 0xFF, 0x7F, 0x75, 0x10, 0x95, 0x02, 0x81, 0x02,
+    0x05, 0x0D, 0x09, 0x48, 0x09, 0x49, 0x95, 0x02, 0x81, 0x02, 0xC0,
+    0x05, 0x0C, 0x09, 0x01, 0xA1, 0x01, 0x85, 0x02,
+    0x15, 0x01, 0x25, 0x0C, 0x75, 0x10, 0x95, 0x01, 0x81, 0x00, 0xC0,
+))
+
+_callback = None # callback(kind, data)
+_conn = None
+_busy = False       # scanning, connecting or connected
+_retry_at = None    # ticks_ms of the next attempt while backing off
+
+
+class _DispatchTime:
+    """
+    Decode-and-dispatch time in us, from notified() returning to the
+    callback done. aioble gives no arrival timestamp, so the wait for the
+    task to be scheduled is not included; tools/ble_replay.py measures the
+    whole path in the simulator.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.last = 0
+
+    def add(self, us):
+        self.count += 1
+        self.total += us
+        self.last = us
+        if us > self.max:
+            self.max = us
+
+
+dispatch_time = _DispatchTime()
+_counts = {"reports": 0, "connects": 0, "failures": 0}
+
+
+class _Input:
+    """One subscribed input report: its compiled layout and output buffer."""
+
+    def __init__(self, report):
+        self.report = report
+        self.kind = None
+        self.x = report.slot(PAGE_DESKTOP, USAGE_X)
+        self.y = report.slot(PAGE_DESKTOP, USAGE_Y)
+        if self.x >= 0 and self.y >= 0:
+            self.kind = REPORT_POINTER
+            # 1-bit fields (buttons, tip switch, in range) packed into the status.
+            self.bits = bytearray(i for i in range(len(report)) if report.sizes[i] == 1)
+            self.out = [0, 0, 0]
+        elif report.has_page(PAGE_CONSUMER):
+            self.kind = REPORT_CONSUMER
+
+    def dispatch(self, data):
+        values = self.report.decode(data)
+        if self.kind == REPORT_POINTER:
+            status = 0
+            bits = self.bits
+            for k in range(len(bits)):
+                status |= values[bits[k]] << k
+            out = self.out
+            out[0] = status
+            out[1] = values[self.x]
+            out[2] = values[self.y]
+            if _callback:
+                _callback(REPORT_POINTER, out)
+        elif _callback:
+            _callback(REPORT_CONSUMER, values[0])
+
 
 async def find_hid_device(device_name):
-    dprint(DEBUG_DBG, "Scanning for HID device...")
-    async with aioble.scan(duration_ms=10000, interval_us=30000, window_us=30000) as scanner:
+    trace.log(CAT_BLE, DEBUG_DBG, "Scanning for HID device...")
+    async with aioble.scan(duration_ms=SCAN_MS, interval_us=30000, window_us=30000) as scanner:
         async for result in scanner:
             name = result.name() or "?"
-            # if _UUID_HID_SERVICE in result.services():
-            #     print("Found HID:", name, result.device)
-            #     return result.device
             if name == device_name:
-                dprint(DEBUG_INFO, "Found:", name, result.device)
+                trace.log(CAT_BLE, DEBUG_INFO, "Found:", name, result.device)
                 return result.device
     return None
 
 
+async def read_report_map(service, mtu):
+    """The compiled input reports of the device, or of _FALLBACK_MAP."""
+    try:
+        char_map = await service.characteristic(_UUID_REPORT_MAP)
+        report_map = await char_map.read()
+        if len(report_map) == mtu - 1:
+            report_map = await char_map.read_long(mtu - 1, 5000)
+        if trace.on(CAT_BLE, DEBUG_DBG):
+            trace.log(CAT_BLE, DEBUG_DBG, "Report Map (hex):", report_map.hex())
+        reports = compile_map(report_map)
+        if reports:
+            return reports
+        trace.log(CAT_BLE, DEBUG_ERROR, "Report Map has no input reports")
+    except Exception as e:
+        trace.log(CAT_BLE, DEBUG_ERROR, "Failed to read Report Map:", type(e).__name__, e)
+    return compile_map(_FALLBACK_MAP)
+
+
 async def connect_and_discover(device):
-    dprint(DEBUG_INFO, "Connecting to:", device)
-    connection = await device.connect()
-    dprint(DEBUG_INFO, "Connected:", connection.device)
+    trace.log(CAT_BLE, DEBUG_INFO, "Connecting to:", device)
+    connection = await device.connect(timeout_ms=CONNECT_TIMEOUT_MS)
+    trace.log(CAT_BLE, DEBUG_INFO, "Connected:", connection.device)
 
     mtu = await connection.exchange_mtu()
-    dprint(DEBUG_DBG, "MTU:", mtu)
+    trace.log(CAT_BLE, DEBUG_DBG, "MTU:", mtu)
 
     # Need Paired
     await connection.pair()
 
     # Discover HID service
     service = await connection.service(_UUID_HID_SERVICE)
-    dprint(DEBUG_DBG, "HID service found:", service)
+    trace.log(CAT_BLE, DEBUG_DBG, "HID service found:", service)
 
-    # --- 1. Read Report Map (Characteristic 0x2A4B) ---
-    try:
-        char_map = await service.characteristic(_UUID_REPORT_MAP)
-        report_map = await char_map.read()
-        if len(report_map) == mtu - 1:
-            report_map = await char_map.read_long(mtu - 1, 5000)
-        dprint(DEBUG_DBG, "Report Map (hex):", report_map.hex())
-    except Exception as e:
-        dprint(DEBUG_ERROR, "Failed to read Report Map:", e)
+    # --- 1. Read and compile the Report Map (Characteristic 0x2A4B) ---
+    reports = await read_report_map(service, mtu)
 
     # --- 2. Find all Report characteristics (0x2A4D) ---
     report_chars = []
@@ -65,7 +168,7 @@ async def connect_and_discover(device):
         if char.uuid == _UUID_REPORT:
             report_chars.append(char)
 
-    input_reports = []
+    inputs = []
     for char in report_chars:
         # Each Report has a Report Reference descriptor (0x2908)
         try:
@@ -73,97 +176,109 @@ async def connect_and_discover(device):
             ref_val = await desc.read()
             report_id = ref_val[0]
             report_type = ref_val[1]
-            dprint(DEBUG_DBG, "Report Char handle=", char.uuid, 
-                  "ReportID=", report_id, 
-                  "Type=", report_type)
-
-            if report_type == _REPORT_TYPE_INPUT:
-                input_reports.append((char, report_id))
+            trace.log(CAT_BLE, DEBUG_DBG, "Report char id/type", report_id, report_type)
+            if report_type != _REPORT_TYPE_INPUT:
+                continue
+            report = reports.get(report_id)
+            inp = _Input(report) if report is not None else None
+            if inp is None or inp.kind is None:
+                trace.log(CAT_BLE, DEBUG_INFO, "Unsupport report id:", report_id)
+                continue
+            inputs.append((char, inp))
 
         except Exception as e:
-            dprint(DEBUG_ERROR, "No Report Reference for char", char, e)
+            trace.log(CAT_BLE, DEBUG_ERROR, "No Report Reference for char", char, type(e).__name__, e)
 
     # --- 3. Subscribe to Input Report notifications ---
-    async def handle_input(char, report_id):
-        #await char.subscribe(notify=True)
-        dprint(DEBUG_DBG, "Subscribed to Input Report:", report_id)
-        try:
-            while True:
-                data = await char.notified()
-                dprint(DEBUG_DBG, f"[Input Report {report_id}] Data:", data.hex())
-                if report_id == 1:
-                    status = data[0]
-                    x = data[1] | (data[2] << 8)
-                    y = data[3] | (data[4] << 8)
-                    w = data[5] | (data[6] << 8)
-                    h = data[7] | (data[8] << 8) if len(data) >= 9 else None
-                    dprint(DEBUG_DBG, "Status: {}, X: {}, Y: {}, W: {}, H: {}".format(status, x, y, w, h))
-
-                    if _callback:
-                        _callback(report_id, (status, x, y))
-                elif report_id == 2:
-                    CONSUMER_USAGE_MAP = {
-                        1: "Volume Up",
-                        2: "Volume Down",
-                        3: "Mute",
-                        4: "Scan Next Track",
-                        5: "Scan Previous Track",
-                        6: "AC Back",
-                        7: "Play/Pause",
-                        8: "Power",
-                        9: "AC Home",
-                        10: "Menu",
-                        11: "Reserved",
-                        12: "Reserved"
-                    }
-                    # 取出 16-bit 数值（小端序）
-                    value = data[0] | (data[1] << 8)
-
-                    # 映射到 usage 名称
-                    dprint(DEBUG_DBG, CONSUMER_USAGE_MAP.get(value, f"Unknown Usage ({value})"))
-
-                    if _callback:
-                        _callback(report_id, value)
-                else:
-                    dprint(DEBUG_INFO, "Unsupport report id:", report_id)
-        except Exception as e:
-            dprint(DEBUG_ERROR, "Notification loop stopped:", e)
-
-    # Start tasks for each input report
-    for char, report_id in input_reports:
+    for char, inp in inputs:
         await char.subscribe(notify=True)
-        asyncio.create_task(handle_input(char, report_id))
+        asyncio.create_task(handle_input(char, inp))
 
     return connection
 
 
+async def handle_input(char, inp):
+    trace.log(CAT_BLE, DEBUG_DBG, "Subscribed to Input Report:", inp.report.report_id)
+    try:
+        while True:
+            data = await char.notified()
+            t0 = time.ticks_us()
+            inp.dispatch(data)
+            dispatch_time.add(time.ticks_diff(time.ticks_us(), t0))
+            _counts["reports"] += 1
+            if _TRACE and trace.on(CAT_BLE, DEBUG_DBG):
+                trace.log(CAT_BLE, DEBUG_DBG, "Input report", inp.report.report_id, data.hex())
+    except Exception as e:
+        trace.log(CAT_BLE, DEBUG_ERROR, "Notification loop stopped:", type(e).__name__, e)
+
+
 async def loop_task():
+    """Scan, connect, wait for the link to drop, reconnect; back off while failing."""
+    global _conn, _busy, _retry_at
+    dev = None
+    tries = 0
+    backoff = RETRY_MIN_MS
     while True:
+        conn = None
+        _busy = True
+        _retry_at = None
         try:
-            dev = await find_hid_device(TARGET_NAME)
-            if not dev:
-                dprint(DEBUG_DBG, "Retry scanning...")
-                await asyncio.sleep(2)
-                continue
-
-            conn = await connect_and_discover(dev)
-
-            # Keep running
-            while conn.is_connected():
-                await asyncio.sleep(1)
-            dprint(DEBUG_INFO, "Disconnected, restarting scan...")
-
+            if dev is None:
+                dev = await find_hid_device(TARGET_NAME)
+            if dev is not None:
+                conn = await connect_and_discover(dev)
+                _conn = conn
+                _counts["connects"] += 1
+                tries = 0
+                backoff = RETRY_MIN_MS
+
+                # Keep running
+                await conn.disconnected(timeout_ms=None)
+                trace.log(CAT_BLE, DEBUG_INFO, "Disconnected, reconnecting...")
+            else:
+                trace.log(CAT_BLE, DEBUG_DBG, "Retry scanning...")
         except Exception as e:
-            dprint(DEBUG_ERROR, "Main loop error:", e)
+            trace.log(CAT_BLE, DEBUG_ERROR, "Main loop error:", type(e).__name__, e)
+            _counts["failures"] += 1
+            tries += 1
+            if tries >= DIRECT_TRIES:
+                dev = None      # gone for good? find it again
+                tries = 0
 
         # 确保断开连接，避免资源泄漏
+        _conn = None
         try:
             if conn and conn.is_connected():
                 await conn.disconnect()
         except Exception as e:
-            dprint(DEBUG_ERROR, "Disconnect error:", e)
-
-        await asyncio.sleep(2)  # 延时后再扫描
+            trace.log(CAT_BLE, DEBUG_ERROR, "Disconnect error:", type(e).__name__, e)
+
+        # Nothing to do until the retry: the CPU may sleep up to then.
+        _busy = False
+        _retry_at = time.ticks_add(time.ticks_ms(), backoff)
+        await asyncio.sleep_ms(backoff)
+        backoff = min(backoff * 2, RETRY_MAX_MS)
+
+def connected():
+    return _conn is not None and _conn.is_connected()
+
+def busy():
+    """True while scanning, connecting or connected: no light sleep then."""
+    return _busy
+
+def next_retry_ms():
+    """ms until the next scan/connect attempt while backing off, else None."""
+    if _retry_at is None:
+        return None
+    return max(0, time.ticks_diff(_retry_at, time.ticks_ms()))
+
+def stats():
+    """Counters and decode-and-dispatch time (us) since start."""
+    s = dict(_counts)
+    t = dispatch_time
+    s["dispatch_avg_us"] = t.total // t.count if t.count else 0
+    s["dispatch_max_us"] = t.max
+    return s
 
 def start(callback):
     global _callback
@@ -24,6 +24,10 @@ TFT_SPI_FREQ = 40_000_000
 TFT_GPIO_RESET = 40
 TFT_GPIO_DC = 39
 TFT_GPIO_BLK = 38
+# Panel geometry: any size st7789py knows (240x320, 240x240, 135x240, 128x128)
+TFT_WIDTH = 240
+TFT_HEIGHT = 240
+TFT_ROTATION = 1
 
 # WS2812 
 WS2812_PIN = 6
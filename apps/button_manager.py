@@ -1,54 +1,115 @@
 import uasyncio as asyncio
+import machine
 from machine import Pin
+import micropython
 import time
+from array import array
+from utils import trace
 from utils.queue import EventQueue
+from utils.trace import CAT_INPUT, DEBUG_ERROR
+
+try:
+    import esp32
+except ImportError:
+    esp32 = None
+
+micropython.alloc_emergency_exception_buf(100)
+
+
+class _Button:
+    """Debounce and gesture state of one key."""
+
+    def __init__(self, mgr, index, key, pin=None, repeat=False):
+        self.mgr = mgr
+        self.index = index
+        self.key = key             # pin number, or the id given to inject()
+        self.pin = pin
+        self.repeat = repeat
+        self.stable = pin.value() if pin is not None else 1   # 0: pressed
+        self.raw = self.stable
+        self.lock_until = None     # edges before this are contact bounce
+        self.long_at = None
+        self.repeat_at = None
+        self.long = False          # long press fired for this press
+        self.last_click = None     # press time of the last short press
+
+    def irq(self, pin):
+        # Hard IRQ: no allocation, just record the edge.
+        self.mgr._push(self.index, pin.value())
+
 
 # ---------------------------
 # 按键管理器
 # ---------------------------
 class ButtonManager:
-    def __init__(self, pins, debounce_ms=50, poll_ms=10, callback=None):
-        self.buttons = {p: Pin(p, Pin.IN, Pin.PULL_UP) for p in pins}
-        self.states = {p: self.buttons[p].value() for p in pins}
-        self.last_change_time = {p: time.ticks_ms() for p in pins}
+    """
+    GPIO keys (pull-up, pressed = 0) turned into events:
+
+        {"pin": pin, "state": s, "time": ticks_ms}
+
+    with s one of "pressed", "released", "long" (once, LONG_MS into a
+    press, or what `long_ms(key)` gives for that key), "repeat" (while held, for `repeat_pins` only) and "double"
+    (right after the "pressed" of a second short press within DOUBLE_MS).
+
+    Pin edge IRQs store (time, key, level) in a preallocated ring and set a
+    ThreadSafeFlag; the consumer task drains the ring and runs the debounce
+    and gesture state machines. A change is taken at its first edge, then
+    edges are ignored for debounce_ms and the level is read again, so a
+    press costs no debounce latency. With nothing held the task sleeps on
+    the flag and does not wake the CPU. Without pin IRQs (or use_irq=False)
+    the pins are polled every poll_ms instead, through the same state
+    machines. inject() feeds keys from other sources (BLE) through the
+    gesture detection.
+    """
+    RING = 32
+    LONG_MS = 1000
+    DOUBLE_MS = 350
+    REPEAT_DELAY_MS = 500
+    REPEAT_MS = 120
+
+    def __init__(self, pins, debounce_ms=50, poll_ms=10, callback=None, repeat_pins=(), use_irq=True,
+                 long_ms=None):
         self.debounce_ms = debounce_ms
         self.poll_ms = poll_ms
         self.event_queue = EventQueue()
         self.callback = callback   # 可选回调函数
+        self.use_irq = use_irq
+        self.repeat_pins = repeat_pins
+        self.long_ms = long_ms     # key -> hold time of its "long" at press, None: LONG_MS
+        self.mode = None           # "irq" or "poll" once started
+        self.wakeups = 0
+        self.overflows = 0
+
+        self._keys = [_Button(self, i, p, Pin(p, Pin.IN, Pin.PULL_UP), p in repeat_pins)
+                      for i, p in enumerate(pins)]
+        self._virtual = {}
+        self._times = array("I", bytes(4 * self.RING))
+        self._codes = bytearray(self.RING)
+        self._head = 0
+        self._tail = 0
+        self._overflow = False
+        self._flag = asyncio.ThreadSafeFlag()
 
     def set_callback(self, cb):
         """动态设置/替换回调函数"""
         self.callback = cb
 
-    async def _poll_task(self):
-        """后台轮询任务：检测多个按键并投递事件"""
-        while True:
-            now = time.ticks_ms()
-            for pin_num, btn in self.buttons.items():
-                current_state = btn.value()
-                last_state = self.states[pin_num]
-
-                if current_state != last_state:
-                    if time.ticks_diff(now, self.last_change_time[pin_num]) > self.debounce_ms:
-                        self.states[pin_num] = current_state
-                        self.last_change_time[pin_num] = now
-                        event = {
-                            "pin": pin_num,
-                            "state": "pressed" if current_state == 0 else "released",
-                            "time": now
-                        }
-                        # --- 核心逻辑：两种处理方式 ---
-                        if self.callback:
-                            try:
-                                self.callback(event)
-                            except Exception as e:
-                                print("Callback error:", e)
-                        else:
-                            self.event_queue.put(event)
-
-            await asyncio.sleep_ms(self.poll_ms)
-
     def start(self):
+        if self.use_irq:
+            try:
+                for b in self._keys:
+                    b.pin.irq(handler=b.irq, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, hard=True)
+                self.mode = "irq"
+                asyncio.create_task(self._irq_task())
+                return
+            except (AttributeError, TypeError, ValueError, OSError) as e:
+                trace.log(CAT_INPUT, DEBUG_ERROR, "irq error, polling:", type(e).__name__, e)
+                for b in self._keys:
+                    try:
+                        b.pin.irq(handler=None)
+                    except Exception:
+                        pass
+        self.mode = "poll"
         asyncio.create_task(self._poll_task())
 
     async def get_event(self):
@@ -59,6 +120,180 @@ class ButtonManager:
         """非阻塞取事件"""
         return self.event_queue.get_nowait()
 
+    def inject(self, key, pressed):
+        """Press or release a key that is not a GPIO (no debounce)."""
+        b = self._virtual.get(key)
+        if b is None:
+            b = self._virtual[key] = _Button(self, -1, key, None, key in self.repeat_pins)
+        level = 0 if pressed else 1
+        if level != b.stable:
+            self._accept(b, level, time.ticks_ms())
+            self._flag.set()    # new deadlines for the consumer
+
+    def idle(self):
+        """True when no key is down and no edge or deadline is pending."""
+        if self._head != self._tail or self._overflow:
+            return False
+        for b in self._all():
+            if b.stable == 0 or b.lock_until is not None:
+                return False
+        return True
+
+    def set_wake(self, on):
+        """
+        Arm the keys as light-sleep wake sources (a low level on any of them
+        wakes the CPU), or disarm them after the sleep. False if the port
+        cannot wake on these pins.
+
+        On the ESP32 this is ext1 over all keys: Pin.irq(wake=) is ext0,
+        which takes a single pin. The keys are active low, and on the S3
+        WAKEUP_ALL_LOW is any-low. Other ports arm each pin with Pin.irq()
+        and give the keys back their edge IRQs after the sleep.
+        """
+        try:
+            if esp32 is not None:
+                pins = tuple(b.pin for b in self._keys) if on else None
+                esp32.wake_on_ext1(pins=pins, level=esp32.WAKEUP_ALL_LOW)
+            else:
+                for b in self._keys:
+                    if on:
+                        b.pin.irq(handler=None)
+                        b.pin.irq(trigger=Pin.WAKE_LOW, wake=machine.SLEEP)
+                    elif self.mode == "irq":
+                        b.pin.irq(handler=b.irq, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, hard=True)
+                    else:
+                        b.pin.irq(handler=None)
+        except (AttributeError, TypeError, ValueError, OSError) as e:
+            trace.log(CAT_INPUT, DEBUG_ERROR, "wake error:", type(e).__name__, e)
+            return False
+        if not on:
+            # The key that woke the CPU went down while no edges were recorded.
+            for b in self._keys:
+                v = b.pin.value()
+                if v != b.raw:
+                    self._push(b.index, v)
+        return True
+
+    # ---------- producers ----------
+    def _push(self, index, level):
+        head = self._head
+        nxt = (head + 1) % self.RING
+        if nxt == self._tail:
+            self._overflow = True
+        else:
+            self._times[head] = time.ticks_ms()
+            self._codes[head] = index << 1 | level
+            self._head = nxt
+        self._flag.set()
+
+    async def _irq_task(self):
+        while True:
+            wait = self._service(time.ticks_ms())
+            if wait is None:
+                await self._flag.wait()
+            else:
+                try:
+                    await asyncio.wait_for_ms(self._flag.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            self.wakeups += 1
+
+    async def _poll_task(self):
+        """后台轮询任务：采样按键电平，交给同一套状态机"""
+        while True:
+            for b in self._keys:
+                v = b.pin.value()
+                if v != b.raw:
+                    self._push(b.index, v)
+            self._service(time.ticks_ms())
+            await asyncio.sleep_ms(self.poll_ms)
+            self.wakeups += 1
+
+    # ---------- state machines ----------
+    def _service(self, now):
+        """Handle recorded edges and due deadlines; ms to the next deadline or None."""
+        while self._tail != self._head:
+            t = self._tail
+            code = self._codes[t]
+            self._edge(self._keys[code >> 1], code & 1, self._times[t])
+            self._tail = (t + 1) % self.RING
+        if self._overflow:
+            # Edges were lost: take the levels as they are now.
+            self._overflow = False
+            self.overflows += 1
+            for b in self._keys:
+                b.raw = b.pin.value()
+                if b.lock_until is None and b.raw != b.stable:
+                    self._accept(b, b.raw, now)
+
+        wait = None
+        for b in self._all():
+            if b.lock_until is not None and time.ticks_diff(now, b.lock_until) >= 0:
+                b.lock_until = None
+                level = b.pin.value()
+                b.raw = level
+                if level != b.stable:
+                    self._accept(b, level, now)
+            if b.long_at is not None and time.ticks_diff(now, b.long_at) >= 0:
+                b.long_at = None
+                b.long = True
+                b.last_click = None
+                self._emit(b, "long", now)
+            if b.repeat_at is not None and time.ticks_diff(now, b.repeat_at) >= 0:
+                self._emit(b, "repeat", now)
+                b.repeat_at = time.ticks_add(now, self.REPEAT_MS)
+            for at in (b.lock_until, b.long_at, b.repeat_at):
+                if at is not None:
+                    d = max(0, time.ticks_diff(at, now))
+                    if wait is None or d < wait:
+                        wait = d
+        return wait
+
+    def _all(self):
+        if self._virtual:
+            return self._keys + list(self._virtual.values())
+        return self._keys
+
+    def _edge(self, b, level, t):
+        b.raw = level
+        if b.lock_until is None and level != b.stable:
+            self._accept(b, level, t)
+
+    def _accept(self, b, level, t):
+        b.stable = level
+        if b.pin is not None:
+            b.lock_until = time.ticks_add(t, self.debounce_ms)
+        if level == 0:
+            self._emit(b, "pressed", t)
+            if b.last_click is not None and time.ticks_diff(t, b.last_click) <= self.DOUBLE_MS:
+                b.last_click = None
+                self._emit(b, "double", t)
+            else:
+                b.last_click = t
+            b.long = False
+            hold = self.long_ms(b.key) if self.long_ms is not None else None
+            b.long_at = time.ticks_add(t, hold or self.LONG_MS)
+            b.repeat_at = time.ticks_add(t, self.REPEAT_DELAY_MS) if b.repeat else None
+        else:
+            b.long_at = None
+            b.repeat_at = None
+            self._emit(b, "released", t)
+
+    def _emit(self, b, state, t):
+        event = {
+            "pin": b.key,
+            "state": state,
+            "time": t
+        }
+        # --- 核心逻辑：两种处理方式 ---
+        if self.callback:
+            try:
+                self.callback(event)
+            except Exception as e:
+                trace.log(CAT_INPUT, DEBUG_ERROR, "callback error:", type(e).__name__, e)
+        else:
+            self.event_queue.put(event)
+
 
 # ---------------------------
 # 示例：外部读取
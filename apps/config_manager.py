@@ -1,52 +1,211 @@
-import ujson as json
+"""
+Settings kept in config.json.
+
+set() only changes RAM and notifies subscribers; a background task started
+by start() writes the file SAVE_DELAY_MS after the last change (at most
+SAVE_MAX_MS after the first), so a burst of volume presses is one write
+and nothing is written on the UI path. save() writes at once, e.g. before
+power off.
+
+A save never rewrites config.json in place: the JSON goes to config.tmp
+with a trailing "#<crc32>" line, the current file becomes config.bak and
+config.tmp is renamed over config.json. Loading takes the first of
+config.json, config.tmp and config.bak whose checksum matches, so a power
+loss at any step leaves a complete copy. A plain JSON file without the
+checksum line (written before this format) is still accepted.
+"""
+
 import os
+import time
+import uasyncio as asyncio
+import ujson as json
+
+from utils import trace
+from utils.trace import CAT_CONFIG, DEBUG_ERROR, DEBUG_INFO
+
+try:
+    from ubinascii import crc32
+except ImportError:
+    def crc32(data, crc=0):
+        crc ^= 0xFFFFFFFF
+        for b in data:
+            crc ^= b
+            for _ in range(8):
+                crc = (crc >> 1) ^ (0xEDB88320 if crc & 1 else 0)
+        return crc ^ 0xFFFFFFFF
+
+
+class ConfigValue:
+    """
+    A typed, cached view of one key: `.value` is kept current by a
+    subscription, so hot paths read an attribute instead of calling get().
+    A stored value of the wrong type (or out of [lo, hi]) reads as the default.
+    """
+
+    def __init__(self, manager, key, kind, lo=None, hi=None, on_change=None):
+        self._manager = manager
+        self.key = key
+        self.kind = kind
+        self.lo = lo
+        self.hi = hi
+        self.on_change = on_change
+        self.default = manager._default_config.get(key)
+        self.value = self._coerce(manager.get(key))
+        manager.subscribe(key, self._changed)
+
+    def _coerce(self, v):
+        kind = self.kind
+        if kind is int and isinstance(v, bool):
+            v = None
+        elif kind is int and isinstance(v, float):
+            v = int(v)
+        if not isinstance(v, kind):
+            return self.default
+        if self.lo is not None and v < self.lo:
+            v = self.lo
+        if self.hi is not None and v > self.hi:
+            v = self.hi
+        return v
+
+    def _changed(self, v):
+        self.value = self._coerce(v)
+        if self.on_change is not None:
+            self.on_change(self.value)
+
+    def close(self):
+        self._manager.unsubscribe(self.key, self._changed)
+
 
 class ConfigManager:
     _instance = None
     _config_file = "config.json"
 
+    SAVE_DELAY_MS = 2000    # quiet time after the last set() before writing
+    SAVE_MAX_MS = 10000     # write at the latest this long after the first
+
     _default_config = {
         "volume": 10,
         "tts_enable": True,
+        "key_click": True, # click on key presses, mixed into the music
         "players": ["Ciya", "Qiang"],
         "ball_bgcolors": [0x07E0, 0x001F], #GREEN, BLUE
+        "audio_output": None, # e.g. [16000, 2]: fixed I2S format, sources converted
+        "audio_clip_cache_kb": 160, # RAM for short prompt clips (res/wav)
+        "net_buffer_kb": 32, # network jitter buffer for HTTP streams
+        "net_prefill_kb": 16, # buffered before a stream starts or resumes
+        "screen_dim_s": 30, # dim the backlight after this long without input, 0: never
+        "screen_off_s": 60, # backlight off, 0: never
+        "light_sleep": True, # light-sleep the CPU while idle
     }
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(ConfigManager, cls).__new__(cls)
             cls._instance._config = {}
+            cls._instance._subs = {}
             cls._instance._dirty = False
+            cls._instance._changed_ms = 0
+            cls._instance._kick = None
+            cls._instance._task = None
+            cls._instance.saves = 0
             cls._instance._load()
         return cls._instance
 
+    # ---------- file ----------
     def _load(self):
-        try:
-            if self._config_file in os.listdir():
-                with open(self._config_file, "r") as f:
-                    self._config = json.load(f)
-            else:
-                self._config = self._default_config.copy()
-                self._dirty = True
-        except Exception as e:
-            print("Config load error:", e)
-            self._config = self._default_config.copy()
-            self._dirty = True
+        base = self._config_file.rsplit(".", 1)[0]
+        for path in (self._config_file, base + ".tmp", base + ".bak"):
+            data = self._read(path)
+            if data is not None:
+                self._config = data
+                if path != self._config_file:
+                    trace.log(CAT_CONFIG, DEBUG_INFO, "recovered from", path)
+                    self._dirty = True
+                return
+        self._config = self._default_config.copy()
+        self._dirty = True
 
-        #if self._dirty:
-        #    self.save()
+    def _read(self, path):
+        # The parsed config of `path`, or None if missing, torn or corrupt.
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+        except OSError:
+            return None
+        body = raw
+        i = raw.rfind(b"\n#")
+        if i >= 0:
+            body = raw[:i]
+            try:
+                if int(raw[i + 2:].strip(), 16) != crc32(body) & 0xFFFFFFFF:
+                    trace.log(CAT_CONFIG, DEBUG_ERROR, "checksum mismatch:", path)
+                    return None
+            except ValueError:
+                return None
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            trace.log(CAT_CONFIG, DEBUG_ERROR, "load error:", path, type(e).__name__, e)
+            return None
+        return data if isinstance(data, dict) else None
 
     def save(self):
+        """Write the config now if it changed."""
         if not self._dirty:
             return
 
+        base = self._config_file.rsplit(".", 1)[0]
+        tmp = base + ".tmp"
+        bak = base + ".bak"
         try:
-            with open(self._config_file, "w") as f:
-                json.dump(self._config, f)
-            self._dirty = False 
+            body = json.dumps(self._config).encode()
+            with open(tmp, "wb") as f:
+                f.write(body)
+                f.write("\n#{:08x}\n".format(crc32(body) & 0xFFFFFFFF).encode())
+            try:
+                os.remove(bak)
+            except OSError:
+                pass
+            try:
+                os.rename(self._config_file, bak)
+            except OSError:
+                pass
+            os.rename(tmp, self._config_file)
+            self._dirty = False
+            self.saves += 1
         except Exception as e:
-            print("Config save error:", e)
+            trace.log(CAT_CONFIG, DEBUG_ERROR, "save error:", type(e).__name__, e)
+
+    # ---------- write-behind ----------
+    def start(self):
+        """Start the background saver; call once from the running event loop."""
+        if self._task is None:
+            # Defaults on first boot, or a copy recovered by _load.
+            self.save()
+            self._kick = asyncio.Event()
+            self._task = asyncio.create_task(self._saver())
+
+    async def _saver(self):
+        while True:
+            await self._kick.wait()
+            self._kick.clear()
+            first = time.ticks_ms()
+            while self._dirty:
+                now = time.ticks_ms()
+                quiet = time.ticks_diff(now, self._changed_ms)
+                age = time.ticks_diff(now, first)
+                if quiet >= self.SAVE_DELAY_MS or age >= self.SAVE_MAX_MS:
+                    self.save()
+                    break
+                await asyncio.sleep_ms(min(self.SAVE_DELAY_MS - quiet, self.SAVE_MAX_MS - age))
 
+    def _changed(self):
+        self._dirty = True
+        self._changed_ms = time.ticks_ms()
+        if self._kick is not None:
+            self._kick.set()
+
+    # ---------- values ----------
     def get(self, key):
         return self._config.get(key, self._default_config.get(key))
 
@@ -55,11 +214,37 @@ class ConfigManager:
 
         if old != value:
             self._config[key] = value
-            self._dirty = True
+            self._changed()
+            self._notify(key, value)
+
+    def value(self, key, kind, lo=None, hi=None, on_change=None):
+        """A ConfigValue for `key` of type `kind`, optionally clamped to [lo, hi]."""
+        return ConfigValue(self, key, kind, lo, hi, on_change)
+
+    # ---------- subscribe ----------
+    def subscribe(self, key, cb):
+        """cb(value) is called whenever `key` changes."""
+        self._subs.setdefault(key, []).append(cb)
+
+    def unsubscribe(self, key, cb):
+        cbs = self._subs.get(key)
+        if cbs and cb in cbs:
+            cbs.remove(cb)
+
+    def _notify(self, key, value):
+        for cb in self._subs.get(key, ()):
+            try:
+                cb(value)
+            except Exception as e:
+                trace.log(CAT_CONFIG, DEBUG_ERROR, "callback error:", key, type(e).__name__, e)
 
     def get_all(self):
         return self._config
 
     def reset(self):
+        old = self._config
         self._config = self._default_config.copy()
-        self._dirty = True
+        self._changed()
+        for key in self._subs:
+            if old.get(key) != self.get(key):
+                self._notify(key, self.get(key))
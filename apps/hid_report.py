@@ -0,0 +1,203 @@
+"""
+HID report map compiler and decoder.
+
+compile_map() walks a HID report descriptor once and returns, for every
+input report ID, a Report with the bit position of each data field. A
+Report decodes a notification into its preallocated `values` array, so
+decoding allocates nothing:
+
+    reports = compile_map(report_map)
+    r = reports[1]
+    r.decode(data)
+    x = r.values[r.slot(PAGE_DESKTOP, USAGE_X)]
+
+Variable fields give one value per usage; array fields give the raw
+index of each slot (usage 0). Constant (padding) fields are skipped.
+Values are sign-extended when the field's logical minimum is negative.
+"""
+
+from array import array
+
+PAGE_DESKTOP = 0x01
+PAGE_BUTTON = 0x09
+PAGE_DIGITIZER = 0x0D
+PAGE_CONSUMER = 0x0C
+
+USAGE_X = 0x30
+USAGE_Y = 0x31
+
+# Item tags (prefix byte without its size bits)
+_MAIN_INPUT = 0x80
+_GLOBAL_USAGE_PAGE = 0x04
+_GLOBAL_LOGICAL_MIN = 0x14
+_GLOBAL_REPORT_SIZE = 0x74
+_GLOBAL_REPORT_ID = 0x84
+_GLOBAL_REPORT_COUNT = 0x94
+_GLOBAL_PUSH = 0xA4
+_GLOBAL_POP = 0xB4
+_LOCAL_USAGE = 0x08
+_LOCAL_USAGE_MIN = 0x18
+_LOCAL_USAGE_MAX = 0x28
+
+_IN_CONSTANT = 0x01
+_IN_VARIABLE = 0x02
+
+
+class Report:
+    """Compiled layout of one input report."""
+
+    def __init__(self, report_id, fields):
+        # fields: (page, usage, bit offset, bit size, signed)
+        self.report_id = report_id
+        n = len(fields)
+        self.usages = array("I", [f[0] << 16 | f[1] for f in fields])
+        self.offsets = array("H", [f[2] for f in fields])
+        self.sizes = bytearray([f[3] for f in fields])
+        self.signed = bytearray([1 if f[4] else 0 for f in fields])
+        self.values = array("i", bytes(4 * n))
+        self.bits = (fields[-1][2] + fields[-1][3]) if fields else 0
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def slot(self, page, usage):
+        """Index of the field with this usage in `values`, or -1."""
+        key = page << 16 | usage
+        for i in range(len(self.usages)):
+            if self.usages[i] == key:
+                return i
+        return -1
+
+    def has_page(self, page):
+        """True if any field is on this usage page."""
+        for u in self.usages:
+            if u >> 16 == page:
+                return True
+        return False
+
+    def decode(self, data):
+        """Fill `values` from a report (without report ID byte); fields past its end read 0."""
+        have = len(data) << 3
+        offsets = self.offsets
+        sizes = self.sizes
+        values = self.values
+        for i in range(len(offsets)):
+            off = offsets[i]
+            size = sizes[i]
+            if off + size > have:
+                values[i] = 0
+                continue
+            b = off >> 3
+            shift = off & 7
+            if shift == 0 and size == 8:
+                v = data[b]
+            elif shift == 0 and size == 16:
+                v = data[b] | data[b + 1] << 8
+            else:
+                v = 0
+                end = (off + size + 7) >> 3
+                s = 0
+                while b < end:
+                    v |= data[b] << s
+                    s += 8
+                    b += 1
+                v = (v >> shift) & ((1 << size) - 1)
+            if self.signed[i] and v >> (size - 1):
+                v -= 1 << size
+            values[i] = v
+        return values
+
+
+def _unsigned(data, i, n):
+    v = 0
+    for k in range(n):
+        v |= data[i + k] << (8 * k)
+    return v
+
+
+def _signed(v, n):
+    if n and v >> (8 * n - 1):
+        v -= 1 << (8 * n)
+    return v
+
+
+def compile_map(report_map):
+    """{report_id: Report} for the input reports of a HID report descriptor."""
+    page = 0
+    logical_min = 0
+    size = 0
+    count = 0
+    report_id = 0
+    stack = []
+    usages = []
+    usage_min = None
+    fields = {}     # report_id -> [field]
+    bitpos = {}     # report_id -> next bit
+
+    i = 0
+    n = len(report_map)
+    while i < n:
+        prefix = report_map[i]
+        if prefix == 0xFE:              # long item: skip it
+            if i + 2 >= n:
+                break
+            i += 3 + report_map[i + 1]
+            continue
+        dlen = (0, 1, 2, 4)[prefix & 3]
+        if i + 1 + dlen > n:
+            raise ValueError("truncated report map")
+        v = _unsigned(report_map, i + 1, dlen)
+        tag = prefix & 0xFC
+        i += 1 + dlen
+
+        if tag == _MAIN_INPUT:
+            off = bitpos.get(report_id, 0)
+            if not v & _IN_CONSTANT:
+                lst = fields.setdefault(report_id, [])
+                for k in range(count):
+                    if not v & _IN_VARIABLE:
+                        u = (page, 0)
+                    elif usages:
+                        u = usages[k] if k < len(usages) else usages[-1]
+                    elif usage_min is not None:
+                        u = (page, usage_min + k)
+                    else:
+                        u = (page, 0)
+                    lst.append((u[0], u[1], off + k * size, size, logical_min < 0))
+            bitpos[report_id] = off + size * count
+        elif prefix & 0x0C == 0x00:     # other main items only end the local state
+            pass
+        elif tag == _GLOBAL_USAGE_PAGE:
+            page = v
+        elif tag == _GLOBAL_LOGICAL_MIN:
+            logical_min = _signed(v, dlen)
+        elif tag == _GLOBAL_REPORT_SIZE:
+            size = v
+        elif tag == _GLOBAL_REPORT_ID:
+            report_id = v
+        elif tag == _GLOBAL_REPORT_COUNT:
+            count = v
+        elif tag == _GLOBAL_PUSH:
+            stack.append((page, logical_min, size, count, report_id))
+        elif tag == _GLOBAL_POP:
+            if stack:
+                page, logical_min, size, count, report_id = stack.pop()
+        elif tag == _LOCAL_USAGE:
+            usages.append((v >> 16, v & 0xFFFF) if dlen == 4 else (page, v))
+            continue
+        elif tag == _LOCAL_USAGE_MIN:
+            usage_min = v & 0xFFFF
+            continue
+        elif tag == _LOCAL_USAGE_MAX:
+            if usage_min is not None:
+                for u in range(usage_min, (v & 0xFFFF) + 1):
+                    usages.append((page, u))
+            continue
+        else:
+            continue
+        if prefix & 0x0C == 0x00:
+            # Local items apply to the next main item only.
+            usages = []
+            usage_min = None
+
+    return {rid: Report(rid, lst) for rid, lst in fields.items()}
@@ -0,0 +1,305 @@
+"""
+Minimal HTTP/1.1 client with a per-host keep-alive pool.
+
+http_pool.get(url) sends a GET and returns an HttpResponse once the headers
+are in. The body is read with readinto()/read_all() and is framed by
+Content-Length, chunked transfer encoding, or the connection closing.
+Redirects are followed. Closing a response whose body was read to the end
+hands the connection back to the pool, so the next request to the same
+host skips the TCP connect; a response closed early drops its socket.
+"""
+
+import time
+import uasyncio as asyncio
+
+REDIRECTS = (301, 302, 303, 307, 308)
+
+
+def parse_url(url):
+    """(host, port, path) of an http:// URL."""
+    if not url.startswith("http://"):
+        raise ValueError("only http:// is supported")
+    rest = url[7:]
+    slash = rest.find("/")
+    hostport = rest if slash < 0 else rest[:slash]
+    path = "/" if slash < 0 else rest[slash:]
+    if ":" in hostport:
+        host, port_s = hostport.split(":", 1)
+        port = int(port_s)
+    else:
+        host, port = hostport, 80
+    return host, port, path
+
+
+def _resolve(base, location):
+    if location.startswith("http://") or location.startswith("https://"):
+        return location
+    host, port, path = parse_url(base)
+    origin = "http://{}".format(host if port == 80 else "{}:{}".format(host, port))
+    if location.startswith("/"):
+        return origin + location
+    return origin + path.rsplit("/", 1)[0] + "/" + location
+
+
+async def read_headers(reader, limit=4096):
+    """
+    Read a response head. Returns (version, status, headers, rest) where
+    headers maps lower-case names to str values and `rest` holds body
+    bytes that arrived with the head.
+    """
+    buf = b""
+    while True:
+        chunk = await reader.read(256)
+        if not chunk:
+            raise OSError("http connection closed")
+        buf += chunk
+        p = buf.find(b"\r\n\r\n")
+        if p >= 0:
+            break
+        if len(buf) > limit:
+            raise ValueError("http header too large")
+    lines = buf[:p].decode().split("\r\n")
+    parts = lines[0].split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+        raise ValueError("bad http status line")
+    headers = {}
+    for line in lines[1:]:
+        i = line.find(":")
+        if i > 0:
+            headers[line[:i].strip().lower()] = line[i + 1:].strip()
+    return parts[0], int(parts[1]), headers, buf[p + 4:]
+
+
+class HttpResponse:
+    def __init__(self, pool, key, reader, writer, version, status, headers, rest, url):
+        self._pool = pool
+        self._key = key
+        self.reader = reader
+        self.writer = writer
+        self.status = status
+        self.headers = headers
+        self.url = url
+        self._pending = rest
+        self._chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        length = headers.get("content-length")
+        self.length = int(length) if length is not None and not self._chunked else -1
+        self._left = self.length       # body bytes left; chunk bytes left when chunked
+        conn = headers.get("connection", "").lower()
+        self._reusable = (self._chunked or self.length >= 0) and conn != "close" \
+            and (version != "HTTP/1.0" or conn == "keep-alive")
+        self.done = self.length == 0
+
+    async def _raw(self, mv):
+        p = self._pending
+        if p:
+            n = min(len(p), len(mv))
+            mv[:n] = p[:n]
+            self._pending = p[n:]
+            return n
+        return await self.reader.readinto(mv)
+
+    async def _line(self):
+        out = b""
+        one = bytearray(1)
+        while not out.endswith(b"\r\n"):
+            if not await self._raw(one):
+                raise OSError("http chunk truncated")
+            out += one
+            if len(out) > 256:
+                raise ValueError("http chunk line too long")
+        return out[:-2]
+
+    async def _next_chunk(self):
+        if self._left == 0:
+            await self._line()          # CRLF after the previous chunk
+        line = await self._line()
+        size = int(line.split(b";", 1)[0], 16)
+        if size == 0:
+            while await self._line():   # trailers up to the empty line
+                pass
+            self.done = True
+        self._left = size
+
+    async def readinto(self, mv):
+        """Read body bytes into mv; 0 at the end of the body."""
+        if self.done or self.reader is None:
+            return 0
+        if self._chunked and self._left <= 0:
+            await self._next_chunk()
+            if self.done:
+                return 0
+        if self._left >= 0 and len(mv) > self._left:
+            mv = mv[:self._left]
+        n = await self._raw(mv)
+        if not n:
+            if self._left > 0:
+                raise OSError("http body truncated")
+            self.done = True
+            return 0
+        if self._left >= 0:
+            self._left -= n
+            if self._left == 0 and not self._chunked:
+                self.done = True
+        return n
+
+    async def read_chunks(self, feed, idle_ms=2000, size=1024):
+        """
+        Pass the body to `feed(bytes)` chunk by chunk as it arrives; stops
+        after `idle_ms` without data. Returns the number of bytes read.
+        """
+        buf = bytearray(size)
+        mv = memoryview(buf)
+        total = 0
+        while True:
+            try:
+                n = await asyncio.wait_for_ms(self.readinto(mv), idle_ms)
+            except asyncio.TimeoutError:
+                self._reusable = False
+                break
+            if not n:
+                break
+            total += n
+            feed(bytes(mv[:n]))
+        return total
+
+    async def read_all(self, limit=65536, idle_ms=2000):
+        """The whole body as bytes; stops after `idle_ms` without data."""
+        parts = []
+        size = 0
+
+        def feed(chunk):
+            nonlocal size
+            size += len(chunk)
+            if size > limit:
+                raise ValueError("http body too large")
+            parts.append(chunk)
+
+        await self.read_chunks(feed, idle_ms)
+        return b"".join(parts)
+
+    async def close(self, drain=2048):
+        """Return the connection to the pool if the body is (nearly) consumed."""
+        if self.reader is None:
+            return
+        if not self.done and self._reusable and 0 <= self.length and self._left <= drain:
+            buf = bytearray(256)
+            try:
+                while await self.readinto(buf):
+                    pass
+            except Exception:
+                self._reusable = False
+        if self.done and self._reusable:
+            self._pool._release(self._key, self.reader, self.writer)
+        else:
+            await _close(self.writer)
+        self.reader = None
+        self.writer = None
+
+
+async def _close(writer):
+    try:
+        writer.close()
+        await writer.wait_closed()
+    except Exception:
+        pass
+
+
+class HttpPool:
+    """
+    Idle keep-alive connections keyed by (host, port). A connection taken
+    from the pool may have been closed by the server in the meantime; the
+    request is then retried once on a fresh connection.
+    """
+    MAX_IDLE = 2          # per host
+    IDLE_MS = 20000       # server keep-alive timeouts are usually 5-60 s
+
+    def __init__(self):
+        self._idle = {}
+        self.connects = 0
+        self.reuses = 0
+
+    async def _connect(self, host, port, timeout_ms):
+        try:
+            reader, writer = await asyncio.wait_for_ms(asyncio.open_connection(host, port), timeout_ms)
+        except asyncio.TimeoutError:
+            raise OSError("connect timeout")
+        self.connects += 1
+        return reader, writer
+
+    def _take(self, key):
+        conns = self._idle.get(key)
+        now = time.ticks_ms()
+        while conns:
+            reader, writer, t = conns.pop()
+            if time.ticks_diff(now, t) < self.IDLE_MS:
+                return reader, writer
+            asyncio.create_task(_close(writer))
+        return None
+
+    def _release(self, key, reader, writer):
+        conns = self._idle.setdefault(key, [])
+        if len(conns) >= self.MAX_IDLE:
+            _, old, _ = conns.pop(0)
+            asyncio.create_task(_close(old))
+        conns.append((reader, writer, time.ticks_ms()))
+
+    async def close_all(self):
+        idle = self._idle
+        self._idle = {}
+        for conns in idle.values():
+            for _, writer, _ in conns:
+                await _close(writer)
+
+    async def _request(self, url, headers, timeout_connect_ms, timeout_ms):
+        host, port, path = parse_url(url)
+        key = (host, port)
+        host_hdr = host if port == 80 else "{}:{}".format(host, port)
+        extra = ""
+        if headers:
+            for name, value in headers.items():
+                extra += "{}: {}\r\n".format(name, value)
+        req = "GET {} HTTP/1.1\r\nHost: {}\r\nConnection: keep-alive\r\n{}\r\n".format(path, host_hdr, extra).encode()
+        conn = self._take(key)
+        while True:
+            reused = conn is not None
+            if conn is None:
+                conn = await self._connect(host, port, timeout_connect_ms)
+            reader, writer = conn
+            try:
+                writer.write(req)
+                await asyncio.wait_for_ms(writer.drain(), timeout_ms)
+                version, status, headers, rest = await asyncio.wait_for_ms(read_headers(reader), timeout_ms)
+            except asyncio.TimeoutError:
+                await _close(writer)
+                raise OSError("http timeout")
+            except OSError:
+                await _close(writer)
+                if not reused:
+                    raise
+                # Stale keep-alive connection: retry once on a new one.
+                conn = None
+                continue
+            if reused:
+                self.reuses += 1
+            return HttpResponse(self, key, reader, writer, version, status, headers, rest, url)
+
+    async def get(self, url, headers=None, max_redirects=3, timeout_connect_ms=3000, timeout_ms=5000):
+        """GET `url` with optional extra request `headers` (dict)."""
+        for _ in range(max_redirects + 1):
+            resp = await self._request(url, headers, timeout_connect_ms, timeout_ms)
+            location = resp.headers.get("location")
+            if resp.status not in REDIRECTS or not location:
+                return resp
+            await resp.close()
+            url = _resolve(url, location)
+        raise ValueError("too many http redirects")
+
+    def stats(self):
+        return {
+            "connects": self.connects,
+            "reuses": self.reuses,
+            "idle": sum(len(c) for c in self._idle.values()),
+        }
+
+
+http_pool = HttpPool()
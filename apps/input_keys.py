@@ -14,3 +14,6 @@ BLE_KEY_ENTER = 105
 
 KEY_S_PRESSED = 0
 KEY_S_RELEASED = 1
+KEY_S_LONG = 2      # held for ButtonManager.LONG_MS (or the top app's long_press_ms), once per press
+KEY_S_REPEAT = 3    # auto-repeat while held (PREV/NEXT, BLE arrows)
+KEY_S_DOUBLE = 4    # second short press in a row, after its KEY_S_PRESSED
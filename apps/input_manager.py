@@ -1,29 +1,56 @@
 from button_manager import ButtonManager
 import ble_keyboard as BleKeyboard
-from manager import send_input_event
+from manager import long_press_ms, send_input_event
 import board_config as hw
 from input_keys import *
-from utils.trace import *
+from utils import trace
+from utils.trace import CAT_INPUT, DEBUG_DBG, DEBUG_ERROR
+
+_TRACE = const(1)
 
 
 def send_input_event_wrapper(key_id, key_status):
-    dprint(DEBUG_DBG, f"send_input_event: {key_id}, {key_status}")
+    if _TRACE:
+        trace.log(CAT_INPUT, DEBUG_DBG, "send_input_event", key_id, key_status)
     send_input_event(key_id, key_status)
 
+GPIO_KEY_MAP = {
+    hw.GPIO_KEY_0: GPIO_KEY_NEXT,
+    hw.GPIO_KEY_1: GPIO_KEY_ENTER,
+    hw.GPIO_KEY_2: GPIO_KEY_PREV,
+    hw.GPIO_KEY_3: GPIO_KEY_MENU
+}
+BLE_KEYS = (BLE_KEY_MENU, BLE_KEY_UP, BLE_KEY_DOWN, BLE_KEY_LEFT, BLE_KEY_RIGHT, BLE_KEY_ENTER)
+KEY_STATUS_MAP = {
+    "pressed": KEY_S_PRESSED,
+    "released": KEY_S_RELEASED,
+    "long": KEY_S_LONG,
+    "repeat": KEY_S_REPEAT,
+    "double": KEY_S_DOUBLE,
+}
+
+_btn_mgr = None
+
 def btn_key_to_event(key_event):
-    GPIO_KEY_MAP = {
-        hw.GPIO_KEY_0: GPIO_KEY_NEXT,
-        hw.GPIO_KEY_1: GPIO_KEY_ENTER,
-        hw.GPIO_KEY_2: GPIO_KEY_PREV,
-        hw.GPIO_KEY_3: GPIO_KEY_MENU
-    }
-    key_id = GPIO_KEY_MAP.get(key_event["pin"], None)
+    pin = key_event["pin"]
+    # BLE keys come back from ButtonManager.inject() under their own id.
+    key_id = GPIO_KEY_MAP.get(pin, pin if pin in BLE_KEYS else None)
     if key_id is None:
-        dprint(DEBUG_ERROR, f"Unknown key: {key_event}")
+        trace.log(CAT_INPUT, DEBUG_ERROR, "Unknown key:", key_event)
         return
 
-    key_status = KEY_S_PRESSED if key_event["state"] == "pressed" else KEY_S_RELEASED
-    send_input_event_wrapper(key_id, key_status)
+    send_input_event_wrapper(key_id, KEY_STATUS_MAP[key_event["state"]])
+
+def btn_long_ms(pin):
+    # The top app may want a longer hold than LONG_MS on some keys.
+    return long_press_ms(GPIO_KEY_MAP.get(pin, pin))
+
+def ble_key_event(key_id, key_status):
+    # Through the button manager, so BLE keys get long press, repeat and double click too.
+    if _btn_mgr is not None:
+        _btn_mgr.inject(key_id, key_status == KEY_S_PRESSED)
+    else:
+        send_input_event_wrapper(key_id, key_status)
 
 _last_status = 0
 _last_pos_x = 0
@@ -32,9 +59,10 @@ _last_key_id = None
 
 def ble_key_adapter_to_event(input_id, input_data):
     global _last_status, _last_pos_x, _last_pos_y, _last_key_id
-    if input_id == 1:
+    if input_id == BleKeyboard.REPORT_POINTER:
         status, x, y = input_data
-        dprint(DEBUG_DBG, f"ble key1: {status}, x: {x}, y: {y}")
+        if _TRACE:
+            trace.log(CAT_INPUT, DEBUG_DBG, "ble key1", status, x, y)
         if _last_status == 0:
             # button down
             if status != _last_status:
@@ -42,7 +70,7 @@ def ble_key_adapter_to_event(input_id, input_data):
                 _last_pos_y = y
             # enter: Status: 7, X: 437, Y: 368, W: 910, H: 910
             if x == 437 and y == 368: 
-                send_input_event_wrapper(BLE_KEY_ENTER, KEY_S_PRESSED)
+                ble_key_event(BLE_KEY_ENTER, KEY_S_PRESSED)
                 _last_key_id = BLE_KEY_ENTER
         else:
             # press
@@ -56,30 +84,37 @@ def ble_key_adapter_to_event(input_id, input_data):
                         _last_key_id = BLE_KEY_UP
                     else:
                         _last_key_id = BLE_KEY_DOWN
-                send_input_event_wrapper(_last_key_id, KEY_S_PRESSED)
+                ble_key_event(_last_key_id, KEY_S_PRESSED)
             elif status == 0:
                 if _last_key_id is not None: # release
-                    send_input_event_wrapper(_last_key_id, KEY_S_RELEASED)
+                    ble_key_event(_last_key_id, KEY_S_RELEASED)
                     _last_key_id = None
             else:
                 pass # ignore
         _last_status = status
 
-    elif input_id == 2:
+    elif input_id == BleKeyboard.REPORT_CONSUMER:
         status = input_data
-        dprint(DEBUG_DBG, f"ble key2: {status}")
-        send_input_event_wrapper(BLE_KEY_MENU, KEY_S_PRESSED if status else KEY_S_RELEASED)
+        if _TRACE:
+            trace.log(CAT_INPUT, DEBUG_DBG, "ble key2", status)
+        ble_key_event(BLE_KEY_MENU, KEY_S_PRESSED if status else KEY_S_RELEASED)
     else:
         # unknown
-        dprint(DEBUG_ERROR, f"Unknown input id: {input_id}")
+        trace.log(CAT_INPUT, DEBUG_ERROR, "Unknown input id:", input_id)
 
 def start():
+    global _btn_mgr
     # 初始化 GPIO 键盘
-    btn_mgr = ButtonManager(pins=[hw.GPIO_KEY_0, hw.GPIO_KEY_1, hw.GPIO_KEY_2, hw.GPIO_KEY_3], callback=btn_key_to_event)
-    btn_mgr.start()
+    _btn_mgr = ButtonManager(pins=[hw.GPIO_KEY_0, hw.GPIO_KEY_1, hw.GPIO_KEY_2, hw.GPIO_KEY_3], callback=btn_key_to_event,
+                             repeat_pins=(hw.GPIO_KEY_0, hw.GPIO_KEY_2, BLE_KEY_UP, BLE_KEY_DOWN, BLE_KEY_LEFT, BLE_KEY_RIGHT),
+                             long_ms=btn_long_ms)
+    _btn_mgr.start()
 
     # 初始化 BLE 键盘
     BleKeyboard.start(ble_key_adapter_to_event)
 
+def buttons():
+    return _btn_mgr
+
 def stop():
     pass
@@ -27,24 +27,38 @@ board_early_init()
 # 3. run main
 import uasyncio as asyncio
 
+import board_config as hw
+import ble_keyboard
 import input_manager
 import utils.trace as trace
 from app_context import set_audio
+from config import config
 from audio_service import AudioService
 from manager import run
 from menu_app import GameMainApp
+from power_manager import power
+from wifi_services import wifi_service
 
 
 async def main():
 
-    trace.DEBUG_LEVEL = trace.DEBUG_INFO | trace.DEBUG_ERROR
+    trace.set_level(trace.DEBUG_INFO | trace.DEBUG_ERROR)
     input_manager.start()
+    config.start()
 
     audio = AudioService()
     set_audio(audio)
     audio.start()
 
+    power.setup(backlight=hw.TFT_GPIO_BLK, buttons=input_manager.buttons(),
+                checks=(audio.busy, wifi_service.busy, ble_keyboard.busy),
+                deadlines=(ble_keyboard.next_retry_ms,))
+
     await run(GameMainApp())
 
 
-asyncio.run(main())
+try:
+    asyncio.run(main())
+except Exception as e:
+    trace.crash(e)
+    raise
@@ -1,7 +1,10 @@
 import uasyncio as asyncio
+from utils import trace
 from utils.queue import EventQueue
+from utils.trace import CAT_APP, DEBUG_ERROR, DEBUG_INFO
 import time
 import heapq
+from power_manager import power
 
 # ---------------------------
 # 常量定义
@@ -17,6 +20,8 @@ class EventSysID:
 
 class PopApp:
     _instances = {}
+    keep_screen_on = False      # no backlight dimming while on top
+    long_press_ms = None        # {key: ms} hold time of KEY_S_LONG while on top
     def __new__(cls, *args, **kwargs):
         if cls not in cls._instances:
             cls._instances[cls] = super().__new__(cls)
@@ -107,7 +112,7 @@ class AppManager:
                 try:
                     app.on_pause()
                 except Exception as e:
-                    print("[AppManager] on_pause error:", e)
+                    trace.log(CAT_APP, DEBUG_ERROR, "on_pause error:", type(e).__name__, e)
             self.app_stack.remove(app)
 
         if app not in self.bg_apps:
@@ -130,6 +135,14 @@ class AppManager:
     def is_top(self, app):
         return bool(self.app_stack) and self.app_stack[-1] == app
 
+    def long_press_ms(self, key):
+        """Hold time of KEY_S_LONG for `key` asked by the top app, or None."""
+        if self.app_stack:
+            hold = self.app_stack[-1].long_press_ms
+            if hold:
+                return hold.get(key)
+        return None
+
     # ---------- 定时器 ----------
     def set_timer(self, owner, timer_id, interval, repeat=False):
         if not isinstance(owner, PopApp):
@@ -148,6 +161,9 @@ class AppManager:
             del self.timers[key]
 
     def timer_expire_ms(self):
+        # Cancelled timers stay in the heap; drop them so they wake nobody.
+        while self.heap and self.heap[0][1] not in self.timers:
+            heapq.heappop(self.heap)
         if self.heap:
             return max(0, time.ticks_diff(self.heap[0][0], time.ticks_ms()))
         else:
@@ -166,7 +182,7 @@ class AppManager:
             try:
                 owner.on_timer(timer_id)
             except Exception as e:
-                print(f"Timer error for {key}: {e}")
+                trace.log(CAT_APP, DEBUG_ERROR, "timer error:", type(owner).__name__, timer_id, type(e).__name__, e)
                 repeat = False # delete if error
             
             if repeat:
@@ -200,10 +216,13 @@ class AppManager:
         root_app.on_enter()
         root_app.render()
 
-        print("[AppManager] running...")
+        trace.log(CAT_APP, DEBUG_INFO, "AppManager running")
 
         while self._running and self.app_stack:
             next_expire = self.timer_expire_ms()
+            if self.queue.empty():
+                # May light-sleep until the next deadline.
+                next_expire = power.idle(self, next_expire)
             _evt_data = await self.queue.wait_for_ms(next_expire)
             top_app = self.app_stack[-1]
             if _evt_data is not None:
@@ -224,7 +243,8 @@ class AppManager:
                 elif evt_type == AppEventType.EventInput:
                     if self.app_stack:
                         key, status = evt_data
-                        self.app_stack[-1].on_input(key, status)
+                        if not power.input(key, status):
+                            self.app_stack[-1].on_input(key, status)
 
                 # except Exception as e:
                 #     print("[AppManager] event dispatch error:", e)
@@ -241,14 +261,14 @@ class AppManager:
                         app.on_exit()
                         app._entered = False
                     except Exception as e:
-                        print("[AppManager] on_exit error:", e)
+                        trace.log(CAT_APP, DEBUG_ERROR, "on_exit error:", type(e).__name__, e)
                 elif app in self.bg_apps:
                     self.bg_apps.remove(app)
                     try:
                         app.on_exit()
                         app._entered = False
                     except Exception as e:
-                        print("[AppManager] bg on_exit error:", e)
+                        trace.log(CAT_APP, DEBUG_ERROR, "bg on_exit error:", type(e).__name__, e)
             self.remove_pending.clear()
 
             # 所有app退出
@@ -273,23 +293,23 @@ class AppManager:
                 try:
                     top_app.render()
                 except Exception as e:
-                    print("[AppManager] render exception:", e)
+                    trace.log(CAT_APP, DEBUG_ERROR, "render error:", type(e).__name__, e)
 
-        print("[AppManager] exiting...")
+        trace.log(CAT_APP, DEBUG_INFO, "AppManager exiting")
 
         # 退出所有 app
         for app in list(self.bg_apps):
             try:
                 app.on_exit()
             except Exception as e:
-                print("[AppManager] final bg exit error:", e)
+                trace.log(CAT_APP, DEBUG_ERROR, "final bg exit error:", type(e).__name__, e)
         self.bg_apps.clear()
 
         for app in reversed(self.app_stack):
             try:
                 app.on_exit()
             except Exception as e:
-                print("[AppManager] final exit error:", e)
+                trace.log(CAT_APP, DEBUG_ERROR, "final exit error:", type(e).__name__, e)
         self.app_stack.clear()
 
         self._running = False
@@ -305,5 +325,6 @@ def min_app(app=None): AppManager.instance().minimize(app)
 def max_app(app): AppManager.instance().maximize(app)
 def send_user_event(receiver, evt): AppManager.instance().send_user_event(receiver, evt)
 def send_input_event(key, status): AppManager.instance().send_input_event(key, status)
+def long_press_ms(key): return AppManager.instance().long_press_ms(key)
 async def run(root_app): await AppManager.instance().run(root_app)
 def stop(): AppManager.instance().stop()
@@ -10,6 +10,8 @@ from setting_app import SettingApp
 from snake_app import SNAKE_DEF, SnakeApp
 from player_app import PLAYER_DEF, PlayerApp
 from net_player_app import NET_PLAYER_DEF, NetPlayerApp
+from config import config
+from resume_store import resume_store
 from utils.trace import DEBUG_INFO, dprint
 from machine import Pin
 
@@ -100,7 +102,7 @@ class GameMainApp(PopApp):
         dprint(DEBUG_INFO, "GameMainApp on_exit")
 
     def on_event(self, evt):
-        dprint(DEBUG_INFO, "GameMainApp on_event: {evt}")
+        dprint(DEBUG_INFO, "GameMainApp on_event:", evt)
 
     def on_input(self, key, status):
         # 长按电源键3秒后关机
@@ -138,6 +140,9 @@ class GameMainApp(PopApp):
 
                 # do shutdown
                 print("Shutdown...")
+                # Keep where the player was and unsaved settings.
+                resume_store.flush()
+                config.save()
                 power_hold = Pin(18, Pin.OUT)
                 power_hold.value(0)
 
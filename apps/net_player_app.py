@@ -1,14 +1,18 @@
 from config import config
-from app_context import get_audio
+import utils.res as res
+from app_context import get_audio, play_effect
 from gui.core.colors import GRAY, WHITE, YELLOW
 from gui.core.gui import Screen
 from gui.fonts import freesans20
 from gui.widgets.label import Label
+from http_client import http_pool
 from input_keys import (
+    BLE_KEY_DOWN,
     BLE_KEY_ENTER,
     BLE_KEY_LEFT,
     BLE_KEY_MENU,
     BLE_KEY_RIGHT,
+    BLE_KEY_UP,
     GPIO_KEY_ENTER,
     GPIO_KEY_MENU,
     GPIO_KEY_NEXT,
@@ -16,7 +20,10 @@ from input_keys import (
     KEY_S_PRESSED,
 )
 from manager import PopApp, exit_app, send_user_event
-from utils.trace import DEBUG_DBG, DEBUG_INFO, dprint
+from playlist_index import JsonArrayParser, M3uParser, MemoryPlaylist, PlaylistIndex, PlaylistWriter
+from resume_store import resume_store
+from utils import trace
+from utils.trace import CAT_NET, DEBUG_DBG, DEBUG_INFO
 from wifi_services import wifi_service
 
 
@@ -31,13 +38,14 @@ NET_PLAYER_DEF = {
 class _NetWorker:
     EVT_WIFI = "wifi"
     EVT_PLAYLIST = "playlist"
+    PLAYLIST_PATH = "netplaylist"    # .off/.str index files on flash
 
     def __init__(self):
         self._busy = False
 
     def request(self, receiver, playlist_url):
         # Never block PopApp handlers; do work in background and post results
-        dprint(DEBUG_INFO, "NetWorker request", playlist_url)
+        trace.log(CAT_NET, DEBUG_INFO, "NetWorker request", playlist_url)
         if self._busy:
             send_user_event(receiver, {"type": self.EVT_WIFI, "ok": False, "msg": "busy"})
             return
@@ -48,28 +56,21 @@ class _NetWorker:
 
         async def _run():
             try:
-                dprint(DEBUG_INFO, "NetWorker start")
+                trace.log(CAT_NET, DEBUG_INFO, "NetWorker start")
                 ok, msg = await wifi_service.acquire("net_player")
-                dprint(DEBUG_INFO, "NetWorker wifi", ok, msg)
+                trace.log(CAT_NET, DEBUG_INFO, "NetWorker wifi", ok, msg)
                 send_user_event(receiver, {"type": self.EVT_WIFI, "action": "on", "ok": ok, "msg": msg})
                 if not ok:
                     return
 
                 if not playlist_url:
-                    send_user_event(receiver, {"type": self.EVT_PLAYLIST, "ok": True, "urls": [], "names": []})
+                    send_user_event(receiver, {"type": self.EVT_PLAYLIST, "ok": True, "playlist": MemoryPlaylist()})
                     return
 
-                text = await self._http_get_text(playlist_url)
-                dprint(DEBUG_INFO, "NetWorker playlist bytes", len(text) if text else 0)
-                if playlist_url.endswith(".m3u") or playlist_url.endswith(".m3u8"):
-                    urls = self.normalize_urls(self._parse_m3u(text), playlist_url)
-                    names = [""] * len(urls)
-                else:
-                    urls, names = self._parse_playlist_json(text)
-                    urls = self.normalize_urls(urls, playlist_url)
-                dprint(DEBUG_INFO, "NetWorker playlist parsed", len(urls))
+                playlist = await self._fetch_playlist(playlist_url)
+                trace.log(CAT_NET, DEBUG_INFO, "NetWorker playlist parsed", len(playlist))
 
-                send_user_event(receiver, {"type": self.EVT_PLAYLIST, "ok": True, "urls": urls, "names": names})
+                send_user_event(receiver, {"type": self.EVT_PLAYLIST, "ok": True, "playlist": playlist})
             except Exception as e:
                 send_user_event(receiver, {"type": self.EVT_PLAYLIST, "ok": False, "msg": str(e)})
             finally:
@@ -77,146 +78,34 @@ class _NetWorker:
 
         asyncio.create_task(_run())
 
-    def _parse_m3u(self, text):
-        urls = []
-        for raw in (text or "").splitlines():
-            line = raw.strip()
-            if not line or line.startswith("#"):
-                continue
-            if line.startswith("http://") or line.startswith("https://"):
-                urls.append(line)
-        return urls
-
-    def _parse_playlist_json(self, text):
-        try:
-            import ujson as json  # type: ignore
-        except Exception:
-            import json  # type: ignore
-
-        data = json.loads(text or "[]")
-        urls = []
-        names = []
-        if isinstance(data, list):
-            for item in data:
-                if not isinstance(item, dict):
-                    continue
-                u = item.get("wav_url") or item.get("url")
-                if isinstance(u, str) and u.startswith("http"):
-                    urls.append(u)
-                    names.append(item.get("name") or "")
-        return urls, names
-
-    async def _http_get_text(self, url):
-        import uasyncio as asyncio
-
-        if not url.startswith("http://"):
-            raise ValueError("only http:// is supported")
-        rest = url[7:]
-        slash = rest.find("/")
-        hostport = rest if slash < 0 else rest[:slash]
-        path = "/" if slash < 0 else rest[slash:]
-        if ":" in hostport:
-            host, port_s = hostport.split(":", 1)
-            port = int(port_s)
-        else:
-            host, port = hostport, 80
-
-        dprint(DEBUG_INFO, "HTTP GET", host, port, path)
+    async def _fetch_playlist(self, url):
+        # Stream the body through the parser straight into the on-flash
+        # index, so the playlist is never held in RAM as a whole.
+        writer = PlaylistWriter(self.PLAYLIST_PATH)
 
-        # Some ports may block during connect; enforce a hard timeout.
-        try:
-            reader, writer = await asyncio.wait_for_ms(asyncio.open_connection(host, port), 3000)
-        except asyncio.TimeoutError:
-            raise ValueError("connect timeout")
+        def emit(u, name):
+            writer.add(self._inject_port_if_missing(u, url), name)
 
-        host_hdr = host if port == 80 else "{}:{}".format(host, port)
-        req = "GET {} HTTP/1.0\r\nHost: {}\r\nConnection: close\r\n\r\n".format(path, host_hdr)
-        writer.write(req.encode())
-        try:
-            await asyncio.wait_for_ms(writer.drain(), 2000)
-        except asyncio.TimeoutError:
-            raise ValueError("send timeout")
-
-        # Read headers (with timeout) and parse content-length if present.
-        buf = b""
-        head = None
-        data = b""
-        for _ in range(200):  # ~10s worst case (50ms step)
-            try:
-                b = await asyncio.wait_for_ms(reader.read(256), 50)
-            except asyncio.TimeoutError:
-                continue
-            if not b:
-                break
-            buf += b
-            p = buf.find(b"\r\n\r\n")
-            if p >= 0:
-                head = buf[: p + 4]
-                data = buf[p + 4 :]
-                break
-            if len(buf) > 4096:
-                raise ValueError("http header too large")
-
-        if head is None:
-            raise ValueError("http header timeout")
-
-        dprint(DEBUG_INFO, "HTTP header ok", len(head), "body_pre", len(data))
-
-        status = head.split(b"\r\n", 1)[0]
-        if b"200" not in status:
-            raise ValueError("http status not 200")
-
-        content_length = None
-        try:
-            for line in head.split(b"\r\n"):
-                if line.lower().startswith(b"content-length:"):
-                    content_length = int(line.split(b":", 1)[1].strip())
-                    break
-        except Exception:
-            content_length = None
-
-        # Read body: prefer content-length if available, otherwise read until close
-        if content_length is not None:
-            remaining = content_length - len(data)
-            while remaining > 0:
-                b = await reader.read(min(1024, remaining))
-                if not b:
-                    break
-                data += b
-                remaining -= len(b)
+        if url.endswith(".m3u") or url.endswith(".m3u8"):
+            parser = M3uParser(emit)
         else:
-            # Some servers keep-alive even with HTTP/1.0; enforce an idle timeout.
-            idle = 0
-            while True:
-                try:
-                    b = await asyncio.wait_for_ms(reader.read(1024), 200)
-                except asyncio.TimeoutError:
-                    idle += 1
-                    if idle >= 10:  # 2s idle -> stop
-                        break
-                    continue
-                idle = 0
-                if not b:
-                    break
-                data += b
-
+            parser = JsonArrayParser(emit)
+        trace.log(CAT_NET, DEBUG_INFO, "HTTP GET", url)
         try:
+            # Shared keep-alive pool: the first track usually reuses this connection.
+            resp = await http_pool.get(url)
+            try:
+                trace.log(CAT_NET, DEBUG_INFO, "HTTP header ok", resp.status, resp.length)
+                if resp.status != 200:
+                    raise ValueError("http status {}".format(resp.status))
+                size = await resp.read_chunks(parser.feed)
+                parser.close()
+            finally:
+                await resp.close()
+        finally:
             writer.close()
-            await writer.wait_closed()
-        except Exception:
-            pass
-
-        try:
-            return data.decode()
-        except Exception:
-            return str(data, "utf-8", "ignore")
-
-    def normalize_urls(self, urls, playlist_url):
-        # Fix common server-side base_url issue: absolute URLs may miss :port
-        out = []
-        for u in urls or []:
-            out.append(self._inject_port_if_missing(u, playlist_url))
-        return out
+        trace.log(CAT_NET, DEBUG_INFO, "NetWorker playlist bytes", size)
+        return PlaylistIndex(self.PLAYLIST_PATH)
 
     def _inject_port_if_missing(self, url, playlist_url):
         try:
@@ -258,6 +147,9 @@ _worker = _NetWorker()
 
 # -------- UI App --------
 class NetPlayerApp(PopApp):
+    TIMER_STATUS = 41
+    SKIP_S = 10
+
     def __init__(self):
         super().__init__()
         if getattr(self, "_net_player_inited", False):
@@ -266,11 +158,14 @@ class NetPlayerApp(PopApp):
         screen_width = self.screen.w
 
         self.playlist_url = ""
-        self.urls = []
-        self.names = []
+        self.playlist = MemoryPlaylist()   # or a PlaylistIndex on flash
         self.selected_index = 0
         self.playing = False
         self._handle = None
+        self._buffering = False
+        self._play_index = 0      # playlist index of the handle's first source
+        self._cur_track = -1
+        self._track_url = None    # resume_store key of the playing track
 
         self.title_label = Label(0, 16, "Net Radio (Server Playlist)", freesans20, WHITE, w=screen_width, align="center")
         self.status_label = Label(
@@ -296,34 +191,40 @@ class NetPlayerApp(PopApp):
                 return ""
 
         try:
-            if self.names and 0 <= idx < len(self.names) and self.names[idx]:
-                n = self.names[idx]
-                # Keep display consistent: show xxx.wav instead of paths/naked stems.
-                if isinstance(n, str):
-                    # If server returns a stem without extension, show as wav.
-                    if "/" in n or "\\" in n:
-                        n = n.rsplit("/", 1)[-1].rsplit("\\", 1)[-1]
-                    if "." not in n:
-                        n = n + ".wav"
-                    return n
-        except Exception:
-            pass
-        try:
-            u = self.urls[idx]
-            return _basename_from_url(u)
+            u, n = self.playlist.entry(idx)
         except Exception:
             return ""
+        if n:
+            # Keep display consistent: show xxx.wav instead of paths/naked stems.
+            # If server returns a stem without extension, show as wav.
+            if "/" in n or "\\" in n:
+                n = n.rsplit("/", 1)[-1].rsplit("\\", 1)[-1]
+            if "." not in n:
+                n = n + ".wav"
+            return n
+        return _basename_from_url(u)
+
+    def _set_playlist(self, playlist):
+        old = self.playlist
+        self.playlist = playlist
+        if old is not playlist:
+            old.close()
 
     def _refresh(self):
-        if not self.urls:
+        count = len(self.playlist)
+        if not count:
             if not self.status_label.text:
                 self.status_label.set_text("No playlist / urls")
         else:
             cur_name = self._name_for(self.selected_index)
-            self.status_label.set_text(("Playing: " if self.playing else "Selected: ") + cur_name)
+            if self.playing:
+                prefix = "Buffering: " if self._buffering else "Playing: "
+            else:
+                prefix = "Selected: "
+            self.status_label.set_text(prefix + cur_name)
 
         start = max(0, self.selected_index - 2)
-        end = min(len(self.urls), start + 5)
+        end = min(count, start + 5)
         window_len = max(0, end - start)
 
         for i in range(5):
@@ -338,12 +239,26 @@ class NetPlayerApp(PopApp):
         # full-screen blits (which can stall on some boards).
 
     def _select(self, delta):
-        if not self.urls:
+        count = len(self.playlist)
+        if not count:
             return
-        self.selected_index = (self.selected_index + delta) % len(self.urls)
+        self.selected_index = (self.selected_index + delta) % count
         self._refresh()
 
+    def _track(self, url):
+        # Let the resume store follow the handle under the playing URL.
+        if self._track_url is not None:
+            resume_store.untrack(self._track_url)
+        self._track_url = url
+        if url is not None:
+            resume_store.track(url, self._handle)
+
     def _stop(self):
+        self.cancel_timer(self.TIMER_STATUS)
+        self._buffering = False
+        if self._track_url is not None:
+            resume_store.flush()
+            self._track(None)
         try:
             if self._handle is not None:
                 self._handle.stop()
@@ -361,7 +276,7 @@ class NetPlayerApp(PopApp):
         self.playing = False
 
     def _play_selected(self):
-        if not self.urls:
+        if not len(self.playlist):
             return
 
         audio = get_audio()
@@ -370,26 +285,93 @@ class NetPlayerApp(PopApp):
             return
 
         self._stop()
-        url = self.urls[self.selected_index]
-        dprint(DEBUG_INFO, "NetPlayerApp play url", url)
-        self._handle = audio.play_http_wav(url)
+        url = self.playlist.url(self.selected_index)
+        offset = resume_store.get(url)
+        trace.log(CAT_NET, DEBUG_INFO, "NetPlayerApp play url", url, offset)
+        self._handle = audio.play_http_wav(url, offset_bytes=offset)
+        self._track(url)
+        self._play_index = self.selected_index
+        self._cur_track = self.selected_index
         self.playing = True
+        self._buffering = True
+        self.set_timer(self.TIMER_STATUS, 250, repeat=True)
         self._refresh()
 
+    def _skip(self, seconds):
+        # Restart the stream at the new offset; the source asks the server
+        # for that byte range instead of downloading from the start.
+        handle = self._handle
+        audio = get_audio()
+        if not self.playing or handle is None or not audio:
+            return
+        i = min(handle.source_index, len(handle.source_list) - 1)
+        source = handle.source_list[i]
+        info = getattr(source, "info", None)
+        if info is None:
+            return
+        bytes_per_s = info.rate * info.block_align // info.samples_per_block
+        offset = handle.bytes_played + seconds * bytes_per_s
+        offset = max(0, offset - offset % info.block_align)
+        if info.data_len and offset >= info.data_len:
+            return
+        trace.log(CAT_NET, DEBUG_INFO, "NetPlayerApp skip", seconds, offset)
+        self._handle = audio.play_http_wav(source.url, offset_bytes=offset, info=info)
+        self._play_index += i
+        self._track(source.url)
+
+    def _poll_status(self):
+        handle = self._handle
+        if handle is None:
+            return
+        if handle.state == handle.STOPPED:
+            # End of the playlist (or replaced by another player).
+            self._stop()
+            self._refresh()
+            return
+
+        # Keep the next track queued on the handle: AudioService prefetches
+        # it near the end of the current one and plays it without a gap.
+        n = len(handle.source_list)
+        nxt = self._play_index + n
+        audio = get_audio()
+        if audio and handle.source_index >= n - 1 and nxt < len(self.playlist):
+            trace.log(CAT_NET, DEBUG_INFO, "NetPlayerApp queue next", nxt)
+            audio.append_http_wav(handle, self.playlist.url(nxt))
+
+        track = self._play_index + min(handle.source_index, n - 1)
+        if track != self._cur_track:
+            # The previous track played to its end.
+            if self._track_url is not None:
+                resume_store.clear(self._track_url)
+            self._track(self.playlist.url(track))
+            self._cur_track = track
+            self.selected_index = track
+            self._refresh()
+
+        # Show network rebuffering; the jitter buffer reports it on the handle.
+        buffering = handle.rebuffering or handle.state == handle.IDLE
+        if buffering != self._buffering:
+            self._buffering = buffering
+            self._refresh()
+
+    def on_timer(self, timer_id):
+        if timer_id == self.TIMER_STATUS:
+            self._poll_status()
+            resume_store.maybe_flush()
+
     def on_enter(self):
-        dprint(DEBUG_INFO, "NetPlayerApp on_resume")
+        trace.log(CAT_NET, DEBUG_INFO, "NetPlayerApp on_resume")
         self.playlist_url = config.get("net_playlist_url") or ""
-        dprint(DEBUG_INFO, "NetPlayerApp playlist_url", self.playlist_url)
-        self.urls = config.get("net_wav_urls") or []
-        self.names = [""] * len(self.urls)
+        trace.log(CAT_NET, DEBUG_INFO, "NetPlayerApp playlist_url", self.playlist_url)
+        self._set_playlist(MemoryPlaylist(config.get("net_wav_urls")))
         self.selected_index = 0
         self.playing = False
         self._handle = None
 
         if self.playlist_url:
             self.status_label.set_text("WiFi + loading playlist...")
-            self.urls = []
-            self.names = []
+            # The worker rewrites the index files; let go of the old ones.
+            self._set_playlist(MemoryPlaylist())
             _worker.request(self, self.playlist_url)
         else:
             self.status_label.set_text("Using net_wav_urls (no playlist)")
@@ -399,12 +381,13 @@ class NetPlayerApp(PopApp):
 
     def on_exit(self):
         self._stop()
+        self._set_playlist(MemoryPlaylist())
         # Release WiFi usage ownership for idle/off policy.
         wifi_service.release("net_player")
 
     def on_event(self, evt):
         # Worker posts async results here.
-        dprint(DEBUG_DBG, "NetPlayerApp on_event", evt)
+        trace.log(CAT_NET, DEBUG_DBG, "NetPlayerApp on_event", evt)
         try:
             if not isinstance(evt, dict):
                 return
@@ -417,19 +400,21 @@ class NetPlayerApp(PopApp):
                 if not evt.get("ok"):
                     self.status_label.set_text("Playlist error: {}".format(evt.get("msg") or ""))
                 else:
-                    self.urls = evt.get("urls") or []
-                    self.names = evt.get("names") or [""] * len(self.urls)
+                    self._set_playlist(evt.get("playlist") or MemoryPlaylist())
                     self.selected_index = 0
-                    if not self.urls:
+                    if not len(self.playlist):
                         self.status_label.set_text("Playlist empty")
                     else:
-                        self.status_label.set_text("Playlist loaded ({})".format(len(self.urls)))
+                        self.status_label.set_text("Playlist loaded ({})".format(len(self.playlist)))
                 self._refresh()
         except Exception:
             pass
 
     def on_input(self, key, status):
-        dprint(DEBUG_DBG, "NetPlayerApp on_input", key, status)
+        trace.log(CAT_NET, DEBUG_DBG, "NetPlayerApp on_input", key, status)
+        if status == KEY_S_PRESSED and config.get("key_click"):
+            # Mixed into the stream: the radio keeps playing.
+            play_effect(res.KEY_ANSWER)
         # Some key sources may only emit RELEASED; treat it as a click.
         if status not in (KEY_S_PRESSED,):
             # Allow MENU on release to still exit quickly.
@@ -440,6 +425,10 @@ class NetPlayerApp(PopApp):
             self._select(-1)
         elif key in (GPIO_KEY_NEXT, BLE_KEY_RIGHT):
             self._select(1)
+        elif key == BLE_KEY_UP:
+            self._skip(self.SKIP_S)
+        elif key == BLE_KEY_DOWN:
+            self._skip(-self.SKIP_S)
         elif key in (GPIO_KEY_ENTER, BLE_KEY_ENTER):
             if self.playing:
                 self._stop()
@@ -455,8 +444,9 @@ class NetPlayerApp(PopApp):
         self.screen.show()
 
     def on_pause(self):
-        dprint(DEBUG_INFO, "NetPlayerApp on_pause")
+        trace.log(CAT_NET, DEBUG_INFO, "NetPlayerApp on_pause")
+        resume_store.flush()
 
     def on_resume(self):
-        dprint(DEBUG_INFO, "NetPlayerApp on_resume")
+        trace.log(CAT_NET, DEBUG_INFO, "NetPlayerApp on_resume")
         self.screen.invalidate()
\ No newline at end of file
@@ -1,7 +1,7 @@
 import os
-import time
 
-from app_context import get_audio
+import utils.res as res
+from app_context import get_audio, play_effect
 from config import config
 from gui.core.colors import GRAY, WHITE, YELLOW
 from gui.core.gui import Screen
@@ -20,10 +20,16 @@ from input_keys import (
     GPIO_KEY_MENU,
     GPIO_KEY_NEXT,
     GPIO_KEY_PREV,
+    KEY_S_LONG,
     KEY_S_PRESSED,
+    KEY_S_RELEASED,
+    KEY_S_REPEAT,
 )
-from manager import PopApp, min_app
-from utils.trace import DEBUG_INFO, dprint
+from manager import PopApp, min_app, send_user_event
+from resume_store import resume_store
+from utils import trace
+from utils.trace import CAT_APP, DEBUG_ERROR, DEBUG_INFO, dprint
+from wav_library import WavLibrary
 
 
 PLAYER_DEF = {
@@ -71,29 +77,10 @@ def ensure_sd_mounted(mount_point="/sd"):
         return False, "SD mount failed: {}".format(e)
 
 
-def scan_wavs(mount_point="/sd"):
-    wavs = []
-
-    # Common layout: /sd/*.wav or /sd/wav/*.wav
-    candidates = [mount_point, mount_point + "/wav"]
-    for base in candidates:
-        try:
-            for name in os.listdir(base):
-                low = name.lower()
-                print(low)
-                if low.endswith(".wav"):
-                    wavs.append(base + "/" + name)
-        except Exception:
-            print("scan_wavs: failed to listdir {}".format(base))
-            continue
-
-    wavs.sort()
-    return wavs
-
-
 class PlayerApp(PopApp):
+    EVT_LIBRARY = "library"
+    PENDING_MAX = 64        # files found by a running scan, shown until it ends
     TIMER_PROGRESS = 31
-    ENTER_LONG_PRESS_MS = 700
     MODE_SINGLE = 0
     MODE_ONE = 1
     MODE_LIST = 2
@@ -106,20 +93,25 @@ class PlayerApp(PopApp):
         self.screen = Screen(bgcolor=GRAY)
         screen_width = self.screen.w
 
-        self.files = []
+        # Track list model: the library's TrackList on the card, paged in
+        # for the visible window, plus files a running scan has just found.
+        self._library = WavLibrary("/sd")
+        self._library_version = -1
+        self._tracks = None
+        self._pending = []
         self.selected_index = 0
         self.playing = False
         self._handle = None
         self._playing_file = None
-        self._resume_offsets = {}
-        self._file_total_bytes = {}
+        self._playing_index = -1
+        self._playing_total = 0
         saved_mode = config.get("player_loop_mode")
         if saved_mode in (self.MODE_SINGLE, self.MODE_ONE, self.MODE_LIST):
             self.play_mode = saved_mode
         else:
             # backward compatibility for old bool config
             self.play_mode = self.MODE_ONE if bool(saved_mode) else self.MODE_SINGLE
-        self._enter_down_ms = None
+        self._enter_long = False
 
         toolbar_h = 40
         toolbar = Rectangle(0, 0, screen_width, toolbar_h, GRAY)
@@ -153,28 +145,62 @@ class PlayerApp(PopApp):
         self.screen.add_list([toolbar, self.status_label, self.progress_bar, self.mode_marker] + self.item_labels)
         self._player_inited = True
 
+    def _count(self):
+        n = len(self._pending)
+        if self._tracks is not None:
+            n += len(self._tracks)
+        return n
+
+    def _track(self, idx):
+        """(path, WavInfo or None) of list position idx."""
+        n = len(self._tracks) if self._tracks is not None else 0
+        if idx < n:
+            return self._tracks.path(idx), self._tracks.info(idx)
+        return self._pending[idx - n]
+
+    def _path(self, idx):
+        n = len(self._tracks) if self._tracks is not None else 0
+        if idx < n:
+            return self._tracks.path(idx)
+        return self._pending[idx - n][0]
+
+    def _find(self, path):
+        if path is None:
+            return -1
+        if self._tracks is not None:
+            idx = self._tracks.find(path)
+            if idx >= 0:
+                return idx
+        for i, item in enumerate(self._pending):
+            if item[0] == path:
+                return self._count() - len(self._pending) + i
+        return -1
+
     def _refresh(self):
-        if not self.files:
-            self.status_label.set_text("No wav found on SD (/sd or /sd/wav)")
+        count = self._count()
+        if not count:
+            if self._library.scanning:
+                self.status_label.set_text("Scanning SD...")
+            else:
+                self.status_label.set_text("No wav found on SD")
         else:
             # Keep status line compact; playback state is shown by list item color.
             self.status_label.set_text("")
         self.mode_marker.set_text(self.MODE_CHAR[self.play_mode])
         self._update_play_icon()
 
+        # Only the visible window is read from the track list.
         start = max(0, self.selected_index - 2)
-        end = min(len(self.files), start + 5)
-        window = self.files[start:end]
+        end = min(count, start + 5)
 
         for i in range(5):
-            if i < len(window):
-                idx = start + i
+            idx = start + i
+            if idx < end:
                 prefix = ">" if idx == self.selected_index else " "
-                name = window[i].split("/")[-1]
+                name = self._path(idx).split("/")[-1]
                 self.item_labels[i].set_text("{} {}".format(prefix, name))
                 # Highlight the currently playing track in yellow.
-                item_file = window[i]
-                new_color = YELLOW if (self.playing and self._playing_file == item_file) else WHITE
+                new_color = YELLOW if (self.playing and self._playing_index == idx) else WHITE
                 if self.item_labels[i].color != new_color:
                     self.item_labels[i].color = new_color
                     self.item_labels[i].invalidate()
@@ -203,11 +229,12 @@ class PlayerApp(PopApp):
             st = None
 
         if st == self._handle.DONE or st == self._handle.STOPPED:
-            cur_file = self._playing_file
-            if cur_file is not None:
-                self._resume_offsets[cur_file] = 0
+            # The store keeps the position if another player took over,
+            # and forgets it if the track played to its end.
+            resume_store.flush()
             self._handle = None
             self._playing_file = None
+            self._playing_index = -1
             self.playing = False
             self.cancel_timer(self.TIMER_PROGRESS)
             self._update_progress()
@@ -216,8 +243,8 @@ class PlayerApp(PopApp):
 
         # PLAYING/PAUSED are both treated as active session for UI continuity.
         self.playing = True
-        if self._playing_file and self.files and self._playing_file in self.files:
-            self.selected_index = self.files.index(self._playing_file)
+        if self._playing_index >= 0:
+            self.selected_index = self._playing_index
         self.set_timer(self.TIMER_PROGRESS, 500, repeat=True)
         self._update_progress()
         self._update_play_icon()
@@ -227,11 +254,10 @@ class PlayerApp(PopApp):
         self.play_icon.set_text(icon)
 
     def _update_progress(self):
-        if not self.playing or self._handle is None or not self.files:
+        if not self.playing or self._handle is None:
             self.progress_bar.set_value(0)
             return
-        cur_file = self.files[self.selected_index]
-        total = self._file_total_bytes.get(cur_file, 0)
+        total = self._playing_total
         if total <= 0:
             self.progress_bar.set_value(0)
             return
@@ -247,27 +273,22 @@ class PlayerApp(PopApp):
         self.progress_bar.set_value(int((played * 100) / total))
 
     def _select(self, delta):
-        if not self.files:
+        count = self._count()
+        if not count:
             return
         # If switching selection while playing, stop current playback and keep offset.
         if self.playing:
             self._stop()
-        self.selected_index = (self.selected_index + delta) % len(self.files)
+        self.selected_index = (self.selected_index + delta) % count
         self._refresh()
 
     def _stop(self):
-        cur_file = None
-        if self.files and 0 <= self.selected_index < len(self.files):
-            cur_file = self.files[self.selected_index]
+        cur_file = self._playing_file
 
-        # Capture current playback offset before stopping.
+        # Save the playing track's position before stopping it.
         if self._handle is not None and cur_file is not None:
-            try:
-                offset = int(self._handle.bytes_played)
-                if offset > 0:
-                    self._resume_offsets[cur_file] = offset
-            except Exception:
-                pass
+            resume_store.flush()
+            resume_store.untrack(cur_file)
 
         audio = get_audio()
         if audio:
@@ -277,13 +298,14 @@ class PlayerApp(PopApp):
                 pass
         self._handle = None
         self._playing_file = None
+        self._playing_index = -1
         self.playing = False
         self.cancel_timer(self.TIMER_PROGRESS)
         self._update_progress()
         self._update_play_icon()
 
     def _play_selected(self):
-        if not self.files:
+        if not 0 <= self.selected_index < self._count():
             return
 
         audio = get_audio()
@@ -292,10 +314,16 @@ class PlayerApp(PopApp):
             return
 
         self._stop()
-        cur_file = self.files[self.selected_index]
-        offset = self._resume_offsets.get(cur_file, 0)
-        self._handle = audio.play_file(cur_file, offset_bytes=offset)
+        self._start_track(audio, self.selected_index, True)
+
+    def _start_track(self, audio, idx, resume):
+        cur_file, info = self._track(idx)
+        offset = resume_store.get(cur_file) if resume else 0
+        self._handle = audio.play_file(cur_file, offset_bytes=offset, info=info)
+        resume_store.track(cur_file, self._handle)
         self._playing_file = cur_file
+        self._playing_index = idx
+        self._playing_total = info.data_len if info is not None else 0
         self.playing = True
         self.set_timer(self.TIMER_PROGRESS, 500, repeat=True)
         self._update_progress()
@@ -303,63 +331,88 @@ class PlayerApp(PopApp):
         self._refresh()
 
     def _play_index_from_head(self, idx):
-        if not self.files:
-            return
-        if idx < 0 or idx >= len(self.files):
+        if idx < 0 or idx >= self._count():
             return
         audio = get_audio()
         if not audio:
             return
         self.selected_index = idx
-        cur_file = self.files[idx]
-        self._handle = audio.play_file(cur_file, offset_bytes=0)
-        self._playing_file = cur_file
-        self.playing = True
-        self.set_timer(self.TIMER_PROGRESS, 500, repeat=True)
-        self._update_progress()
-        self._update_play_icon()
-        self._refresh()
+        self._start_track(audio, idx, False)
 
     def _toggle_loop_mode(self):
         self.play_mode = (self.play_mode + 1) % 3
         config.set("player_loop_mode", self.play_mode)
-        config.save()
         self._refresh()
 
     def on_enter(self):
         dprint(DEBUG_INFO, "PlayerApp on_enter")
         ok, msg = ensure_sd_mounted("/sd")
         if not ok:
-            self.files = []
+            self._set_tracks(None)
             self.status_label.set_text(msg)
             self._refresh()
             return
 
-        self.files = scan_wavs("/sd")
-        self._file_total_bytes = {}
-        for f in self.files:
-            try:
-                size = os.stat(f)[6]
-                self._file_total_bytes[f] = size - 44 if size > 44 else 0
-            except Exception:
-                self._file_total_bytes[f] = 0
-        if not self.files:
-            self.selected_index = 0
-        elif self._playing_file in self.files:
-            self.selected_index = self.files.index(self._playing_file)
-        elif self.selected_index >= len(self.files):
-            self.selected_index = 0
+        # Show the indexed list right away; the library then revalidates the
+        # card in the background and posts what it finds.
+        if self._library_version != self._library.version and not self._library.scanning:
+            self._reload_tracks()
+        self._library.start(self._on_library)
 
         self._sync_playback_state()
         self._update_progress()
         self._refresh()
 
+    def _on_library(self, items, done):
+        send_user_event(self, {"type": self.EVT_LIBRARY, "files": items, "done": done})
+
+    def _set_tracks(self, tracks):
+        if self._tracks is not None:
+            self._tracks.close()
+        self._tracks = tracks
+        self._pending = []
+
+    def _reload_tracks(self):
+        # Switch to the library's current list; keep selection and the
+        # playing track by path.
+        selected = self._path(self.selected_index) if 0 <= self.selected_index < self._count() else None
+        self._library_version = self._library.version
+        self._set_tracks(self._library.tracks())
+        self._playing_index = self._find(self._playing_file)
+        idx = self._find(selected)
+        if self._playing_index >= 0:
+            self.selected_index = self._playing_index
+        elif idx >= 0:
+            self.selected_index = idx
+        elif self.selected_index >= self._count():
+            self.selected_index = 0
+
+    def _add_pending(self, items):
+        for path, info in items:
+            if len(self._pending) >= self.PENDING_MAX:
+                break
+            if self._find(path) < 0:
+                self._pending.append((path, info))
+
+    def on_event(self, evt):
+        if isinstance(evt, dict) and evt.get("type") == self.EVT_LIBRARY:
+            if evt.get("done"):
+                self._reload_tracks()
+            else:
+                self._add_pending(evt.get("files") or [])
+            self._update_progress()
+            self._refresh()
+
     def on_pause(self):
         dprint(DEBUG_INFO, "PlayerApp on_pause")
         self.cancel_timer(self.TIMER_PROGRESS)
+        resume_store.flush()
 
     def on_resume(self):
         dprint(DEBUG_INFO, "PlayerApp on_resume")
+        if not self._library.scanning and self._library_version != self._library.version:
+            # The scan finished while we were in the background.
+            self._reload_tracks()
         self._sync_playback_state()
         self._refresh()
         self.screen.invalidate()
@@ -372,31 +425,38 @@ class PlayerApp(PopApp):
     def on_timer(self, timer_id):
         if timer_id == self.TIMER_PROGRESS:
             self._update_progress()
+            resume_store.maybe_flush()
 
     def on_input(self, key, status):
+        if status == KEY_S_PRESSED and config.get("key_click"):
+            play_effect(res.KEY_ANSWER)
         # GPIO ENTER: short press play/pause, long press toggle mode.
         if key == GPIO_KEY_ENTER:
-            if status == KEY_S_PRESSED:
-                self._enter_down_ms = time.ticks_ms()
+            if status == KEY_S_LONG:
+                self._enter_long = True
+                self._toggle_loop_mode()
+                return
+            if status != KEY_S_RELEASED:
                 return
             # treat release as action point
-            if self._enter_down_ms is not None:
-                held = time.ticks_diff(time.ticks_ms(), self._enter_down_ms)
-                self._enter_down_ms = None
-                if held >= self.ENTER_LONG_PRESS_MS:
-                    self._toggle_loop_mode()
-                    return
-                # short press -> play/stop toggle
-                if self.playing:
-                    self._stop()
-                    self._refresh()
-                else:
-                    self._play_selected()
+            if self._enter_long:
+                self._enter_long = False
                 return
+            # short press -> play/stop toggle
+            if self.playing:
+                self._stop()
+                self._refresh()
+            else:
+                self._play_selected()
+            return
+
+        # Held PREV/NEXT scroll the list.
+        if status == KEY_S_REPEAT and key in (GPIO_KEY_PREV, GPIO_KEY_NEXT, BLE_KEY_LEFT, BLE_KEY_RIGHT):
+            status = KEY_S_PRESSED
 
         # Be tolerant: some non-GPIO sources may only emit RELEASED.
         if status not in (KEY_S_PRESSED,):
-            if key not in (GPIO_KEY_MENU, BLE_KEY_MENU):
+            if key not in (GPIO_KEY_MENU, BLE_KEY_MENU) or status != KEY_S_RELEASED:
                 return
 
         if key in (GPIO_KEY_PREV, BLE_KEY_LEFT):
@@ -418,29 +478,33 @@ class PlayerApp(PopApp):
             min_app(self)
 
     def render(self):
-        self._sync_playback_state()
-        # Auto clear resume offset when track naturally reaches end.
+        # A finished track advances before the state sync below would
+        # clear the handle.
         if self.playing and self._handle is not None:
             try:
-                if self._handle.state == self._handle.DONE:
-                    cur_file = self.files[self.selected_index] if self.files else None
-                    if cur_file is not None and self.play_mode == self.MODE_ONE:
-                        self._resume_offsets[cur_file] = 0
-                        self._play_index_from_head(self.selected_index)
-                    elif cur_file is not None and self.play_mode == self.MODE_LIST and self.files:
-                        self._resume_offsets[cur_file] = 0
-                        next_idx = (self.selected_index + 1) % len(self.files)
-                        self._play_index_from_head(next_idx)
+                h = self._handle
+                # A handle that played all its sources ends STOPPED; one
+                # stopped by another player still has sources left.
+                if h.state == h.DONE or (h.state == h.STOPPED and h.source_index >= len(h.source_list)):
+                    cur_file = self._playing_file
+                    idx = self._playing_index
+                    if cur_file is not None:
+                        resume_store.untrack(cur_file)
+                        resume_store.clear(cur_file)
+                    if idx >= 0 and self.play_mode == self.MODE_ONE:
+                        self._play_index_from_head(idx)
+                    elif idx >= 0 and self.play_mode == self.MODE_LIST:
+                        self._play_index_from_head((idx + 1) % self._count())
                     else:
-                        if cur_file is not None:
-                            self._resume_offsets[cur_file] = 0
                         self._handle = None
                         self._playing_file = None
+                        self._playing_index = -1
                         self.playing = False
                         self.cancel_timer(self.TIMER_PROGRESS)
                     self._update_progress()
                     self._update_play_icon()
                     self._refresh()
-            except Exception:
-                pass
+            except Exception as e:
+                trace.log(CAT_APP, DEBUG_ERROR, "PlayerApp advance error:", type(e).__name__, e)
+        self._sync_playback_state()
         self.screen.show()
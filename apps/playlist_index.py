@@ -0,0 +1,265 @@
+"""
+Streaming playlist parsing into an on-flash index.
+
+Large server playlists do not fit in RAM as Python lists, so the body is
+fed to a parser chunk by chunk as it arrives from the socket, and every
+entry is appended to a PlaylistIndex on flash right away:
+
+    <path>.str  packed records: u16 url length, url, u16 name length, name
+    <path>.off  one u32 record offset per entry
+
+Reading entry i costs one seek into each file; nothing but the file
+handles stays in RAM.
+"""
+
+import struct
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+
+class M3uParser:
+    """
+    Incremental M3U/M3U8 parser. feed() takes raw body chunks and calls
+    `emit(url, name)` for every http(s) URL line; a preceding #EXTINF
+    title becomes the name. Lines may be split across chunks.
+    """
+    LINE_MAX = 1024
+
+    def __init__(self, emit):
+        self.emit = emit
+        self._tail = b""
+        self._name = ""
+
+    def feed(self, chunk):
+        data = self._tail + chunk if self._tail else bytes(chunk)
+        start = 0
+        while True:
+            nl = data.find(b"\n", start)
+            if nl < 0:
+                break
+            self._line(data[start:nl])
+            start = nl + 1
+        self._tail = data[start:]
+        if len(self._tail) > self.LINE_MAX:
+            self._tail = b""    # garbage, not a playlist line
+
+    def close(self):
+        if self._tail:
+            self._line(self._tail)
+            self._tail = b""
+
+    def _line(self, raw):
+        try:
+            line = raw.decode().strip()
+        except UnicodeError:
+            return
+        if not line:
+            return
+        if line.startswith("#"):
+            if line.startswith("#EXTINF:"):
+                self._name = line.split(",", 1)[1].strip() if "," in line else ""
+            return
+        if line.startswith("http://") or line.startswith("https://"):
+            self.emit(line, self._name)
+        self._name = ""
+
+
+class JsonArrayParser:
+    """
+    Streaming tokenizer for a JSON array of track objects:
+
+        [{"name": "...", "wav_url": "http://..."}, ...]
+
+    feed() tracks string/escape state and nesting depth across chunks and
+    only buffers one top-level element at a time, which is decoded on its
+    own with json.loads. Objects with a `wav_url` or `url` starting with
+    "http" are passed to `emit(url, name)`; anything else is skipped.
+    """
+    ELEMENT_MAX = 2048
+
+    def __init__(self, emit):
+        self.emit = emit
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._done = False
+        self._elem = None        # bytearray while inside a top-level object
+        self._skip = False       # current element is too large
+
+    def feed(self, chunk):
+        if self._done:
+            return
+        mv = memoryview(chunk)
+        n = len(chunk)
+        i = 0
+        mark = 0                 # start of the element bytes not yet copied
+        while i < n:
+            c = chunk[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == 0x5C:          # backslash
+                    self._esc = True
+                elif c == 0x22:          # closing quote
+                    self._in_str = False
+                else:
+                    # Jump to the next quote or backslash.
+                    q = chunk.find(b'"', i)
+                    b = chunk.find(b"\\", i)
+                    j = q if b < 0 or 0 <= q < b else b
+                    i = n if j < 0 else j
+                    continue
+            elif c == 0x22:
+                self._in_str = True
+            elif c == 0x7B or c == 0x5B:     # { [
+                self._depth += 1
+                if self._depth == 2 and c == 0x7B:
+                    self._elem = bytearray()
+                    self._skip = False
+                    mark = i
+            elif c == 0x7D or c == 0x5D:     # } ]
+                self._depth -= 1
+                if self._depth == 1 and self._elem is not None:
+                    self._keep(mv[mark:i + 1])
+                    self._element()
+                elif self._depth <= 0:
+                    self._done = True
+                    return
+            i += 1
+        if self._elem is not None:
+            self._keep(mv[mark:n])
+
+    def close(self):
+        self._elem = None
+
+    def _keep(self, part):
+        if self._skip:
+            return
+        if len(self._elem) + len(part) > self.ELEMENT_MAX:
+            self._skip = True
+            self._elem = bytearray()
+            return
+        self._elem.extend(part)
+
+    def _element(self):
+        elem = self._elem
+        skip = self._skip
+        self._elem = None
+        if skip:
+            return
+        try:
+            item = json.loads(bytes(elem))
+        except ValueError:
+            return
+        if not isinstance(item, dict):
+            return
+        u = item.get("wav_url") or item.get("url")
+        if isinstance(u, str) and u.startswith("http"):
+            name = item.get("name") or ""
+            self.emit(u, name if isinstance(name, str) else "")
+
+
+class PlaylistIndex:
+    """
+    Read side of the on-flash playlist. len(), url(i), name(i) and
+    entry(i) -> (url, name) read single records; the last few entries are
+    cached since the list view asks for the same window on every redraw.
+    """
+    CACHE = 8
+
+    def __init__(self, path):
+        self.path = path
+        self._off = open(path + ".off", "rb")
+        self._str = open(path + ".str", "rb")
+        self._off.seek(0, 2)
+        self._count = self._off.tell() // 4
+        self._cache = {}
+
+    def __len__(self):
+        return self._count
+
+    def entry(self, i):
+        e = self._cache.get(i)
+        if e is not None:
+            return e
+        if not 0 <= i < self._count:
+            raise IndexError("playlist index out of range")
+        self._off.seek(i * 4)
+        off = struct.unpack("<I", self._off.read(4))[0]
+        f = self._str
+        f.seek(off)
+        n = struct.unpack("<H", f.read(2))[0]
+        url = f.read(n).decode()
+        n = struct.unpack("<H", f.read(2))[0]
+        name = f.read(n).decode()
+        if len(self._cache) >= self.CACHE:
+            self._cache.clear()
+        e = (url, name)
+        self._cache[i] = e
+        return e
+
+    def url(self, i):
+        return self.entry(i)[0]
+
+    def name(self, i):
+        return self.entry(i)[1]
+
+    def close(self):
+        for f in (self._off, self._str):
+            try:
+                f.close()
+            except OSError:
+                pass
+
+
+class PlaylistWriter:
+    """Append side: add() packs one entry; open a PlaylistIndex after close()."""
+    NAME_MAX = 80
+
+    def __init__(self, path):
+        self.path = path
+        self._off = open(path + ".off", "wb")
+        self._str = open(path + ".str", "wb")
+        self._pos = 0
+        self.count = 0
+
+    def add(self, url, name=""):
+        u = url.encode()
+        s = name[:self.NAME_MAX].encode()
+        if len(u) > 0xFFFF:
+            return
+        self._off.write(struct.pack("<I", self._pos))
+        rec = struct.pack("<H", len(u)) + u + struct.pack("<H", len(s)) + s
+        self._str.write(rec)
+        self._pos += len(rec)
+        self.count += 1
+
+    def close(self):
+        self._off.close()
+        self._str.close()
+
+
+class MemoryPlaylist:
+    """The PlaylistIndex interface over small in-RAM lists (config URLs)."""
+
+    def __init__(self, urls=None, names=None):
+        self.urls = list(urls or [])
+        self.names = list(names or [])
+
+    def __len__(self):
+        return len(self.urls)
+
+    def entry(self, i):
+        return self.urls[i], (self.names[i] if i < len(self.names) else "") or ""
+
+    def url(self, i):
+        return self.urls[i]
+
+    def name(self, i):
+        return self.entry(i)[1]
+
+    def close(self):
+        pass
@@ -0,0 +1,226 @@
+"""
+Backlight and light sleep while the handheld is idle.
+
+AppManager.run calls power.idle() whenever its queue is empty, with the
+ms until the next app timer. idle() dims the backlight after
+'screen_dim_s' seconds without input and turns it off after
+'screen_off_s' (0: never; an app with keep_screen_on set keeps it on).
+If nothing is busy it then enters machine.lightsleep until the earlier
+of the next app timer and the next backlight step, with the GPIO keys
+armed as wake sources. Busy means:
+- a key is down or an edge is being debounced;
+- a check passed to setup() returns True (audio playing, WiFi up, BLE
+  keyboard scanning, connecting or connected);
+- something holds the power manager with hold().
+A sleep also ends by the earliest deadline passed to setup() (ms until a
+task's next work, e.g. the BLE keyboard's next reconnect attempt), so
+tasks waiting on uasyncio sleeps still run on time.
+
+It never sleeps while the backlight is dimmed, since the PWM stops
+during light sleep.
+
+power.input() is called for every key event. It restores the backlight.
+When the screen was off, it swallows the waking key's events up to and
+including its release.
+
+On the host, machine.lightsleep returns at once, or jumps the simulated
+tick counters ahead with sim.clock.virtual_sleep set, so hours of idle
+scheduling run in milliseconds, and stops at a key pressed mid-sleep on
+an armed wake pin (tools/power_check.py).
+"""
+
+import time
+
+import machine
+from machine import Pin
+
+from config import config
+from input_keys import KEY_S_PRESSED, KEY_S_RELEASED
+from utils import trace
+from utils.trace import CAT_POWER, DEBUG_ERROR
+
+BL_OFF = 0
+BL_DIM = 1
+BL_FULL = 2
+
+
+class PowerManager:
+    MIN_SLEEP_MS = 30       # shorter gaps are not worth a sleep/wake cycle
+    MAX_SLEEP_MS = 60000    # wake up at least this often
+    BUSY_POLL_MS = 1000     # re-check busy sources this often when not sleeping
+    DIM_DUTY = 0x1800       # backlight PWM duty (of 65535) when dimmed
+    PWM_FREQ = 1000
+
+    def __init__(self):
+        self.enabled = False
+        self.buttons = None
+        self._bl = None
+        self._pwm = None
+        self.level = BL_FULL
+        self._checks = []
+        self._deadlines = []
+        self._holds = set()
+        self._last_input = time.ticks_ms()
+        self._swallow = None
+        self._dim_s = None
+        self._off_s = None
+        self._sleep = None
+        self._no_wake = False
+        self.sleeps = 0
+        self.slept_ms = 0
+
+    def setup(self, backlight=None, buttons=None, checks=(), deadlines=()):
+        """
+        backlight: GPIO of the backlight (None: leave it alone).
+        buttons: the ButtonManager whose keys wake the CPU.
+        checks: callables returning True while their subsystem needs the CPU.
+        deadlines: callables returning ms until their subsystem's next work,
+        or None.
+        """
+        self._bl = Pin(backlight, Pin.OUT) if backlight is not None else None
+        self.buttons = buttons
+        self._checks = list(checks)
+        self._deadlines = list(deadlines)
+        self._dim_s = config.value("screen_dim_s", int, 0)
+        self._off_s = config.value("screen_off_s", int, 0)
+        self._sleep = config.value("light_sleep", bool)
+        self._last_input = time.ticks_ms()
+        self.enabled = True
+        self._set_backlight(BL_FULL)
+
+    def hold(self, owner):
+        """Keep the CPU awake until release(owner)."""
+        self._holds.add(owner)
+
+    def release(self, owner):
+        self._holds.discard(owner)
+
+    # ---------- input ----------
+    def input(self, key, status):
+        """Note activity; True if the event only woke the screen and must be dropped."""
+        if not self.enabled:
+            return False
+        self._last_input = time.ticks_ms()
+        if self._swallow is not None and key == self._swallow:
+            if status == KEY_S_RELEASED:
+                self._swallow = None
+            return True
+        if self.level == BL_OFF:
+            self._set_backlight(BL_FULL)
+            if status == KEY_S_PRESSED:
+                self._swallow = key
+            return True
+        if self.level != BL_FULL:
+            self._set_backlight(BL_FULL)
+        return False
+
+    # ---------- idle ----------
+    def idle(self, manager, wait):
+        """
+        Called by the app loop with an empty queue and `wait` ms until the
+        next app timer (None: none). May light-sleep; returns how long the
+        loop should wait for events.
+        """
+        if not self.enabled:
+            return wait
+        wait = self._next_wake(wait, manager)
+        if not self._can_sleep(wait):
+            return _earlier(wait, self.BUSY_POLL_MS)
+        ms = self.MAX_SLEEP_MS if wait is None else min(wait, self.MAX_SLEEP_MS)
+        slept = self._lightsleep(ms)
+        # Woken by the timer or a key: the loop runs once, then sleeps again.
+        # After a full sleep that ended short of the next deadline (capped,
+        # or the deadline moved), go straight back to sleep instead of
+        # waiting out the rest awake.
+        wait = self._next_wake(manager.timer_expire_ms(), manager)
+        return 0 if wait is None or slept >= ms else wait
+
+    def _next_wake(self, wait, manager):
+        wait = _earlier(wait, self._update(manager))
+        for deadline in self._deadlines:
+            wait = _earlier(wait, deadline())
+        return wait
+
+    def _update(self, manager):
+        # Backlight by idle time; ms until its next step, or None.
+        now = time.ticks_ms()
+        top = manager.app_stack[-1] if manager.app_stack else None
+        if top is not None and getattr(top, "keep_screen_on", False):
+            self._last_input = now
+            if self.level != BL_FULL:
+                self._set_backlight(BL_FULL)
+            return None
+        idle = time.ticks_diff(now, self._last_input)
+        dim = self._dim_s.value * 1000
+        off = self._off_s.value * 1000
+        if off and idle >= off:
+            level, nxt = BL_OFF, None
+        elif dim and idle >= dim:
+            level, nxt = BL_DIM, (off - idle if off else None)
+        else:
+            level = BL_FULL
+            nxt = _earlier(dim - idle if dim else None, off - idle if off else None)
+        if level != self.level:
+            self._set_backlight(level)
+        return nxt
+
+    def _can_sleep(self, wait):
+        if not self._sleep.value or self._no_wake or self.level == BL_DIM or self._holds:
+            return False
+        if wait is not None and wait < self.MIN_SLEEP_MS:
+            return False
+        if self.buttons is not None and not self.buttons.idle():
+            return False
+        for busy in self._checks:
+            if busy():
+                return False
+        return True
+
+    def _lightsleep(self, ms):
+        if self.buttons is not None and not self.buttons.set_wake(True):
+            # Keys could not wake us: stay awake from now on.
+            trace.log(CAT_POWER, DEBUG_ERROR, "no key wake-up, light sleep off")
+            self.buttons.set_wake(False)
+            self._no_wake = True
+            return 0
+        t0 = time.ticks_ms()
+        try:
+            machine.lightsleep(ms)
+        except Exception as e:
+            trace.log(CAT_POWER, DEBUG_ERROR, "lightsleep error:", type(e).__name__, e)
+        finally:
+            if self.buttons is not None:
+                self.buttons.set_wake(False)
+        slept = time.ticks_diff(time.ticks_ms(), t0)
+        self.sleeps += 1
+        self.slept_ms += slept
+        return slept
+
+    # ---------- backlight ----------
+    def _set_backlight(self, level):
+        self.level = level
+        if self._bl is None:
+            return
+        if level == BL_DIM:
+            if self._pwm is None:
+                self._pwm = machine.PWM(self._bl, freq=self.PWM_FREQ, duty_u16=self.DIM_DUTY)
+            else:
+                self._pwm.duty_u16(self.DIM_DUTY)
+            return
+        if self._pwm is not None:
+            self._pwm.deinit()
+            self._pwm = None
+            self._bl.init(Pin.OUT)
+        # A plain GPIO level holds through light sleep.
+        self._bl.value(1 if level == BL_FULL else 0)
+
+
+def _earlier(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a if a < b else b
+
+
+power = PowerManager()
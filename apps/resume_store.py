@@ -0,0 +1,190 @@
+"""
+Resume positions of audio tracks, kept on flash.
+
+Positions are keyed by a 32-bit FNV-1a hash of the file path or URL and
+stored as an append-only log of 8-byte records (key, offset); offset 0
+forgets a key. Loading replays the log, so the last record for a key
+wins and a record cut short by a power loss is ignored. Once the log holds
+COMPACT_RECORDS records it is rewritten with only the live entries,
+through a temp file and a rename.
+
+Changes are batched in RAM and appended by flush(), which the players
+call on pause and stop and the menu calls before powering off. A player
+can track() its playing handle instead of calling set() on every tick:
+flush() then reads the handle's position itself. At most MAX_ENTRIES
+keys are kept; the least recently used ones are dropped.
+"""
+
+import os
+import struct
+import time
+
+from utils import trace
+from utils.trace import CAT_CONFIG, DEBUG_ERROR
+
+_REC = "<II"
+_REC_SIZE = 8
+
+
+def path_key(path):
+    h = 0x811C9DC5
+    for b in path.encode():
+        h = ((h ^ b) * 0x01000193) & 0xFFFFFFFF
+    return h
+
+
+class ResumeStore:
+    MAX_ENTRIES = 64
+    COMPACT_RECORDS = 256
+    FLUSH_MS = 30000        # maybe_flush() interval while a handle plays
+
+    def __init__(self, path="resume.log", max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = None    # key -> [offset, last use]
+        self._seq = 0
+        self._pending = []      # (key, offset) not yet in the log
+        self._records = 0       # records in the log file
+        self._tracked = {}      # key -> handle
+        self._last_flush = time.ticks_ms()
+        self.flushes = 0
+        self.compactions = 0
+
+    # ---------- log ----------
+    def _load(self):
+        self._entries = {}
+        self._records = 0
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            try:
+                # Power lost between the two steps of a compaction.
+                f = open(self.path + ".tmp", "rb")
+            except OSError:
+                return
+        try:
+            with f:
+                while True:
+                    rec = f.read(_REC_SIZE)
+                    if len(rec) < _REC_SIZE:
+                        break
+                    key, offset = struct.unpack(_REC, rec)
+                    self._records += 1
+                    self._apply(key, offset)
+        except OSError:
+            pass
+
+    def _apply(self, key, offset):
+        if offset:
+            self._seq += 1
+            self._entries[key] = [offset, self._seq]
+            if len(self._entries) > self.max_entries:
+                self._trim()
+        else:
+            self._entries.pop(key, None)
+
+    def _trim(self):
+        while len(self._entries) > self.max_entries:
+            oldest = None
+            for key, e in self._entries.items():
+                if oldest is None or e[1] < self._entries[oldest][1]:
+                    oldest = key
+            self._entries.pop(oldest)
+
+    def _ensure(self):
+        if self._entries is None:
+            self._load()
+
+    # ---------- positions ----------
+    def get(self, path):
+        """Saved offset of `path` in bytes, 0 if none."""
+        self._ensure()
+        e = self._entries.get(path_key(path))
+        if e is None:
+            return 0
+        self._seq += 1
+        e[1] = self._seq
+        return e[0]
+
+    def set(self, path, offset):
+        self._put(path_key(path), max(0, int(offset)))
+
+    def clear(self, path):
+        self._put(path_key(path), 0)
+
+    def _put(self, key, offset):
+        self._ensure()
+        e = self._entries.get(key)
+        if (e[0] if e else 0) == offset:
+            return
+        self._apply(key, offset)
+        self._pending.append((key, offset))
+
+    def track(self, path, handle):
+        """Save `handle`'s position under `path` on every flush until untracked."""
+        self._tracked[path_key(path)] = handle
+
+    def untrack(self, path):
+        self._tracked.pop(path_key(path), None)
+
+    def _capture(self):
+        for key, h in list(self._tracked.items()):
+            if h.state in (h.STOPPED, h.DONE):
+                # Ended: forget the position if every source was played.
+                del self._tracked[key]
+                if h.source_index >= len(h.source_list):
+                    self._put(key, 0)
+                    continue
+            self._put(key, h.bytes_played)
+
+    def flush(self):
+        """Append pending changes to the log; compact it when it grew long."""
+        self._ensure()
+        self._capture()
+        self._last_flush = time.ticks_ms()
+        if not self._pending:
+            return
+        if self._records + len(self._pending) > self.COMPACT_RECORDS:
+            self.compact()
+            return
+        try:
+            with open(self.path, "ab") as f:
+                for key, offset in self._pending:
+                    f.write(struct.pack(_REC, key, offset))
+            self._records += len(self._pending)
+            self._pending = []
+            self.flushes += 1
+        except OSError as e:
+            trace.log(CAT_CONFIG, DEBUG_ERROR, "resume flush error:", type(e).__name__, e)
+
+    def maybe_flush(self):
+        """flush() if FLUSH_MS passed since the last one; call from a timer."""
+        if time.ticks_diff(time.ticks_ms(), self._last_flush) >= self.FLUSH_MS:
+            self.flush()
+
+    def compact(self):
+        """Rewrite the log with the live entries, least recently used first."""
+        self._ensure()
+        tmp = self.path + ".tmp"
+        items = sorted(self._entries.items(), key=lambda kv: kv[1][1])
+        try:
+            with open(tmp, "wb") as f:
+                for key, e in items:
+                    f.write(struct.pack(_REC, key, e[0]))
+            _replace(tmp, self.path)
+            self._records = len(items)
+            self._pending = []
+            self.compactions += 1
+        except OSError as e:
+            trace.log(CAT_CONFIG, DEBUG_ERROR, "resume compact error:", type(e).__name__, e)
+
+
+def _replace(src, dst):
+    try:
+        os.rename(src, dst)     # LittleFS replaces dst atomically
+    except OSError:
+        os.remove(dst)
+        os.rename(src, dst)
+
+
+resume_store = ResumeStore()
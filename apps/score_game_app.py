@@ -1,15 +1,17 @@
+import uasyncio as asyncio
 import utils.res as res
-from app_context import get_audio
+from app_context import get_audio, play_effect
 from config import config
 from gui.core.colors import BLUE, GRAY, GREEN, RED, WHITE
 from gui.core.gui import Screen
 from gui.fonts import arial35, arial_50, font10, freesans20, icon_font16, icon_font24, icon_font36
 from gui.widgets.label import Label
 from gui.widgets.shape import Line, Rectangle
-from input_keys import BLE_KEY_ENTER, BLE_KEY_LEFT, BLE_KEY_MENU, BLE_KEY_RIGHT, GPIO_KEY_ENTER, GPIO_KEY_MENU, GPIO_KEY_NEXT, GPIO_KEY_PREV, KEY_S_PRESSED, KEY_S_RELEASED
+from input_keys import BLE_KEY_ENTER, BLE_KEY_LEFT, BLE_KEY_MENU, BLE_KEY_RIGHT, GPIO_KEY_ENTER, GPIO_KEY_MENU, GPIO_KEY_NEXT, GPIO_KEY_PREV, KEY_S_LONG, KEY_S_PRESSED, KEY_S_RELEASED
 from manager import PopApp, exit_app
 from score_board import BadmintonRule, Scoreboard, TableTennisRule
-from utils.trace import DEBUG_INFO, dprint
+from utils import trace
+from utils.trace import CAT_APP, DEBUG_DBG, DEBUG_INFO
 
 
 PINGPONG_DEF = {
@@ -30,11 +32,15 @@ BADMINTON_DEF = {
 
 
 class ScoreGameApp(PopApp):
-    TIMER_EXIT = 1
-    TIMER_NEW_MATCH = 2
     EXIT_HOLD_MS = 1200
     NEW_MATCH_HOLD_MS = 2000
 
+    keep_screen_on = True       # the score is watched, not touched
+    long_press_ms = {
+        GPIO_KEY_MENU: EXIT_HOLD_MS, BLE_KEY_MENU: EXIT_HOLD_MS,
+        GPIO_KEY_ENTER: NEW_MATCH_HOLD_MS, BLE_KEY_ENTER: NEW_MATCH_HOLD_MS,
+    }
+
     def __init__(self, game_def):
         super().__init__()
         self.game_def = game_def
@@ -46,7 +52,7 @@ class ScoreGameApp(PopApp):
         p1_color = ball_bgcolors[0] if len(ball_bgcolors) > 0 else GREEN
         p2_color = ball_bgcolors[1] if len(ball_bgcolors) > 1 else BLUE
 
-        dprint(DEBUG_INFO, "{} init".format(game_def["name"]))
+        trace.log(CAT_APP, DEBUG_INFO, "init", game_def["name"])
 
         self.scoreboard = Scoreboard(game_def["rule_factory"]())
         self.screen = Screen(bgcolor=GRAY)
@@ -173,51 +179,47 @@ class ScoreGameApp(PopApp):
         self.scoreboard.start_new_match()
         self.update_score_display()
         self.set_game_active(True)
+        if config.get("tts_enable"):
+            play_effect(res.GAME_START)
 
     def on_enter(self):
-        dprint(DEBUG_INFO, "{} on_enter".format(self.game_def["name"]))
+        trace.log(CAT_APP, DEBUG_INFO, "on_enter", self.game_def["name"])
         self.screen.invalidate()
+        audio = get_audio()
+        if audio is not None and config.get("tts_enable"):
+            # Warm the clip cache so the first announcement plays from RAM.
+            asyncio.create_task(audio.clips.preload([res.WAV_DIR + f for f in res.SCORE_VOICE_FILES]))
 
     def on_pause(self):
-        dprint(DEBUG_INFO, "{} on_pause".format(self.game_def["name"]))
+        trace.log(CAT_APP, DEBUG_INFO, "on_pause", self.game_def["name"])
 
     def on_resume(self):
-        dprint(DEBUG_INFO, "{} on_resume".format(self.game_def["name"]))
+        trace.log(CAT_APP, DEBUG_INFO, "on_resume", self.game_def["name"])
         self.screen.invalidate()
 
     def on_exit(self):
-        dprint(DEBUG_INFO, "{} on_exit".format(self.game_def["name"]))
+        trace.log(CAT_APP, DEBUG_INFO, "on_exit", self.game_def["name"])
 
     def on_event(self, evt):
-        dprint(DEBUG_INFO, "{} on_event: {evt}".format(self.game_def["name"]))
-
-    def on_timer(self, timer_id):
-        dprint(DEBUG_INFO, "timer {} enter".format(timer_id))
-        if timer_id == self.TIMER_EXIT:
-            dprint(DEBUG_INFO, "Quit game")
-            exit_app()
-        elif timer_id == self.TIMER_NEW_MATCH:
-            dprint(DEBUG_INFO, "start new match")
-            self.start_new_match()
+        trace.log(CAT_APP, DEBUG_DBG, "on_event", self.game_def["name"], evt)
 
     def on_input(self, key, status):
-        dprint(DEBUG_INFO, "Key: {}, Status: {}".format(key, status))
+        trace.log(CAT_APP, DEBUG_DBG, "on_input", key, status)
         new_set = False
         s1 = s2 = 0
         score_change = False
 
         if key in (GPIO_KEY_MENU, BLE_KEY_MENU):
-            if status == KEY_S_PRESSED:
-                self.set_timer(self.TIMER_EXIT, self.EXIT_HOLD_MS)
-            elif status == KEY_S_RELEASED:
-                self.cancel_timer(self.TIMER_EXIT)
+            if status == KEY_S_LONG:
+                trace.log(CAT_APP, DEBUG_INFO, "Quit game")
+                exit_app()
             return
 
         if key in (GPIO_KEY_ENTER, BLE_KEY_ENTER):
-            if status == KEY_S_PRESSED:
-                self.set_timer(self.TIMER_NEW_MATCH, self.NEW_MATCH_HOLD_MS)
+            if status == KEY_S_LONG:
+                trace.log(CAT_APP, DEBUG_INFO, "start new match")
+                self.start_new_match()
             elif status == KEY_S_RELEASED:
-                self.cancel_timer(self.TIMER_NEW_MATCH)
                 if self.waiting_for_next_set:
                     self.start_next_set()
             return
@@ -238,7 +240,7 @@ class ScoreGameApp(PopApp):
                 audio_files = res.build_score_files(s1, s2)
                 if new_set:
                     audio_files.append(res.SET_FINISH)
-                audio_files = ["res/wav/" + filename for filename in audio_files]
+                audio_files = [res.WAV_DIR + filename for filename in audio_files]
                 get_audio().play_files(audio_files, emerge = True)
 
             if new_set:
@@ -248,9 +250,9 @@ class ScoreGameApp(PopApp):
             self.update_score_display()
 
     def render(self):
-        dprint(DEBUG_INFO, "{} render".format(self.game_def["name"]))
+        trace.log(CAT_APP, DEBUG_DBG, "render", self.game_def["name"])
         self.screen.show()
-        dprint(DEBUG_INFO, "{} render end".format(self.game_def["name"]))
+        trace.log(CAT_APP, DEBUG_DBG, "render end", self.game_def["name"])
 
 
 class PingPongApp(ScoreGameApp):
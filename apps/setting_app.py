@@ -4,7 +4,7 @@ from gui.core.gui import Screen
 from gui.fonts import arial35, freesans20
 from gui.widgets.image import ImageWidget
 from gui.widgets.label import Label
-from input_keys import BLE_KEY_ENTER, BLE_KEY_LEFT, BLE_KEY_MENU, BLE_KEY_RIGHT, GPIO_KEY_ENTER, GPIO_KEY_MENU, GPIO_KEY_NEXT, GPIO_KEY_PREV, KEY_S_PRESSED
+from input_keys import BLE_KEY_ENTER, BLE_KEY_LEFT, BLE_KEY_MENU, BLE_KEY_RIGHT, GPIO_KEY_ENTER, GPIO_KEY_MENU, GPIO_KEY_NEXT, GPIO_KEY_PREV, KEY_S_PRESSED, KEY_S_REPEAT
 from manager import PopApp, exit_app
 from utils.trace import DEBUG_INFO, dprint
 
@@ -16,6 +16,8 @@ class SettingApp(PopApp):
         screen_width = self.screen.w
 
         self.items = ["volume", "tts_enable"]
+        self.volume = config.value("volume", int, 0, 10)
+        self.tts_enable = config.value("tts_enable", bool)
         self.selected_index = 0
 
         self.title_label = Label(0, 16, "Settings", freesans20, WHITE, w=screen_width, align="center")
@@ -37,13 +39,13 @@ class SettingApp(PopApp):
         volume_prefix = ">" if self.selected_index == 0 else " "
         tts_prefix = ">" if self.selected_index == 1 else " "
 
-        self.volume_label.set_text("{} Volume: {}".format(volume_prefix, config.get("volume")))
-        self.tts_label.set_text("{} TTS: {}".format(tts_prefix, "ON" if config.get("tts_enable") else "OFF"))
+        self.volume_label.set_text("{} Volume: {}".format(volume_prefix, self.volume.value))
+        self.tts_label.set_text("{} TTS: {}".format(tts_prefix, "ON" if self.tts_enable.value else "OFF"))
 
     def _adjust_current(self, delta):
         current_item = self.items[self.selected_index]
         if current_item == "volume":
-            new_volume = config.get("volume") + delta
+            new_volume = self.volume.value + delta
             if new_volume < 0:
                 new_volume = 0
             elif new_volume > 10:
@@ -67,9 +69,14 @@ class SettingApp(PopApp):
 
     def on_exit(self):
         dprint(DEBUG_INFO, "SettingApp on_exit")
-        config.save()
+        # Saved by the config write-behind task.
+        self.volume.close()
+        self.tts_enable.close()
 
     def on_input(self, key, status):
+        # Held PREV/NEXT keep stepping the value.
+        if status == KEY_S_REPEAT and key in (GPIO_KEY_PREV, BLE_KEY_LEFT, GPIO_KEY_NEXT, BLE_KEY_RIGHT):
+            status = KEY_S_PRESSED
         if status != KEY_S_PRESSED:
             return
 
@@ -81,7 +88,6 @@ class SettingApp(PopApp):
             self.selected_index = (self.selected_index + 1) % len(self.items)
             self._update_labels()
         elif key in (GPIO_KEY_MENU, BLE_KEY_MENU):
-            config.save()
             exit_app()
 
     def render(self):
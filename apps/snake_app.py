@@ -4,7 +4,7 @@ from gui.core.colors import BLACK, GRAY, GREEN, RED, WHITE, YELLOW
 from gui.core.gui import Screen, Widget
 from gui.fonts import font10, freesans20
 from gui.widgets.label import Label
-from input_keys import BLE_KEY_DOWN, BLE_KEY_ENTER, BLE_KEY_LEFT, BLE_KEY_MENU, BLE_KEY_RIGHT, BLE_KEY_UP, GPIO_KEY_ENTER, GPIO_KEY_MENU, GPIO_KEY_NEXT, GPIO_KEY_PREV, KEY_S_PRESSED, KEY_S_RELEASED
+from input_keys import BLE_KEY_DOWN, BLE_KEY_ENTER, BLE_KEY_LEFT, BLE_KEY_MENU, BLE_KEY_RIGHT, BLE_KEY_UP, GPIO_KEY_ENTER, GPIO_KEY_MENU, GPIO_KEY_NEXT, GPIO_KEY_PREV, KEY_S_LONG, KEY_S_PRESSED
 from manager import PopApp, exit_app
 from utils.trace import DEBUG_INFO, dprint
 
@@ -60,7 +60,9 @@ class SnakeApp(PopApp):
     DIR_DOWN = (0, 1)
     DIR_LEFT = (-1, 0)
     TIMER_STEP = 10
-    TIMER_EXIT = 11
+    EXIT_HOLD_MS = 1200
+
+    long_press_ms = {GPIO_KEY_MENU: EXIT_HOLD_MS, BLE_KEY_MENU: EXIT_HOLD_MS}
 
     def __init__(self):
         super().__init__()
@@ -179,20 +181,15 @@ class SnakeApp(PopApp):
     def on_exit(self):
         dprint(DEBUG_INFO, "SnakeApp on_exit")
         self.cancel_timer(self.TIMER_STEP)
-        self.cancel_timer(self.TIMER_EXIT)
 
     def on_timer(self, timer_id):
         if timer_id == self.TIMER_STEP:
             self._step()
-        elif timer_id == self.TIMER_EXIT:
-            exit_app()
 
     def on_input(self, key, status):
         if key in (GPIO_KEY_MENU, BLE_KEY_MENU):
-            if status == KEY_S_PRESSED:
-                self.set_timer(self.TIMER_EXIT, 1200)
-            elif status == KEY_S_RELEASED:
-                self.cancel_timer(self.TIMER_EXIT)
+            if status == KEY_S_LONG:
+                exit_app()
             return
 
         if status != KEY_S_PRESSED:
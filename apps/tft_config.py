@@ -23,10 +23,10 @@ backlight.value(0)
 from drivers.st7789 import st7789py as st7789
 tft = st7789.ST7789(
     spi,
-    240, 240,
+    hw.TFT_WIDTH, hw.TFT_HEIGHT,
     reset=Pin(hw.TFT_GPIO_RESET, Pin.OUT),
     dc=Pin(hw.TFT_GPIO_DC, Pin.OUT),
-    rotation=1,
+    rotation=hw.TFT_ROTATION,
     color_order=st7789.BGR
 )
 
@@ -46,7 +46,7 @@ try:
             y = (tft.height - h) // 2
         tft.blit_buffer(data, x, y, w, h)
 except OSError as e:
-    tft.fill_rect(90, 90, 60, 60, st7789.WHITE)
+    tft.fill_rect((tft.width - 60) // 2, (tft.height - 60) // 2, 60, 60, st7789.WHITE)
 
 backlight.value(1)
 
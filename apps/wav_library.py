@@ -0,0 +1,354 @@
+"""
+WAV library of the SD card.
+
+WavLibrary.scan() walks the card as a uasyncio task and yields between
+batches, so entering the player never blocks the UI on a big card. The
+result is a TrackList on the card that is read a page at a time, so the
+player never holds the whole library in RAM:
+
+    <mount>/.wavlib.json       {"v": 3, "gen": 0, "dirs": {"/sd/wav": [first, count]}}
+    <mount>/.wavlib<gen>.off   one u32 record offset per track
+    <mount>/.wavlib<gen>.str   records: u16 path length, path, then u32
+                               size, data_offset, data_len, rate,
+                               channels, bits, fmt, block_align
+                               (channels 0: no usable header)
+
+Tracks are ordered folder by folder (a folder's files sorted by name,
+then its subfolders), so the files of one folder are one index range.
+
+A scan revalidates each directory with one os.ilistdir() pass. The entries
+carry their sizes, so unchanged files cost no stat and no header read;
+only new or resized files are parsed. A folder's sorted file names are
+matched against its range of the old list in one forward pass, so the
+walk holds one folder's names and sizes and nothing of the old list.
+The new list is compared with the old one record by record as it is
+produced and is only written out from the first difference on, into the
+other generation of files, so the list the UI has open stays valid until
+it is told to reopen. `emit(items,
+done)` gets batches of newly parsed (path, WavInfo) while the walk runs
+and `([], True)` once the new list is in place.
+"""
+
+import os
+import struct
+import uasyncio as asyncio
+
+from audio_sources.wav import WavInfo, read_wav_info_sized
+from power_manager import power
+from utils import trace
+from utils.trace import CAT_AUDIO, DEBUG_ERROR
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+_S_IFDIR = 0x4000
+_INFO = "<8I"                   # [size] + WavInfo.to_list()
+_INFO_SIZE = struct.calcsize(_INFO)
+_CHANNELS = 4                   # index of channels in a record
+_PACK_ERRORS = (OverflowError, ValueError, getattr(struct, "error", ValueError))
+
+
+def _pack_info(entry):
+    if len(entry) > 1:
+        return struct.pack(_INFO, *entry)
+    return struct.pack(_INFO, max(0, entry[0]), 0, 0, 0, 0, 0, 0, 0)
+
+
+def _pack(path, entry):
+    p = path.encode()
+    return struct.pack("<H", len(p)) + p + _pack_info(entry)
+
+
+def _info(entry):
+    return WavInfo.from_list(entry[1:]) if len(entry) > 1 else None
+
+
+class TrackList:
+    """
+    Random access to a library generation. len(), path(i), info(i) and
+    entry(i) -> (path, [size] + WavInfo list) read through a small page
+    cache; find(path) bisects the path's folder range.
+    """
+    PAGE = 16
+    PAGES = 2
+
+    def __init__(self, base, dirs):
+        self._off = open(base + ".off", "rb")
+        self._str = open(base + ".str", "rb")
+        self._off.seek(0, 2)
+        self._count = self._off.tell() // 4
+        self._dirs = dirs
+        self._pages = []         # [(page number, [(path, entry)])], most recent last
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        for f in (self._off, self._str):
+            try:
+                f.close()
+            except OSError:
+                pass
+        self._pages = []
+
+    def _page(self, p):
+        for page in self._pages:
+            if page[0] == p:
+                return page[1]
+        # Records of a page are contiguous: one seek, then sequential reads.
+        first = p * self.PAGE
+        n = min(self.PAGE, self._count - first)
+        self._off.seek(first * 4)
+        f = self._str
+        f.seek(struct.unpack("<I", self._off.read(4))[0])
+        items = []
+        for _ in range(n):
+            size = struct.unpack("<H", f.read(2))[0]
+            path = f.read(size).decode()
+            e = struct.unpack(_INFO, f.read(_INFO_SIZE))
+            items.append((path, list(e) if e[_CHANNELS] else [e[0]]))
+        if len(self._pages) >= self.PAGES:
+            self._pages.pop(0)
+        self._pages.append((p, items))
+        return items
+
+    def entry(self, i):
+        if not 0 <= i < self._count:
+            raise IndexError("track index out of range")
+        return self._page(i // self.PAGE)[i % self.PAGE]
+
+    def path(self, i):
+        return self.entry(i)[0]
+
+    def info(self, i):
+        return _info(self.entry(i)[1])
+
+    def dir_range(self, d):
+        r = self._dirs.get(d)
+        return (r[0], r[1]) if r else (0, 0)
+
+    def find(self, path):
+        """Index of `path`, or -1."""
+        lo, n = self.dir_range(path.rsplit("/", 1)[0])
+        hi = lo + n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            p = self.path(mid)
+            if p == path:
+                return mid
+            if p < path:
+                lo = mid + 1
+            else:
+                hi = mid
+        return -1
+
+
+class _Writer:
+    def __init__(self, base):
+        self._off = open(base + ".off", "wb")
+        self._str = open(base + ".str", "wb")
+        self._pos = 0
+        self.count = 0
+
+    def add(self, path, entry):
+        rec = _pack(path, entry)
+        self._off.write(struct.pack("<I", self._pos))
+        self._str.write(rec)
+        self._pos += len(rec)
+        self.count += 1
+
+    def close(self):
+        self._off.close()
+        self._str.close()
+
+
+class WavLibrary:
+    NAME = ".wavlib"
+    VERSION = 3
+    BATCH = 16          # files between yields and between UI updates
+    MAX_DEPTH = 4
+
+    def __init__(self, mount_point="/sd"):
+        self.root = mount_point.rstrip("/")
+        self.base = self.root + "/" + self.NAME
+        self._meta = None           # {"gen": n, "dirs": {dir: [first, count]}}
+        self._task = None
+        self._out = None
+        self._same = 0
+        self.parsed = 0             # headers read so far
+        self.version = 0            # completed scans that changed the list
+        self.written = 0            # records written by the last scan
+
+    @property
+    def scanning(self):
+        return self._task is not None and not self._task.done()
+
+    def _load(self):
+        self._meta = {"gen": 0, "dirs": {}}
+        try:
+            with open(self.base + ".json", "r") as f:
+                data = json.load(f)
+            if data.get("v") == self.VERSION:
+                self._meta = data
+        except (OSError, ValueError):
+            pass
+
+    def tracks(self):
+        """The current TrackList (the caller closes it), or None before the first scan."""
+        if self._meta is None:
+            self._load()
+        if not self._meta["dirs"]:
+            return None
+        try:
+            return TrackList(self.base + str(self._meta["gen"]), self._meta["dirs"])
+        except OSError:
+            return None
+
+    def start(self, emit):
+        """Run scan(emit) in the background unless one is running."""
+        if self.scanning:
+            return False
+        self._task = asyncio.create_task(self.scan(emit))
+        return True
+
+    async def scan(self, emit):
+        if self._meta is None:
+            self._load()
+        old = self.tracks()
+        # The walk yields between batches; no light sleep in between.
+        power.hold(self)
+        try:
+            changed = await self._walk(old, emit)
+        finally:
+            power.release(self)
+            if self._out is not None:
+                self._out.close()
+                self._out = None
+            if old is not None:
+                old.close()
+        if changed:
+            self.version += 1
+        emit([], True)
+
+    async def _walk(self, old, emit):
+        gen = 1 - self._meta["gen"]
+        old_n = len(old) if old is not None else 0
+        self._same = 0                  # records identical to the old list so far
+        self.written = 0
+        dirs = {}
+        batch = []
+        seen = 0
+        stack = [(self.root, 0)]
+        while stack:
+            d, depth = stack.pop()
+            # Keep only (name, size) of the folder's WAVs, not the listing.
+            files = []
+            subdirs = []
+            try:
+                for item in os.ilistdir(d):
+                    name = item[0]
+                    if name.startswith("."):
+                        continue
+                    if item[1] == _S_IFDIR:
+                        if depth < self.MAX_DEPTH:
+                            subdirs.append(d + "/" + name)
+                    elif name.lower().endswith(".wav"):
+                        files.append((name, item[3] if len(item) > 3 else -1))
+            except OSError as e:
+                trace.log(CAT_AUDIO, DEBUG_ERROR, "library listdir error:", d, type(e).__name__, e)
+                continue
+            files.sort()
+            subdirs.sort()
+            # The old list has this folder's files sorted by name too:
+            # walk both in step.
+            k, end = old.dir_range(d) if old is not None else (0, 0)
+            end += k
+            first = self._produced()
+            for name, size in files:
+                path = d + "/" + name
+                e = None
+                while k < end:
+                    old_path, old_e = old.entry(k)
+                    if old_path >= path:
+                        if old_path == path:
+                            e = old_e
+                            k += 1
+                        break
+                    k += 1
+                if e is None or e[0] != size or size < 0:
+                    e = self._parse(path, size)
+                    batch.append((path, _info(e)))
+                    # A header read is a few SD sectors; let the UI run.
+                    await asyncio.sleep_ms(0)
+                self._put(old, gen, path, e)
+                seen += 1
+                if seen % self.BATCH == 0:
+                    if batch:
+                        emit(batch, False)
+                        batch = []
+                    await asyncio.sleep_ms(0)
+            files = None
+            count = self._produced() - first
+            if count:
+                dirs[d] = [first, count]
+            for sub in reversed(subdirs):
+                stack.append((sub, depth + 1))
+        if batch:
+            emit(batch, False)
+
+        if self._out is None:
+            if self._same == old_n and dirs == self._meta["dirs"]:
+                return False
+            self._start_output(old, gen)
+        self._out.close()
+        self._out = None
+        self._meta = {"v": self.VERSION, "gen": gen, "dirs": dirs}
+        try:
+            with open(self.base + ".json", "w") as f:
+                json.dump(self._meta, f)
+        except OSError as e:
+            trace.log(CAT_AUDIO, DEBUG_ERROR, "library save error:", type(e).__name__, e)
+        return True
+
+    def _produced(self):
+        return self._same if self._out is None else self._out.count
+
+    def _put(self, old, gen, path, e):
+        if self._out is None:
+            k = self._same
+            if old is not None and k < len(old) and old.entry(k) == (path, e):
+                self._same = k + 1
+                return
+            self._start_output(old, gen)
+        self._out.add(path, e)
+        self.written += 1
+
+    def _start_output(self, old, gen):
+        # First difference: copy the identical head, then write from here on.
+        self._out = _Writer(self.base + str(gen))
+        for i in range(self._same):
+            self._out.add(*old.entry(i))
+        self.written += self._same
+
+    def _parse(self, path, size):
+        self.parsed += 1
+        if size < 0:
+            try:
+                size = os.stat(path)[6]
+            except OSError:
+                return [0]
+        try:
+            e = [size] + read_wav_info_sized(path, size).to_list()
+        except (OSError, ValueError) as e:
+            trace.log(CAT_AUDIO, DEBUG_ERROR, "library header error:", path, type(e).__name__, e)
+            return [size]
+        # A record the index can't hold is listed without a header
+        # rather than ending the scan.
+        try:
+            _pack_info(e)
+        except _PACK_ERRORS as err:
+            trace.log(CAT_AUDIO, DEBUG_ERROR, "library record error:", path, type(err).__name__, err)
+            return [size]
+        return e
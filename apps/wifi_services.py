@@ -50,6 +50,9 @@ class WifiService:
         if not self._clients:
             self._start_idle()
 
+    def busy(self):
+        return self._connected or self._connecting
+
     async def force_off(self):
         await self._disconnect()
 
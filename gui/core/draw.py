@@ -60,6 +60,53 @@ def fill_rect_fast(buf, buf_w: int,
             b[idx + 1] = lo
             idx += 2
 
+@micropython.viper
+def scale_down_box(buf, w: int, out_w: int, out_h: int, n: int, inv: int):
+    # In place: each n x n block of the w-wide RGB565 (big-endian) image
+    # becomes its average, packed out_w x out_h from the start of buf.
+    # inv = ceil(65536 / (n * n)). Writes never pass the block being read.
+    b = ptr8(buf)
+    o = 0
+    for oy in range(out_h):
+        row = oy * n * w
+        for ox in range(out_w):
+            r = 0
+            g = 0
+            bl = 0
+            base = row + ox * n
+            for dy in range(n):
+                p = (base + dy * w) * 2
+                for dx in range(n):
+                    c = (b[p] << 8) | b[p + 1]
+                    r += c >> 11
+                    g += (c >> 5) & 0x3F
+                    bl += c & 0x1F
+                    p += 2
+            c = (((r * inv) >> 16) << 11) | (((g * inv) >> 16) << 5) | ((bl * inv) >> 16)
+            b[o] = c >> 8
+            b[o + 1] = c & 0xFF
+            o += 2
+
+@micropython.viper
+def scale_up_rows(src, w: int, row: int, rows: int, n: int, dst):
+    # Rows row..row+rows-1 of the w-wide image, each pixel n x n, into dst.
+    s = ptr16(src)
+    d = ptr16(dst)
+    line = w * n
+    o = 0
+    for r in range(rows):
+        sp = (row + r) * w
+        start = o
+        for x in range(w):
+            c = s[sp + x]
+            for k in range(n):
+                d[o] = c
+                o += 1
+        for k in range(n - 1):
+            for x in range(line):
+                d[o + x] = d[start + x]
+            o += line
+
 class DrawContext:
 
     def __init__(self, display):
@@ -1,21 +1,73 @@
 from gui.core.geom import Rect
+from gui.core.draw import scale_down_box, scale_up_rows
 import time
+from utils import trace
+from utils.trace import CAT_GUI, DEBUG_DBG
+
+_TRACE = const(1)
 
 # Globally available singleton objects
 display = None  # Singleton instance
 
+# Size of the layout the apps are written for (logical coordinates)
+LAYOUT_W = 240
+LAYOUT_H = 240
+
 # Wrapper for global ssd object providing framebuf compatible methods.
 class Display:
-    def __init__(self, tftobj):
+    """
+    Widgets draw in a logical w x h space (LAYOUT_W x LAYOUT_H by default),
+    whatever the panel. The viewport maps it onto the panel at the largest
+    integer scale that fits, centred: `up` times larger, or `down` times
+    smaller (n x n blocks averaged), done in viper while blitting. Dirty
+    rects must be aligned to `align` logical pixels; Screen does that.
+    """
+    SCALE_BUF = 8192    # bytes of scaled rows sent per SPI window when scaling up
+
+    def __init__(self, tftobj, w=LAYOUT_W, h=LAYOUT_H):
         global display
         self.tft = tftobj
-        self.w = tftobj.width
-        self.h = tftobj.height
+        self.w = w
+        self.h = h
         # 全局buffer
         self.buffer = bytearray(self.w * self.h * 2) # RGB565, 2byte
+        self._scaled = None
+        self._viewport()
 
         display = self
 
+    def _viewport(self):
+        pw = self.tft.width
+        ph = self.tft.height
+        up = min(pw // self.w, ph // self.h)
+        down = 1
+        if up == 0:
+            up = 1
+            while self.w // down > pw or self.h // down > ph:
+                down += 1
+        self.up = up
+        self.down = down
+        self.align = down
+        self.out_w = self.w * up // down
+        self.out_h = self.h * up // down
+        self.ox = (pw - self.out_w) // 2
+        self.oy = (ph - self.out_h) // 2
+        self._inv = (65536 + down * down - 1) // (down * down)
+        if up > 1 and self._scaled is None:
+            self._scaled = bytearray(max(self.w * up * up * 2, self.SCALE_BUF))
+        # Outside the viewport stays black.
+        x1 = self.ox + self.out_w
+        y1 = self.oy + self.out_h
+        for x, y, w, h in ((0, 0, pw, self.oy), (0, y1, pw, ph - y1),
+                           (0, self.oy, self.ox, self.out_h), (x1, self.oy, pw - x1, self.out_h)):
+            if w > 0 and h > 0:
+                self.tft.fill_rect(x, y, w, h, 0)
+
+    def set_rotation(self, rotation):
+        """Rotate the panel and fit the viewport again; redraw the screen after."""
+        self.tft.rotation(rotation)
+        self._viewport()
+
     # 全屏幕填充
     def fill(self, color):
         self.tft.fill(color)
@@ -34,7 +86,26 @@ class Display:
     # 区域写DATA，底层可set_windows，再write数据
     # 最重要的接口，利用此接口实现区域刷新
     def blit_buffer(self, rect, buffer):
-        self.tft.blit_buffer(buffer, rect.x, rect.y, rect.w, rect.h)
+        if self.up == 1 and self.down == 1:
+            self.tft.blit_buffer(buffer, self.ox + rect.x, self.oy + rect.y, rect.w, rect.h)
+        elif self.down > 1:
+            n = self.down
+            w = rect.w // n
+            h = rect.h // n
+            if not w or not h:
+                return
+            scale_down_box(buffer, rect.w, w, h, n, self._inv)
+            self.tft.blit_buffer(memoryview(buffer)[:w * h * 2], self.ox + rect.x // n, self.oy + rect.y // n, w, h)
+        else:
+            n = self.up
+            rows = max(1, len(self._scaled) // (rect.w * n * n * 2))
+            y = 0
+            while y < rect.h:
+                k = min(rows, rect.h - y)
+                scale_up_rows(buffer, rect.w, y, k, n, self._scaled)
+                self.tft.blit_buffer(memoryview(self._scaled)[:rect.w * n * k * n * 2],
+                                     self.ox + rect.x * n, self.oy + (rect.y + y) * n, rect.w * n, k * n)
+                y += k
 
 
 class Widget:
@@ -194,6 +265,14 @@ class Screen:
         r = r.intersect(Rect(0, 0, self.w, self.h))
         if not r:
             return
+        a = self.display.align
+        if a > 1:
+            # Scaled down: redraw whole blocks of the viewport scale.
+            x0 = r.x - r.x % a
+            y0 = r.y - r.y % a
+            x1 = min(self.w, (r.x + r.w + a - 1) // a * a)
+            y1 = min(self.h, (r.y + r.h + a - 1) // a * a)
+            r = Rect(x0, y0, x1 - x0, y1 - y0)
 
         # 如果已标记全屏刷新，则无需再添加
         if self._full_refresh:
@@ -292,28 +371,30 @@ class Screen:
             dirty_rects = self._merge_rects(self._dirty)
 
         draw_ctx = DrawContext(self.display)
+        timed = _TRACE and trace.on(CAT_GUI, DEBUG_DBG)
 
         for dirty_rect in dirty_rects:
-            print(f'Show dirty rect:{dirty_rect.x},{dirty_rect.y},{dirty_rect.w},{dirty_rect.h}')
             draw_ctx.set_clip(dirty_rect)
-
-            start_time = time.ticks_ms()
+            if timed:
+                t0 = time.ticks_ms()
 
             # 0. 填充背景色(不使用root的file_rect，减少一次裁剪渲染)
             buf = draw_ctx.buf
             draw_ctx.fill(self.bgcolor)
-            fill_cost = time.ticks_ms() - start_time
+            if timed:
+                t1 = time.ticks_ms()
 
-            start_time = time.ticks_ms()
             # 1. 绘制子控件
             self.root.draw(draw_ctx)
-            draw_time = time.ticks_ms() - start_time
+            if timed:
+                t2 = time.ticks_ms()
 
             # 2. 显示到屏幕(阻塞)
-            start_time = time.ticks_ms()
             self.display.blit_buffer(dirty_rect, buf)
-            blit_time = time.ticks_ms() - start_time
-            print(f'show cost,fill:{fill_cost}ms,draw:{draw_time}ms,blit:{blit_time }ms')
+            if timed:
+                trace.log(CAT_GUI, DEBUG_DBG, "show rect", dirty_rect.x, dirty_rect.y, dirty_rect.w, dirty_rect.h)
+                trace.log(CAT_GUI, DEBUG_DBG, "show cost fill/draw/blit ms", time.ticks_diff(t1, t0),
+                          time.ticks_diff(t2, t1), time.ticks_diff(time.ticks_ms(), t2))
         self._dirty.clear()
 
     def draw_background(self, draw_ctx):
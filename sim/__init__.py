@@ -0,0 +1,87 @@
+# Headless simulator for running the firmware tree on a host Python.
+#
+#     import sim
+#     sim.install()                # before importing any app/gui module
+#     import tft_config            # now backed by sim.display.SimST7789
+#
+# install() registers stand-ins for the MicroPython-only modules (machine,
+# esp32, micropython, uasyncio, neopixel, network, bluetooth, aioble, u*
+# aliases), the viper builtins (const, ptr8, ptr16, ptr32, uint), the
+# time.ticks_* extensions and gc.mem_alloc/mem_free, then swaps the ST7789
+# driver class for the framebuffer-backed one. See `python -m sim -h` for the runner.
+
+import builtins
+import gc
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_installed = False
+
+
+def _mem_alloc():
+    import tracemalloc
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0]
+    return 0
+
+
+def _mem_free():
+    return 8 * 1024 * 1024 - _mem_alloc()
+
+
+def install(sd_dir=None):
+    """Make the MicroPython tree importable on the host. Idempotent."""
+    global _installed
+    if _installed:
+        if sd_dir is not None:
+            from sim import vfs
+            vfs.register("/sd", sd_dir)
+        return
+
+    for p in (os.path.join(ROOT, "apps"), ROOT):
+        if p not in sys.path:
+            sys.path.insert(0, p)
+
+    from sim import clock
+    clock.patch_time_module()
+
+    from sim import micropython as mp
+    sys.modules["micropython"] = mp
+    builtins.micropython = mp
+    builtins.const = mp.const
+    builtins.ptr8 = mp.ptr8
+    builtins.ptr16 = mp.ptr16
+    builtins.ptr32 = mp.ptr32
+    builtins.uint = mp.uint
+
+    if not hasattr(gc, "mem_alloc"):
+        gc.mem_alloc = _mem_alloc
+        gc.mem_free = _mem_free
+
+    import binascii, collections, errno, io, json, struct, time
+    for name, mod in (("ujson", json), ("utime", time), ("uos", os), ("ustruct", struct),
+                      ("ubinascii", binascii), ("ucollections", collections),
+                      ("uerrno", errno), ("uio", io)):
+        sys.modules.setdefault(name, mod)
+
+    from sim import uasyncio, machine, neopixel, network, bluetooth, aioble, esp32
+    sys.modules["uasyncio"] = uasyncio
+    sys.modules["machine"] = machine
+    sys.modules["esp32"] = esp32
+    sys.modules["neopixel"] = neopixel
+    sys.modules["network"] = network
+    sys.modules["bluetooth"] = bluetooth
+    sys.modules["aioble"] = aioble
+
+    from sim import vfs
+    vfs.install()
+    if sd_dir is not None:
+        vfs.register("/sd", sd_dir)
+
+    from drivers.st7789 import st7789py
+    from sim.display import SimST7789
+    st7789py.ST7789 = SimST7789
+
+    _installed = True
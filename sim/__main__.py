@@ -0,0 +1,91 @@
+# Run the firmware on the host:
+#
+#     python -m sim --script demo.txt --frames /tmp/frames --duration 10
+#
+# Runs apps/main.py (or any entry script) with the simulator installed. The
+# input script drives keys, --frames dumps a PNG whenever the panel changed,
+# and --duration stops the AppManager after the given number of seconds.
+# --panel and --rotation pick another panel geometry from board_config's.
+
+import argparse
+import os
+import runpy
+import sys
+
+import sim
+
+
+def _parse_args(argv):
+    p = argparse.ArgumentParser(prog="python -m sim", description="Headless PopStation simulator")
+    p.add_argument("entry", nargs="?", default=os.path.join(sim.ROOT, "apps", "main.py"),
+                   help="script to run (default: apps/main.py)")
+    p.add_argument("--script", help="input script (see sim/inputs.py)")
+    p.add_argument("--frames", help="directory for PNG frame dumps")
+    p.add_argument("--frame-ms", type=int, default=200, help="minimum interval between frame dumps")
+    p.add_argument("--duration", type=float, help="stop after N seconds")
+    p.add_argument("--sd", help="host directory mounted as /sd")
+    p.add_argument("--panel", help="panel size WxH as st7789py lists it (240x320, 240x240, 135x240, 128x128)")
+    p.add_argument("--rotation", type=int, help="panel rotation 0-3")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    sim.install(sd_dir=args.sd)
+    os.chdir(sim.ROOT)
+
+    import uasyncio as asyncio
+    from sim.display import SimST7789
+
+    if args.panel or args.rotation is not None:
+        import board_config as hw
+        if args.panel:
+            hw.TFT_WIDTH, hw.TFT_HEIGHT = (int(v) for v in args.panel.lower().split("x"))
+        if args.rotation is not None:
+            hw.TFT_ROTATION = args.rotation
+
+    if args.script:
+        from sim.inputs import InputScript
+        script = InputScript.load(args.script)
+        asyncio.on_run(script.run)
+
+    if args.frames:
+        os.makedirs(args.frames, exist_ok=True)
+
+        async def dump_frames(main_task):
+            n = 0
+            while not main_task.done():
+                panel = SimST7789.last
+                if panel is not None and panel.dirty:
+                    panel.save(os.path.join(args.frames, "frame_{:05d}.png".format(n)))
+                    n += 1
+                await asyncio.sleep_ms(args.frame_ms)
+
+        asyncio.on_run(dump_frames)
+
+    if args.duration:
+        async def watchdog(main_task):
+            await asyncio.sleep(args.duration)
+            try:
+                from manager import stop
+                stop()
+            except ImportError:
+                pass
+            await asyncio.sleep(1)
+            main_task.cancel()
+
+        asyncio.on_run(watchdog)
+
+    try:
+        runpy.run_path(args.entry, run_name="__main__")
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+    panel = SimST7789.last
+    if panel is not None:
+        print("[sim] panel {}x{} crc={:08x} {}".format(
+            panel.width, panel.height, panel.checksum(), panel.stats()))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,236 @@
+# Host stand-in for `aioble`.
+#
+# Scanning never finds a peer unless the host code appends ScanResult objects
+# to `devices`; an empty scan simply waits out its duration like the real
+# radio, so the BLE keyboard task idles instead of spinning.
+#
+# A ScanResult whose Device has a `peer` (Peer) can be connected to: the
+# peer holds the GATT services the client discovers, notify() on one of
+# its characteristics wakes notified(), and drop() ends the link. A peer
+# that is not `advertising` is neither found by scans nor connectable.
+# tools/ble_replay.py drives the BLE keyboard through this.
+
+import asyncio
+
+
+class DeviceDisconnectedError(Exception):
+    pass
+
+
+class GattError(Exception):
+    pass
+
+
+class Device:
+    def __init__(self, addr_type=0, addr=b"\x00" * 6, peer=None):
+        self.addr_type = addr_type
+        self.addr = addr
+        self.peer = peer
+
+    async def connect(self, timeout_ms=10000):
+        peer = self.peer
+        if peer is None:
+            raise OSError("sim: no BLE peer behind {}".format(self))
+        if not peer.advertising:
+            await asyncio.sleep(min(timeout_ms, 100) / 1000)
+            raise asyncio.TimeoutError()
+        return peer._connect(self)
+
+    def __repr__(self):
+        return "Device({}, {})".format(self.addr_type, self.addr.hex())
+
+
+class ScanResult:
+    def __init__(self, name, device=None, services=()):
+        self._name = name
+        self.device = device or Device()
+        self._services = services
+
+    def name(self):
+        return self._name
+
+    def services(self):
+        return iter(self._services)
+
+
+class _Scanner:
+    def __init__(self, duration_ms):
+        self._duration_ms = duration_ms
+        self._pending = None
+
+    async def __aenter__(self):
+        self._pending = [r for r in devices if r.device.peer is None or r.device.peer.advertising]
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._pending:
+            return self._pending.pop(0)
+        if self._duration_ms:
+            await asyncio.sleep(self._duration_ms / 1000)
+            self._duration_ms = 0
+        raise StopAsyncIteration
+
+
+def scan(duration_ms, interval_us=1280000, window_us=11250, active=False):
+    return _Scanner(duration_ms)
+
+
+devices = []
+
+
+# ---------------------------
+# GATT peer
+# ---------------------------
+class Descriptor:
+    def __init__(self, uuid, value=b""):
+        self.uuid = uuid
+        self.value = bytes(value)
+
+    async def read(self, timeout_ms=1000):
+        return self.value
+
+
+class Characteristic:
+    def __init__(self, uuid, value=b"", descriptors=()):
+        self.uuid = uuid
+        self.value = bytes(value)
+        self.descriptors = list(descriptors)
+        self.subscribed = False
+        self._conn = None
+        self._queue = []
+        self._event = asyncio.Event()
+
+    async def read(self, timeout_ms=1000):
+        # One ATT read: up to MTU - 1 bytes, like the real client.
+        self._check()
+        return self.value[:self._conn.mtu - 1]
+
+    async def read_long(self, offset, timeout_ms=1000):
+        self._check()
+        return self.value
+
+    async def descriptor(self, uuid, timeout_ms=2000):
+        for d in self.descriptors:
+            if d.uuid == uuid:
+                return d
+        return None
+
+    async def subscribe(self, notify=True, indicate=False):
+        self._check()
+        self.subscribed = notify or indicate
+
+    async def notified(self, timeout_ms=None):
+        while not self._queue:
+            self._check()
+            self._event.clear()
+            await self._event.wait()
+        return self._queue.pop(0)
+
+    def notify(self, data):
+        """Peer side: send a notification if the client subscribed."""
+        if self.subscribed and self._conn is not None and self._conn.is_connected():
+            self._queue.append(bytes(data))
+            self._event.set()
+            return True
+        return False
+
+    def _check(self):
+        if self._conn is None or not self._conn.is_connected():
+            raise DeviceDisconnectedError()
+
+    def __repr__(self):
+        return "Characteristic({})".format(self.uuid)
+
+
+class Service:
+    def __init__(self, uuid, characteristics=()):
+        self.uuid = uuid
+        self._chars = list(characteristics)
+
+    async def characteristic(self, uuid, timeout_ms=2000):
+        for c in self._chars:
+            if c.uuid == uuid:
+                return c
+        return None
+
+    async def characteristics(self, uuid=None, timeout_ms=2000):
+        for c in self._chars:
+            if uuid is None or c.uuid == uuid:
+                yield c
+
+    def __repr__(self):
+        return "Service({})".format(self.uuid)
+
+
+class Peer:
+    def __init__(self, services=(), mtu=23):
+        self.services = list(services)
+        self.mtu = mtu
+        self.advertising = True
+        self.conn = None
+        self.connects = 0
+
+    def _connect(self, device):
+        self.connects += 1
+        conn = self.conn = DeviceConnection(device, self)
+        for s in self.services:
+            for c in s._chars:
+                c._conn = conn
+                c.subscribed = False
+                c._queue = []
+        return conn
+
+    def drop(self):
+        """Peer side: lose the link (out of range, powered off)."""
+        if self.conn is not None:
+            self.conn._lost()
+            self.conn = None
+
+
+class DeviceConnection:
+    def __init__(self, device, peer):
+        self.device = device
+        self._peer = peer
+        self._connected = True
+        self._event = asyncio.Event()
+        self.mtu = 23
+
+    def is_connected(self):
+        return self._connected
+
+    async def exchange_mtu(self, mtu=None, timeout_ms=1000):
+        self.mtu = self._peer.mtu
+        return self.mtu
+
+    async def pair(self, *args, **kwargs):
+        if not self._connected:
+            raise DeviceDisconnectedError()
+
+    async def service(self, uuid, timeout_ms=2000):
+        for s in self._peer.services:
+            if s.uuid == uuid:
+                return s
+        return None
+
+    async def disconnected(self, timeout_ms=None, disconnect=False):
+        if self._connected:
+            await self._event.wait()
+
+    async def disconnect(self, timeout_ms=2000):
+        self._lost()
+
+    def _lost(self):
+        if not self._connected:
+            return
+        self._connected = False
+        self._event.set()
+        for s in self._peer.services:
+            for c in s._chars:
+                if c._conn is self:
+                    c._event.set()
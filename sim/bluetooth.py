@@ -0,0 +1,39 @@
+# Host stand-in for the `bluetooth` module (only what aioble callers touch).
+
+FLAG_READ = 0x0002
+FLAG_WRITE_NO_RESPONSE = 0x0004
+FLAG_WRITE = 0x0008
+FLAG_NOTIFY = 0x0010
+FLAG_INDICATE = 0x0020
+
+
+class UUID:
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return isinstance(other, UUID) and self.value == other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __repr__(self):
+        if isinstance(self.value, int):
+            return "UUID(0x{:04x})".format(self.value)
+        return "UUID({!r})".format(self.value)
+
+
+class BLE:
+    def __init__(self):
+        self._active = False
+
+    def active(self, active=None):
+        if active is None:
+            return self._active
+        self._active = bool(active)
+
+    def config(self, *args, **kwargs):
+        return None
+
+    def irq(self, handler):
+        pass
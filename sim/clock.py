@@ -0,0 +1,103 @@
+# MicroPython-style tick counters for the host.
+#
+# Ticks start at 0 when the simulator is installed (like a fresh boot) and
+# wrap with the same period as the ESP32 port, so ticks_diff/ticks_add
+# behave identically to the device.
+
+import time
+
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+_t0_ns = time.monotonic_ns()
+_offset_us = 0
+
+# machine.lightsleep(ms) on the host: with virtual_sleep the tick counters
+# jump ahead by ms, so idle scheduling can be run faster than real time;
+# otherwise it returns at once and the event loop waits in real time.
+# Actions queued with at() (a key pressed mid-sleep) run at their tick
+# inside the sleep, which ends there if a wake source is then active.
+virtual_sleep = False
+sleeps = 0
+slept_ms = 0
+_pending = []       # [(ticks_ms, fn)], earliest first
+
+
+def _elapsed_us():
+    return (time.monotonic_ns() - _t0_ns) // 1000 + _offset_us
+
+
+def advance(ms):
+    """Move the tick counters `ms` ahead of real time."""
+    global _offset_us
+    _offset_us += int(ms * 1000)
+
+
+def at(t, fn):
+    """Run fn() when the ticks reach `t`: inside a light sleep, or by run_due()."""
+    _pending.append((t, fn))
+    _pending.sort(key=lambda p: ticks_diff(p[0], ticks_ms()))
+
+
+def run_due():
+    while _pending and ticks_diff(_pending[0][0], ticks_ms()) <= 0:
+        _pending.pop(0)[1]()
+
+
+def lightsleep(ms=None, woken=None):
+    """Light sleep; `woken()` is True while a wake source is active."""
+    global sleeps, slept_ms
+    sleeps += 1
+    if not (virtual_sleep and ms):
+        return
+    run_due()
+    end = ticks_add(ticks_ms(), ms)
+    while woken is None or not woken():
+        if not _pending or ticks_diff(_pending[0][0], end) >= 0:
+            step = ticks_diff(end, ticks_ms())
+            advance(step)
+            slept_ms += step
+            return
+        t, fn = _pending.pop(0)
+        step = max(0, ticks_diff(t, ticks_ms()))
+        advance(step)
+        slept_ms += step
+        fn()
+
+
+def ticks_us():
+    return _elapsed_us() & TICKS_MAX
+
+
+def ticks_ms():
+    return (_elapsed_us() // 1000) & TICKS_MAX
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
+
+
+def ticks_diff(end, start):
+    return ((end - start + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+def sleep_ms(ms):
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    if us > 0:
+        time.sleep(us / 1000000)
+
+
+def patch_time_module():
+    """Add the MicroPython extensions to the stdlib `time` module."""
+    for name in ("ticks_ms", "ticks_us", "ticks_cpu", "ticks_add", "ticks_diff", "sleep_ms", "sleep_us"):
+        if not hasattr(time, name):
+            setattr(time, name, globals()[name])
@@ -0,0 +1,154 @@
+# Framebuffer-backed ST7789 for the host.
+#
+# SimST7789 subclasses the real driver and taps its single SPI funnel
+# (_write), so every command and pixel the driver would send is decoded into
+# an RGB565 framebuffer and counted. Rotation tables, window offsets and the
+# byte stream are exactly the driver's; only the glass is simulated.
+
+import struct
+import zlib
+
+from drivers.st7789 import st7789py as _st7789
+
+_CASET = 0x2A
+_RASET = 0x2B
+_RAMWR = 0x2C
+
+
+class SimST7789(_st7789.ST7789):
+    last = None  # most recently created panel, for runners and tools
+
+    def __init__(self, spi, width, height, **kwargs):
+        self.fb = None
+        self.spi_bytes = 0
+        self.spi_writes = 0
+        self.pixels_written = 0
+        self.windows = 0
+        self.dirty = False
+        self._cmd = None
+        self._win = (0, 0, 0, 0)
+        self._cursor = 0
+        super().__init__(spi, width, height, **kwargs)
+        SimST7789.last = self
+
+    def rotation(self, rotation):
+        super().rotation(rotation)
+        size = self.width * self.height * 2
+        if self.fb is None or len(self.fb) != size:
+            self.fb = bytearray(size)
+
+    def reset_stats(self):
+        self.spi_bytes = 0
+        self.spi_writes = 0
+        self.pixels_written = 0
+        self.windows = 0
+
+    def stats(self):
+        return {
+            "spi_bytes": self.spi_bytes,
+            "spi_writes": self.spi_writes,
+            "pixels": self.pixels_written,
+            "windows": self.windows,
+        }
+
+    # ---------- SPI decode ----------
+    def _write(self, command=None, data=None):
+        super()._write(command, data)
+        if command is not None:
+            self.spi_bytes += len(command)
+            self.spi_writes += 1
+            self._cmd = command[0]
+            if self._cmd == _RAMWR:
+                self._cursor = 0
+                self.windows += 1
+        if data is not None:
+            self.spi_bytes += len(data)
+            self.spi_writes += 1
+            if self._cmd == _RAMWR:
+                self._ram_write(data)
+            elif self._cmd == _CASET:
+                x0, x1 = struct.unpack(">HH", data)
+                self._win = (x0 - self.xstart, self._win[1], x1 - self.xstart, self._win[3])
+            elif self._cmd == _RASET:
+                y0, y1 = struct.unpack(">HH", data)
+                self._win = (self._win[0], y0 - self.ystart, self._win[2], y1 - self.ystart)
+
+    def _ram_write(self, data):
+        x0, y0, x1, y1 = self._win
+        ww = x1 - x0 + 1
+        wh = y1 - y0 + 1
+        if ww <= 0 or wh <= 0:
+            return
+        mv = memoryview(data)
+        npx = len(mv) // 2
+        total = ww * wh
+        fb = self.fb
+        fw = self.width
+        pos = 0
+        while pos < npx and self._cursor < total:
+            row, col = divmod(self._cursor, ww)
+            take = min(ww - col, npx - pos)
+            x = x0 + col
+            y = y0 + row
+            vis = min(take, fw - x)
+            if vis > 0 and 0 <= y < self.height and x >= 0:
+                dst = (y * fw + x) * 2
+                fb[dst:dst + vis * 2] = mv[pos * 2:(pos + vis) * 2]
+            pos += take
+            self._cursor += take
+        self.pixels_written += pos
+        self.dirty = True
+
+    # ---------- frame access ----------
+    def pixel_at(self, x, y):
+        i = (y * self.width + x) * 2
+        return (self.fb[i] << 8) | self.fb[i + 1]
+
+    def checksum(self):
+        return zlib.crc32(self.fb) & 0xFFFFFFFF
+
+    def rgb888(self):
+        fb = self.fb
+        out = bytearray(len(fb) // 2 * 3)
+        j = 0
+        for i in range(0, len(fb), 2):
+            c = (fb[i] << 8) | fb[i + 1]
+            r = (c >> 11) & 0x1F
+            g = (c >> 5) & 0x3F
+            b = c & 0x1F
+            out[j] = (r << 3) | (r >> 2)
+            out[j + 1] = (g << 2) | (g >> 4)
+            out[j + 2] = (b << 3) | (b >> 2)
+            j += 3
+        return out
+
+    def save_ppm(self, path):
+        with open(path, "wb") as f:
+            f.write(b"P6\n%d %d\n255\n" % (self.width, self.height))
+            f.write(self.rgb888())
+
+    def save_png(self, path):
+        w, h = self.width, self.height
+        rgb = self.rgb888()
+        stride = w * 3
+        raw = bytearray()
+        for y in range(h):
+            raw.append(0)
+            raw += rgb[y * stride:(y + 1) * stride]
+
+        def chunk(tag, body):
+            c = struct.pack(">I", len(body)) + tag + body
+            return c + struct.pack(">I", zlib.crc32(tag + body) & 0xFFFFFFFF)
+
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n")
+            f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)))
+            f.write(chunk(b"IDAT", zlib.compress(bytes(raw), 6)))
+            f.write(chunk(b"IEND", b""))
+
+    def save(self, path):
+        if path.endswith(".ppm"):
+            self.save_ppm(path)
+        else:
+            self.save_png(path)
+        self.dirty = False
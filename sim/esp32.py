@@ -0,0 +1,24 @@
+# Host stand-in for the `esp32` module: the ext1 light/deep sleep wake-up.
+#
+# The simulated board is an ESP32-S3, where ext1 with level 0 wakes when
+# any of its pins is low (ESP_EXT1_WAKEUP_ANY_LOW; the original ESP32 has
+# only all-low) and with level 1 when any is high.
+
+WAKEUP_ALL_LOW = False
+WAKEUP_ANY_HIGH = True
+
+# (GPIO numbers, level) while armed, for sim.machine.lightsleep.
+ext1 = None
+
+
+def wake_on_ext1(pins, level=WAKEUP_ALL_LOW):
+    global ext1
+    if not pins:
+        ext1 = None
+        return
+    ext1 = (tuple(p.id if hasattr(p, "id") else p for p in pins), bool(level))
+
+
+def wake_on_ext0(pin, level=WAKEUP_ALL_LOW):
+    from sim.machine import Pin
+    Pin._ext0 = None if pin is None else (pin.id if hasattr(pin, "id") else pin, bool(level))
@@ -0,0 +1,101 @@
+# Scripted input injection.
+#
+# A script is a list of timed steps, one per line in text form:
+#
+#     # at_ms  action   args
+#     500      tap      NEXT
+#     900      press    MENU
+#     2500     release  MENU
+#     3000     key      BLE_KEY_UP pressed
+#     3200     snap     frames/menu.png
+#     4000     quit
+#
+# press/release/tap drive the GPIO pin level (so ButtonManager debouncing is
+# exercised); `key` posts a logical event straight to the AppManager using a
+# name from input_keys. Times are absolute from the start of the run.
+
+import uasyncio as asyncio
+
+from sim.machine import Pin
+
+TAP_HOLD_MS = 120
+
+
+def _key_pins():
+    import board_config as hw
+    # Same wiring as input_manager.btn_key_to_event.
+    return {
+        "NEXT": hw.GPIO_KEY_0,
+        "ENTER": hw.GPIO_KEY_1,
+        "PREV": hw.GPIO_KEY_2,
+        "MENU": hw.GPIO_KEY_3,
+    }
+
+
+def _pin_for(name):
+    pins = _key_pins()
+    if name in pins:
+        return pins[name]
+    return int(name)
+
+
+def press(name):
+    Pin.drive(_pin_for(name), 0)
+
+
+def release(name):
+    Pin.drive(_pin_for(name), 1)
+
+
+class InputScript:
+    def __init__(self, steps=None):
+        self.steps = sorted(steps or [], key=lambda s: s[0])
+
+    @classmethod
+    def parse(cls, text):
+        steps = []
+        for raw in text.splitlines():
+            line = raw.split("#", 1)[0].strip()
+            if not line:
+                continue
+            parts = line.split()
+            steps.append((int(parts[0]), parts[1], parts[2:]))
+        return cls(steps)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.parse(f.read())
+
+    async def run(self, main_task=None):
+        loop_t0 = asyncio.get_running_loop().time()
+        for at_ms, action, args in self.steps:
+            delay = at_ms / 1000 - (asyncio.get_running_loop().time() - loop_t0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._do(action, args)
+
+    async def _do(self, action, args):
+        if action == "press":
+            press(args[0])
+        elif action == "release":
+            release(args[0])
+        elif action == "tap":
+            hold = int(args[1]) if len(args) > 1 else TAP_HOLD_MS
+            press(args[0])
+            await asyncio.sleep_ms(hold)
+            release(args[0])
+        elif action == "key":
+            import input_keys
+            from manager import send_input_event
+            status = input_keys.KEY_S_PRESSED if args[1] == "pressed" else input_keys.KEY_S_RELEASED
+            send_input_event(getattr(input_keys, args[0]), status)
+        elif action == "snap":
+            from sim.display import SimST7789
+            if SimST7789.last is not None:
+                SimST7789.last.save(args[0])
+        elif action == "quit":
+            from manager import stop
+            stop()
+        else:
+            raise ValueError("unknown input action: {}".format(action))
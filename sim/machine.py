@@ -0,0 +1,283 @@
+# Host stand-in for the `machine` module (ESP32 port subset used by the apps).
+
+import time
+
+from sim import clock
+
+
+def freq(hz=None):
+    return 240_000_000
+
+
+def reset():
+    raise SystemExit("machine.reset()")
+
+
+def idle():
+    time.sleep(0)
+
+
+SLEEP = 2
+DEEPSLEEP = 4
+
+
+def lightsleep(time_ms=None):
+    clock.lightsleep(time_ms, _woken)
+
+
+def _woken():
+    # ext0 (Pin.irq with wake=) or ext1 (esp32.wake_on_ext1) level reached.
+    from sim import esp32
+    if Pin._ext0 is not None:
+        pin, level = Pin._ext0
+        if Pin._levels.get(pin, 0) == level:
+            return True
+    if esp32.ext1 is not None:
+        pins, level = esp32.ext1
+        for pin in pins:
+            if Pin._levels.get(pin, 0) == level:
+                return True
+    return False
+
+
+def deepsleep(time_ms=None):
+    raise SystemExit("machine.deepsleep()")
+
+
+# ---------------------------
+# GPIO
+# ---------------------------
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+    WAKE_LOW = 4
+    WAKE_HIGH = 5
+
+    # Pin level and IRQ state is per GPIO number, shared by every Pin object
+    # created for that GPIO. The input injector drives levels through drive().
+    _levels = {}
+    _irqs = {}
+    _ext0 = None        # (GPIO, level) set by irq(wake=...): one pin per board, as on the ESP32
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self.mode = mode
+        if value is not None:
+            Pin._levels[self.id] = 1 if value else 0
+        elif self.id not in Pin._levels:
+            Pin._levels[self.id] = 0 if pull == Pin.PULL_DOWN else 1
+
+    def value(self, v=None):
+        if v is None:
+            return Pin._levels.get(self.id, 0)
+        Pin.drive(self.id, v)
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, wake=None, hard=False):
+        if wake is not None:
+            # The port keeps the ext0 pin once set and has no second one.
+            if Pin._ext0 is not None and Pin._ext0[0] != self.id:
+                raise ValueError("no resources")
+            Pin._ext0 = (self.id, 1 if trigger == Pin.WAKE_HIGH else 0)
+            return
+        if handler is None:
+            Pin._irqs.pop(self.id, None)
+        else:
+            Pin._irqs[self.id] = (handler, trigger, self)
+
+    @classmethod
+    def drive(cls, id, level):
+        level = 1 if level else 0
+        old = cls._levels.get(id, 0)
+        cls._levels[id] = level
+        if old == level:
+            return
+        irq = cls._irqs.get(id)
+        if irq is None:
+            return
+        handler, trigger, pin = irq
+        edge = cls.IRQ_RISING if level else cls.IRQ_FALLING
+        if trigger & edge:
+            handler(pin)
+
+
+class PWM:
+    # Duty per GPIO of the PWMs currently running, for checks.
+    active = {}
+
+    def __init__(self, pin, freq=1000, duty_u16=0):
+        self.pin = pin
+        self._freq = freq
+        self.duty_u16(duty_u16)
+
+    def freq(self, hz=None):
+        if hz is None:
+            return self._freq
+        self._freq = hz
+
+    def duty_u16(self, duty=None):
+        if duty is None:
+            return PWM.active.get(self.pin.id, 0)
+        PWM.active[self.pin.id] = duty
+
+    def deinit(self):
+        PWM.active.pop(self.pin.id, None)
+
+
+# ---------------------------
+# SPI
+# ---------------------------
+class SPI:
+    MSB = 0
+    LSB = 1
+
+    def __init__(self, id, baudrate=1_000_000, polarity=0, phase=0, bits=8, firstbit=MSB,
+                 sck=None, mosi=None, miso=None):
+        self.id = id
+        self.baudrate = baudrate
+        self.bytes_written = 0
+        self.writes = 0
+
+    def init(self, baudrate=None, **kwargs):
+        if baudrate is not None:
+            self.baudrate = baudrate
+
+    def deinit(self):
+        pass
+
+    def write(self, buf):
+        self.bytes_written += len(buf)
+        self.writes += 1
+
+    def read(self, nbytes, write=0x00):
+        return bytes([write]) * nbytes
+
+    def readinto(self, buf, write=0x00):
+        for i in range(len(buf)):
+            buf[i] = write
+
+    def write_readinto(self, write_buf, read_buf):
+        self.write(write_buf)
+        self.readinto(read_buf)
+
+    def reset_stats(self):
+        self.bytes_written = 0
+        self.writes = 0
+
+
+class SoftSPI(SPI):
+    pass
+
+
+# ---------------------------
+# I2S (TX only)
+# ---------------------------
+class I2S:
+    """
+    Transmit-only I2S with a modelled DMA ring.
+
+    The ring (`ibuf` bytes) drains at the configured sample rate against the
+    host clock. write() accepts only what fits, like the non-blocking device
+    stream, so asyncio.StreamWriter.drain() paces the producer at real time.
+    Every time the ring runs dry after data was flowing `underruns` is bumped
+    (this includes the natural end of a stream). The consumed PCM can be
+    captured by setting `capture` to a bytearray. `SPEED` scales the drain
+    rate so long playbacks can be simulated faster than real time.
+    """
+    SPEED = 1
+    TX = 5
+    RX = 4
+    MONO = 0
+    STEREO = 1
+
+    def __init__(self, id, sck=None, ws=None, sd=None, mck=None, mode=TX, bits=16,
+                 format=STEREO, rate=16000, ibuf=20000):
+        self.id = id
+        self.capture = None
+        self.bytes_written = 0
+        self.underruns = 0
+        self.init(mode=mode, bits=bits, format=format, rate=rate, ibuf=ibuf)
+
+    def init(self, sck=None, ws=None, sd=None, mck=None, mode=TX, bits=16, format=STEREO,
+             rate=16000, ibuf=20000):
+        self.mode = mode
+        self.bits = bits
+        self.format = format
+        self.rate = rate
+        self.ibuf = ibuf
+        self.inits = getattr(self, "inits", 0) + 1
+        self._level = 0.0
+        self._last_us = clock.ticks_us()
+        self._flowing = False
+
+    def deinit(self):
+        self._level = 0.0
+        self._flowing = False
+
+    def bytes_per_sec(self):
+        ch = 2 if self.format == I2S.STEREO else 1
+        return self.rate * ch * (self.bits // 8)
+
+    def _drain(self):
+        now = clock.ticks_us()
+        elapsed = clock.ticks_diff(now, self._last_us)
+        self._last_us = now
+        if elapsed <= 0:
+            return
+        self._level -= elapsed * self.bytes_per_sec() * self.SPEED / 1000000
+        if self._level <= 0:
+            if self._flowing:
+                self.underruns += 1
+                self._flowing = False
+            self._level = 0.0
+
+    def level(self):
+        """Bytes still queued in the DMA ring."""
+        self._drain()
+        return int(self._level)
+
+    def write(self, buf):
+        self._drain()
+        n = min(len(buf), self.ibuf - int(self._level))
+        if n <= 0:
+            return 0
+        if self.capture is not None:
+            self.capture.extend(buf[:n])
+        self._level += n
+        self._flowing = True
+        self.bytes_written += n
+        return n
+
+    def irq(self, handler):
+        pass
+
+    @staticmethod
+    def shift(buf, bits, shift):
+        pass
+
+
+# ---------------------------
+# SD card (mounted through sim.vfs)
+# ---------------------------
+class SDCard:
+    def __init__(self, slot=1, width=1, cd=None, wp=None, sck=None, miso=None, mosi=None,
+                 cs=None, freq=20000000):
+        self.slot = slot
+
@@ -0,0 +1,106 @@
+# Host stand-in for the `micropython` module.
+#
+# Code emitters (viper/native) are compile-time directives on the device; on
+# the host they become plain Python functions. The pointer casts used inside
+# viper bodies (ptr8/ptr16/ptr32) are installed as builtins by sim.install()
+# and map onto memoryviews of the same buffer, so stores land in the caller's
+# bytearray just like on the device. Arguments annotated with a pointer type
+# are cast the same way on entry.
+
+import sys
+
+
+def viper(func):
+    if isinstance(func, staticmethod):
+        return staticmethod(viper(func.__func__))
+    ann = getattr(func, "__annotations__", None)
+    if not ann:
+        return func
+    names = func.__code__.co_varnames[:func.__code__.co_argcount]
+    casts = [(i, ann[name]) for i, name in enumerate(names)
+             if ann.get(name) in (ptr8, ptr16, ptr32)]
+    if not casts:
+        return func
+
+    def call(*args):
+        args = list(args)
+        for i, cast in casts:
+            if i < len(args):
+                args[i] = cast(args[i])
+        return func(*args)
+
+    call.__name__ = func.__name__
+    call.__wrapped__ = func
+    return call
+
+
+def native(func):
+    return func
+
+
+def const(x):
+    return x
+
+
+def opt_level(level=None):
+    return 0
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def heap_lock():
+    return 0
+
+
+def heap_unlock():
+    return 0
+
+
+def mem_info(verbose=False):
+    import gc
+    print("mem: alloc={} free={}".format(gc.mem_alloc(), gc.mem_free()))
+
+
+def schedule(func, arg):
+    """Run `func(arg)` on the event loop, like a soft IRQ callback."""
+    try:
+        import asyncio
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        func(arg)
+        return
+    loop.call_soon(func, arg)
+
+
+# ---------------------------
+# viper pointer casts
+# ---------------------------
+def _byte_view(buf):
+    mv = buf if isinstance(buf, memoryview) else memoryview(buf)
+    if mv.format != "B" or mv.itemsize != 1:
+        mv = mv.cast("B")
+    return mv
+
+
+def ptr8(buf):
+    return _byte_view(buf)
+
+
+def ptr16(buf):
+    mv = _byte_view(buf)
+    return mv[: len(mv) & ~1].cast("H")
+
+
+def ptr32(buf):
+    mv = _byte_view(buf)
+    return mv[: len(mv) & ~3].cast("I")
+
+
+def uint(x):
+    return int(x) & 0xFFFFFFFF
+
+
+if sys.byteorder != "little":
+    raise ImportError("sim: viper pointer casts assume a little-endian host")
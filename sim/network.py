@@ -0,0 +1,56 @@
+# Host stand-in for the `network` module. The host already has connectivity,
+# so a station interface "connects" as soon as connect() is called.
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_GOT_IP = 1010
+
+
+class WLAN:
+    _ifaces = {}
+
+    def __new__(cls, interface_id=STA_IF):
+        # One shared object per interface, like the firmware.
+        iface = cls._ifaces.get(interface_id)
+        if iface is None:
+            iface = super().__new__(cls)
+            iface._active = False
+            iface._connected = False
+            iface._ssid = None
+            cls._ifaces[interface_id] = iface
+        return iface
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+        if not self._active:
+            self._connected = False
+
+    def connect(self, ssid=None, key=None, **kwargs):
+        if not self._active:
+            raise OSError("WiFi Not Started")
+        self._ssid = ssid
+        self._connected = True
+
+    def disconnect(self):
+        self._connected = False
+
+    def isconnected(self):
+        return self._connected
+
+    def status(self, param=None):
+        if param == "rssi":
+            return -50
+        return STAT_GOT_IP if self._connected else STAT_IDLE
+
+    def ifconfig(self, config=None):
+        return ("127.0.0.1", "255.0.0.0", "127.0.0.1", "127.0.0.1")
+
+    def config(self, *args, **kwargs):
+        if args and args[0] == "essid":
+            return self._ssid or ""
+        return None
@@ -0,0 +1,172 @@
+# Host stand-in for `uasyncio`: CPython asyncio plus the MicroPython
+# extensions the apps use (sleep_ms, wait_for_ms, stream objects with
+# readinto, StreamWriter over a raw device such as I2S).
+
+import asyncio as _asyncio
+from asyncio import *  # noqa: F401,F403
+
+_run_hooks = []
+
+
+async def sleep_ms(ms):
+    from sim import clock
+    if not clock.virtual_sleep or ms <= 0:
+        await _asyncio.sleep(ms / 1000)
+        return
+    # uasyncio sleeps by the tick counter: a light sleep that jumps the
+    # ticks ahead ends sleeps that fall inside it.
+    end = clock.ticks_add(clock.ticks_ms(), ms)
+    while True:
+        left = clock.ticks_diff(end, clock.ticks_ms())
+        if left <= 0:
+            return
+        await _asyncio.sleep(min(left, 20) / 1000)
+
+
+async def wait_for_ms(aw, timeout):
+    return await _asyncio.wait_for(aw, None if timeout is None else timeout / 1000)
+
+
+class ThreadSafeFlag:
+    """
+    uasyncio.ThreadSafeFlag: set() may be called from an IRQ handler; wait()
+    returns once it was set and clears it. Sim IRQs run on the loop thread.
+    """
+
+    def __init__(self):
+        self._flag = False
+        self._event = None
+
+    def set(self):
+        self._flag = True
+        if self._event is not None:
+            self._event.set()
+
+    def clear(self):
+        self._flag = False
+
+    async def wait(self):
+        if not self._flag:
+            if self._event is None:
+                self._event = _asyncio.Event()
+            self._event.clear()
+            await self._event.wait()
+        self._flag = False
+
+
+def on_run(hook):
+    """
+    Register `hook(main_task)` to be started as a task next to the main
+    coroutine of every run(). The simulator uses this for the input
+    injector, frame dumps and the run-duration watchdog.
+    """
+    _run_hooks.append(hook)
+
+
+def run(main):
+    async def _wrap():
+        task = _asyncio.create_task(main)
+        for hook in _run_hooks:
+            _asyncio.create_task(hook(task))
+        return await task
+
+    return _asyncio.run(_wrap())
+
+
+# ---------------------------
+# Streams
+# ---------------------------
+class Stream:
+    """MicroPython-style duplex stream over a CPython reader/writer pair."""
+
+    def __init__(self, reader, writer):
+        self._r = reader
+        self._w = writer
+
+    def get_extra_info(self, name):
+        return self._w.get_extra_info(name)
+
+    async def read(self, n=-1):
+        return await self._r.read(n)
+
+    async def readinto(self, buf):
+        data = await self._r.read(len(buf))
+        n = len(data)
+        buf[:n] = data
+        return n
+
+    async def readexactly(self, n):
+        return await self._r.readexactly(n)
+
+    async def readline(self):
+        return await self._r.readline()
+
+    def write(self, buf):
+        self._w.write(bytes(buf))
+
+    async def drain(self):
+        await self._w.drain()
+
+    async def awrite(self, buf, off=0, sz=-1):
+        if off or sz != -1:
+            buf = memoryview(buf)[off:] if sz == -1 else memoryview(buf)[off:off + sz]
+        self.write(buf)
+        await self.drain()
+
+    def close(self):
+        self._w.close()
+
+    async def wait_closed(self):
+        try:
+            await self._w.wait_closed()
+        except Exception:
+            pass
+
+
+async def open_connection(host, port):
+    r, w = await _asyncio.open_connection(host, port)
+    s = Stream(r, w)
+    return s, s
+
+
+class StreamWriter:
+    """
+    Writer over a raw non-blocking device object (machine.I2S). The device's
+    write() returns how many bytes it accepted; drain() yields to the loop
+    until everything in out_buf has been taken.
+    """
+    POLL_MS = 2
+
+    def __init__(self, s, extra=None):
+        self.s = s
+        self.e = extra
+        self.out_buf = b""
+
+    def write(self, buf):
+        if self.out_buf:
+            self.out_buf = bytes(self.out_buf) + bytes(buf)
+        else:
+            self.out_buf = buf
+
+    async def drain(self):
+        mv = memoryview(self.out_buf)
+        off = 0
+        while off < len(mv):
+            n = self.s.write(mv[off:])
+            if n:
+                off += n
+            else:
+                await _asyncio.sleep(self.POLL_MS / 1000)
+        self.out_buf = b""
+
+    async def awrite(self, buf, off=0, sz=-1):
+        if off or sz != -1:
+            buf = memoryview(buf)[off:] if sz == -1 else memoryview(buf)[off:off + sz]
+        self.write(buf)
+        await self.drain()
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
@@ -0,0 +1,84 @@
+# Device filesystem mounts for the host.
+#
+# The firmware sees the app tree at "/" (the host cwd) and the SD card at
+# "/sd". register() binds a device mount point to a host directory; the
+# mapping becomes active when the app calls os.mount() with that mount point,
+# exactly like the SD card on the board. Paths outside active mounts are
+# passed through untouched.
+
+import builtins
+import os
+
+_pending = {}   # device mount point -> host dir (waiting for os.mount)
+_active = {}    # device mount point -> host dir
+
+_open = builtins.open
+_os_funcs = {}
+
+
+def register(mount_point, host_dir, mounted=False):
+    _pending[mount_point] = os.path.abspath(host_dir)
+    if mounted:
+        _active[mount_point] = _pending[mount_point]
+
+
+def map_path(path):
+    if not isinstance(path, str) or not path.startswith("/"):
+        return path
+    for mp, host in _active.items():
+        if path == mp:
+            return host
+        if path.startswith(mp + "/"):
+            return host + path[len(mp):]
+    return path
+
+
+def mount(fsobj, mount_point, readonly=False):
+    host = _pending.get(mount_point)
+    if host is None or not os.path.isdir(host):
+        raise OSError(19, "ENODEV")
+    _active[mount_point] = host
+
+
+def umount(mount_point):
+    _active.pop(mount_point, None)
+
+
+def _wrap(name):
+    orig = _os_funcs[name]
+
+    def f(path=".", *args, **kwargs):
+        return orig(map_path(path), *args, **kwargs)
+
+    return f
+
+
+def _open_mapped(file, *args, **kwargs):
+    return _open(map_path(file), *args, **kwargs)
+
+
+def _ilistdir(path="."):
+    # MicroPython's (name, type, inode, size); 0x4000 is a directory.
+    with os.scandir(map_path(path)) as it:
+        for e in it:
+            if e.is_dir():
+                yield (e.name, 0x4000, 0, 0)
+            else:
+                yield (e.name, 0x8000, 0, e.stat().st_size)
+
+
+def _rename(src, dst):
+    return _os_funcs["rename"](map_path(src), map_path(dst))
+
+
+def install():
+    for name in ("listdir", "stat", "remove", "mkdir", "rmdir", "statvfs", "rename"):
+        if name not in _os_funcs:
+            _os_funcs[name] = getattr(os, name)
+    for name in ("listdir", "stat", "remove", "mkdir", "rmdir", "statvfs"):
+        setattr(os, name, _wrap(name))
+    os.rename = _rename
+    os.ilistdir = _ilistdir
+    os.mount = mount
+    os.umount = umount
+    builtins.open = _open_mapped
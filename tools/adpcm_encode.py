@@ -0,0 +1,207 @@
+"""
+Convert PCM WAV files to IMA ADPCM (WAV format 0x11).
+
+    python tools/adpcm_encode.py in.wav out.wav
+    python tools/adpcm_encode.py --block 512 res/wav/*.wav --out-dir build/wav
+    python tools/adpcm_encode.py --check res/wav/*.wav
+
+Input is 8- or 16-bit PCM, mono or stereo, at any rate the device plays.
+The output is 4 bits per sample plus a 4-byte header per channel and block,
+so about a quarter of the 16-bit size. `--block` is the block size per
+channel in bytes (default 512, i.e. 1017 frames per block); keep a decoded
+block under the 8 KB pipeline buffer. The last block is padded with
+silence and a fact chunk records the real frame count.
+
+--check encodes each file and prints the SNR of the decoded result against
+the input instead of writing anything.
+"""
+
+import math
+import os
+import struct
+import sys
+import wave
+from array import array
+
+STEPS = (
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41,
+    45, 50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190,
+    209, 230, 253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724,
+    796, 876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272,
+    2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132,
+    7845, 8630, 9493, 10442, 11487, 12635, 13899, 15289, 16818, 18500,
+    20350, 22385, 24623, 27086, 29794, 32767,
+)
+INDEX_ADJ = (-1, -1, -1, -1, 2, 4, 6, 8)
+
+BLOCK_PER_CHANNEL = 512
+
+
+def _step(pred, idx, nib):
+    """Decoder update, shared by the encoder so both stay in sync."""
+    step = STEPS[idx]
+    diff = step >> 3
+    if nib & 1:
+        diff += step >> 2
+    if nib & 2:
+        diff += step >> 1
+    if nib & 4:
+        diff += step
+    pred = pred - diff if nib & 8 else pred + diff
+    pred = max(-32768, min(32767, pred))
+    idx = max(0, min(88, idx + INDEX_ADJ[nib & 7]))
+    return pred, idx
+
+
+def _encode_sample(s, pred, idx):
+    diff = s - pred
+    nib = 0
+    if diff < 0:
+        nib = 8
+        diff = -diff
+    step = STEPS[idx]
+    for bit in (4, 2, 1):
+        if diff >= step:
+            nib |= bit
+            diff -= step
+        step >>= 1
+    pred, idx = _step(pred, idx, nib)
+    return nib, pred, idx
+
+
+def samples_per_block(block_align, channels):
+    return (block_align // channels - 4) * 2 + 1
+
+
+def encode(samples, channels, block_align):
+    """Interleaved int16 samples to ADPCM blocks; returns (bytes, frames)."""
+    spb = samples_per_block(block_align, channels)
+    frames = len(samples) // channels
+    out = bytearray()
+    idx = [0] * channels
+    for start in range(0, frames, spb):
+        chunk = [[0] * spb for _ in range(channels)]
+        for f in range(min(spb, frames - start)):
+            for c in range(channels):
+                chunk[c][f] = samples[(start + f) * channels + c]
+        codes = []
+        for c in range(channels):
+            pred = chunk[c][0]
+            out += struct.pack("<hBB", pred, idx[c], 0)
+            nibs = []
+            for s in chunk[c][1:]:
+                nib, pred, idx[c] = _encode_sample(s, pred, idx[c])
+                nibs.append(nib)
+            codes.append(nibs)
+        # 4-byte groups (8 nibbles) per channel, channels interleaved.
+        for g in range(0, spb - 1, 8):
+            for c in range(channels):
+                n = codes[c][g:g + 8]
+                for k in range(0, 8, 2):
+                    out.append(n[k] | (n[k + 1] << 4))
+    return bytes(out), frames
+
+
+def decode(data, channels, block_align):
+    """Reference decoder; returns interleaved int16 samples."""
+    spb = samples_per_block(block_align, channels)
+    groups = (spb - 1) // 8
+    out = array("h")
+    for base in range(0, len(data) - block_align + 1, block_align):
+        block = [[0] * spb for _ in range(channels)]
+        for c in range(channels):
+            pred, idx, _ = struct.unpack_from("<hBB", data, base + c * 4)
+            idx = min(idx, 88)
+            block[c][0] = pred
+            f = 1
+            for g in range(groups):
+                p = base + channels * 4 + (g * channels + c) * 4
+                for k in range(8):
+                    nib = (data[p + (k >> 1)] >> ((k & 1) * 4)) & 0xF
+                    pred, idx = _step(pred, idx, nib)
+                    block[c][f] = pred
+                    f += 1
+        for f in range(spb):
+            for c in range(channels):
+                out.append(block[c][f])
+    return out
+
+
+def read_pcm(path):
+    with wave.open(path, "rb") as w:
+        ch, width, rate = w.getnchannels(), w.getsampwidth(), w.getframerate()
+        raw = w.readframes(w.getnframes())
+    if width == 1:
+        samples = array("h", ((b - 128) << 8 for b in raw))
+    elif width == 2:
+        samples = array("h")
+        samples.frombytes(raw)
+        if sys.byteorder != "little":
+            samples.byteswap()
+    else:
+        raise ValueError("{}: only 8/16-bit PCM input".format(path))
+    return samples, ch, rate
+
+
+def wav_bytes(data, frames, channels, rate, block_align):
+    spb = samples_per_block(block_align, channels)
+    byte_rate = rate * block_align // spb
+    fmt = struct.pack("<HHIIHHHH", 0x11, channels, rate, byte_rate, block_align, 4, 2, spb)
+    body = (b"WAVE"
+            + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+            + b"fact" + struct.pack("<II", 4, frames)
+            + b"data" + struct.pack("<I", len(data)) + data)
+    if len(data) & 1:
+        body += b"\x00"
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def snr_db(ref, got):
+    n = min(len(ref), len(got))
+    sig = sum(float(v) * v for v in ref[:n])
+    err = sum(float(ref[i] - got[i]) ** 2 for i in range(n))
+    if err == 0:
+        return float("inf")
+    return 10 * math.log10(max(sig, 1.0) / err)
+
+
+def convert(src, dst, block_per_channel=BLOCK_PER_CHANNEL, check=False):
+    samples, ch, rate = read_pcm(src)
+    block_align = block_per_channel * ch
+    data, frames = encode(samples, ch, block_align)
+    in_size = os.path.getsize(src)
+    if check:
+        snr = snr_db(samples, decode(data, ch, block_align))
+        print("{}: {}Hz {}ch {} frames, {} -> {} B, SNR {:.1f} dB".format(
+            src, rate, ch, frames, in_size, len(data) + 60, snr))
+        return
+    out = wav_bytes(data, frames, ch, rate, block_align)
+    with open(dst, "wb") as f:
+        f.write(out)
+    print("{} -> {}: {} -> {} B".format(src, dst, in_size, len(out)))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("inputs", nargs="+", help="input WAV(s); with one input and no --out-dir the last argument is the output")
+    p.add_argument("--out-dir", help="write <out-dir>/<name>.wav for every input")
+    p.add_argument("--block", type=int, default=BLOCK_PER_CHANNEL,
+                   help="block size per channel in bytes (multiple of 4)")
+    p.add_argument("--check", action="store_true", help="report SNR only, write nothing")
+    a = p.parse_args()
+    if a.block % 4 or a.block <= 4:
+        p.error("--block must be a multiple of 4 above 4")
+
+    if a.check:
+        jobs = [(src, None) for src in a.inputs]
+    elif a.out_dir:
+        os.makedirs(a.out_dir, exist_ok=True)
+        jobs = [(src, os.path.join(a.out_dir, os.path.basename(src))) for src in a.inputs]
+    elif len(a.inputs) == 2:
+        jobs = [(a.inputs[0], a.inputs[1])]
+    else:
+        p.error("give in.wav out.wav, or --out-dir")
+    for src, dst in jobs:
+        convert(src, dst, a.block, a.check)
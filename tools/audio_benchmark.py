@@ -0,0 +1,263 @@
+"""
+Audio pipeline benchmark and underrun check.
+
+Streams a synthetic WAV through AudioService on the host, with the simulated
+I2S (sim.machine.I2S) consuming at the real sample rate:
+
+    python tools/audio_benchmark.py
+    python tools/audio_benchmark.py --seconds 5 --out audio.json
+    python tools/audio_benchmark.py --depth 1 2 3
+    python tools/audio_benchmark.py --alloc-check 60
+
+Sources are stand-ins for the real ones: an SD FileWavSource with per-read
+latency and an HttpWavSource fed by a paced byte stream (steady, and with
+Wi-Fi style stalls); the "+jb" cases read it through AudioService's network
+jitter buffer. For each case it prints AudioService.stats() (the AudioMonitor
+estimate) next to the ring-dry events the simulated I2S saw.
+--depth runs every case once per read-ahead pipeline depth.
+
+--alloc-check plays N seconds from a plain FileWavSource (at I2S.SPEED x
+real time) and samples gc.mem_alloc() after every chunk; the heap must stay
+flat. On the host gc.mem_alloc() is tracemalloc's live size, so this catches
+growth and retention only. The gross per-chunk figure is measured on the
+device, where the same check runs with gc.disable().
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+import gc
+import json
+import math
+import random
+import struct
+import tempfile
+import tracemalloc
+from array import array
+
+import uasyncio as asyncio
+from audio_sources.file_wav_source import FileWavSource
+from audio_sources.http_wav_source import HttpWavSource
+
+
+def make_wav(seconds, rate=16000, channels=2, freq=440):
+    frames = int(seconds * rate)
+    pcm = bytearray(frames * channels * 2)
+    step = 2 * math.pi * freq / rate
+    for i in range(frames):
+        v = int(12000 * math.sin(i * step))
+        for c in range(channels):
+            struct.pack_into("<h", pcm, (i * channels + c) * 2, v)
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + len(pcm), b"WAVE", b"fmt ", 16, 1, channels, rate,
+        rate * channels * 2, channels * 2, 16, b"data", len(pcm),
+    )
+    return header + pcm
+
+
+# ---------------------------
+# source stand-ins
+# ---------------------------
+class SdStandIn(FileWavSource):
+    """FileWavSource with SD card access latency added to every read."""
+
+    def __init__(self, filepath, read_ms=3):
+        super().__init__(filepath)
+        self.read_ms = read_ms
+
+    async def readinto(self, mv):
+        await asyncio.sleep_ms(self.read_ms)
+        return self.f.readinto(mv)
+
+
+class HttpStandIn(HttpWavSource):
+    """HttpWavSource whose socket is a paced in-memory byte stream."""
+    MSS = 1460
+
+    def __init__(self, data, kbytes_per_sec=200, stall_chance=0.0, stall_ms=0, seed=1, jitter=None):
+        super().__init__("http://standin/", jitter=jitter)
+        self.data = data
+        self.bytes_per_sec = kbytes_per_sec * 1024
+        self.stall_chance = stall_chance
+        self.stall_ms = stall_ms
+        self.seed = seed
+        self._at = 0
+
+    async def _request(self, start):
+        # Honours ranges like a server answering 206.
+        self._at = min(start, len(self.data))
+        self._rng = random.Random(self.seed)
+        return self._at
+
+    async def _recv(self, mv):
+        n = min(len(mv), self.MSS, len(self.data) - self._at)
+        if n <= 0:
+            return 0
+        delay = n / self.bytes_per_sec
+        if self.stall_chance and self._rng.random() < self.stall_chance:
+            delay += self.stall_ms / 1000
+        await asyncio.sleep(delay)
+        mv[:n] = self.data[self._at:self._at + n]
+        self._at += n
+        return n
+
+
+# ---------------------------
+# runner
+# ---------------------------
+def bench_case(name, make_source, depth=None):
+    from audio_service import AudioService, PlaybackHandle
+
+    async def run():
+        service = AudioService() if depth is None else AudioService(depth)
+        service.start()
+        handle = PlaybackHandle(service, [make_source(service)])
+        t0 = asyncio.get_running_loop().time()
+        service.queue.put(("PLAY", handle))
+        while handle.state != PlaybackHandle.STOPPED:
+            await asyncio.sleep_ms(20)
+        elapsed = asyncio.get_running_loop().time() - t0
+        # Read before touching the ring again: the final drain after the last
+        # write is not a dropout.
+        dry = service.i2s.underruns
+        return service, elapsed, dry
+
+    service, elapsed, dry = asyncio.run(run())
+    result = {"name": name, "wall_s": round(elapsed, 3), "i2s_dry_events": dry}
+    result.update(service.stats())
+    return result
+
+
+def alloc_check(seconds=60.0, volume=7, speed=20, tolerance=1024):
+    """Play `seconds` of audio and check gc.mem_alloc() stays flat per chunk."""
+    from machine import I2S
+    from config import config
+    from audio_service import AudioService, PlaybackHandle
+
+    config.set("volume", volume)
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    with os.fdopen(fd, "wb") as f:
+        f.write(make_wav(seconds))
+
+    samples = array("q", bytes(8 * (int(seconds * 64000 / AudioService.BUF_SIZE) + 16)))
+    count = [0]
+
+    async def run():
+        service = AudioService()
+        chunk = service.monitor.chunk
+
+        def sampled(read_us, dsp_us):
+            chunk(read_us, dsp_us)
+            i = count[0]
+            if i < len(samples):
+                samples[i] = gc.mem_alloc()
+                count[0] = i + 1
+
+        service.monitor.chunk = sampled
+        service.start()
+        handle = PlaybackHandle(service, [FileWavSource(path)])
+        service.queue.put(("PLAY", handle))
+        while handle.state != PlaybackHandle.STOPPED:
+            await asyncio.sleep_ms(20)
+
+    saved = I2S.SPEED
+    I2S.SPEED = speed
+    tracemalloc.start()
+    try:
+        asyncio.run(run())
+    finally:
+        tracemalloc.stop()
+        I2S.SPEED = saved
+        os.remove(path)
+
+    n = count[0]
+    if n < 20:
+        print("alloc check: only {} chunks sampled".format(n))
+        return False
+    # Skip the first chunks: they include one-off setup (task, first views).
+    window = n // 10
+    head = sum(samples[window:2 * window]) // window
+    tail = sum(samples[n - window:n]) // window
+    growth = tail - head
+    per_chunk = growth / (n - 2 * window)
+    ok = growth <= tolerance
+    print("alloc check: {:.0f}s, {} chunks, heap {} -> {} B, growth {:+d} B ({:+.1f} B/chunk) {}".format(
+        seconds, n, head, tail, growth, per_chunk, "ok" if ok else "FAIL"))
+    return ok
+
+
+def print_result(result):
+    net = ""
+    if "net_stalls" in result:
+        net = " prefill={net_prefill_ms}ms net_stalls={net_stalls} net_stall={net_stall_ms}ms".format(**result)
+    print(
+        "{name:<14} depth={pipe_depth} wall={wall_s:>6.2f}s chunks={chunks:<4} "
+        "read avg/max={read_us_avg:>6}/{read_us_max:<7}us "
+        "dsp avg/max={dsp_us_avg:>5}/{dsp_us_max:<6}us "
+        "underruns={underruns} (i2s {i2s_dry_events}) near={near_underruns} "
+        "dry={dry_ms}ms min_level={min_level_ms}ms stalls={pipe_stalls}".format(**result) + net
+    )
+
+
+def run_suite(seconds=3.0, volume=7, out=None, depths=(None,)):
+    from config import config
+
+    config.set("volume", volume)
+    wav = make_wav(seconds)
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    with os.fdopen(fd, "wb") as f:
+        f.write(wav)
+
+    cases = (
+        ("sd", lambda s: SdStandIn(path)),
+        ("http-steady", lambda s: HttpStandIn(wav, kbytes_per_sec=200)),
+        ("http-jitter", lambda s: HttpStandIn(wav, kbytes_per_sec=200, stall_chance=0.02, stall_ms=900)),
+        ("http-slow", lambda s: HttpStandIn(wav, kbytes_per_sec=56)),
+        ("http-steady+jb", lambda s: HttpStandIn(wav, kbytes_per_sec=200, jitter=s._net_buffer())),
+        ("http-jitter+jb", lambda s: HttpStandIn(wav, kbytes_per_sec=200, stall_chance=0.02, stall_ms=900,
+                                                 jitter=s._net_buffer())),
+        ("http-slow+jb", lambda s: HttpStandIn(wav, kbytes_per_sec=56, jitter=s._net_buffer())),
+    )
+
+    print("Audio benchmark: {:.1f}s 16k stereo per case, volume {}".format(seconds, volume))
+    print("")
+    results = []
+    try:
+        for name, factory in cases:
+            for depth in depths:
+                result = bench_case(name, factory, depth)
+                results.append(result)
+                print_result(result)
+    finally:
+        os.remove(path)
+
+    if out:
+        with open(out, "w") as f:
+            json.dump({"seconds": seconds, "results": results}, f, indent=2)
+            f.write("\n")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--seconds", type=float, default=3.0)
+    p.add_argument("--volume", type=int, default=7)
+    p.add_argument("--out", help="write JSON results here")
+    p.add_argument("--depth", type=int, nargs="*", help="pipeline depths to compare")
+    p.add_argument("--alloc-check", type=float, metavar="SECONDS",
+                   help="check the heap stays flat over SECONDS of playback")
+    a = p.parse_args()
+    if a.alloc_check:
+        sys.exit(0 if alloc_check(a.alloc_check, a.volume) else 1)
+    run_suite(a.seconds, a.volume, a.out, a.depth or (None,))
@@ -0,0 +1,192 @@
+"""
+BLE keyboard replay on the host.
+
+    python tools/ble_replay.py [recording]     (default tools/ble/nskj_d2.txt)
+
+Serves a recorded HID session from a simulated peer (sim/aioble.py) to
+apps/ble_keyboard.py and runs the reports through input_manager and the
+ButtonManager into an AppManager app, as on the device:
+- the peer's report map is compiled and the reports decode to the key
+  events listed in the recording's `expect` lines;
+- a dropped link is reconnected with backoff, and reports after it are
+  delivered again;
+- the built-in fallback layout decodes like the old fixed decoder.
+Last, it prints the decode-and-dispatch time measured by ble_keyboard
+and the notification-to-on_input latency through the app loop, which
+includes the task scheduling ble_keyboard cannot see.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+import time
+
+import aioble
+import bluetooth
+import uasyncio as asyncio
+
+import ble_keyboard
+import input_keys
+import input_manager
+from hid_report import compile_map
+from manager import AppManager, PopApp
+
+DEFAULT = os.path.join(ROOT, "tools", "ble", "nskj_d2.txt")
+failures = 0
+
+
+def check(name, ok, detail=""):
+    global failures
+    if not ok:
+        failures += 1
+    print("{} {}{}".format("ok  " if ok else "FAIL", name, (" - " + detail) if detail else ""))
+
+
+def load(path):
+    """(report map, [(at_ms, action, args)], [(key, status)]) of a recording."""
+    report_map = b""
+    steps = []
+    expect = []
+    with open(path) as f:
+        for raw in f:
+            line = raw.split("#", 1)[0].split()
+            if not line:
+                continue
+            if line[0] == "map":
+                report_map = bytes.fromhex("".join(line[1:]))
+            elif line[0] == "expect":
+                expect.append((getattr(input_keys, line[1]), getattr(input_keys, line[2])))
+            elif line[1] == "report":
+                steps.append((int(line[0]), "report", (int(line[2]), bytes.fromhex("".join(line[3:])))))
+            elif line[1] == "adv":
+                steps.append((int(line[0]), "adv", line[2] == "on"))
+            else:
+                steps.append((int(line[0]), line[1], None))
+    steps.sort(key=lambda s: s[0])
+    return report_map, steps, expect
+
+
+def make_peer(report_map, report_ids):
+    uuid = bluetooth.UUID
+    reports = {}
+    chars = [aioble.Characteristic(uuid(0x2A4B), report_map)]
+    for rid in report_ids:
+        c = aioble.Characteristic(uuid(0x2A4D), descriptors=[aioble.Descriptor(uuid(0x2908), bytes((rid, 1)))])
+        reports[rid] = c
+        chars.append(c)
+    # An output report the keyboard must skip.
+    chars.append(aioble.Characteristic(uuid(0x2A4D), descriptors=[aioble.Descriptor(uuid(0x2908), b"\x01\x02")]))
+    peer = aioble.Peer([aioble.Service(uuid(0x1812), chars)], mtu=23)
+    aioble.devices.append(aioble.ScanResult(ble_keyboard.TARGET_NAME, aioble.Device(peer=peer)))
+    return peer, reports
+
+
+class Recorder(PopApp):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+        self.sent_us = None
+        self.lat = []
+
+    def on_input(self, key, status):
+        self.events.append((key, status))
+        if self.sent_us is not None:
+            self.lat.append(time.ticks_diff(time.ticks_us(), self.sent_us))
+
+
+async def replay(path, app):
+    report_map, steps, expect = load(path)
+    peer, chars = make_peer(report_map, sorted({s[2][0] for s in steps if s[1] == "report"}))
+    input_manager.start()
+    t0 = time.ticks_ms()
+    dropped_at = None
+    reconnect_ms = None
+    for at, action, arg in steps:
+        wait = time.ticks_diff(time.ticks_add(t0, at), time.ticks_ms())
+        if wait > 0:
+            await asyncio.sleep_ms(wait)
+        if action == "report":
+            rid, data = arg
+            char = chars[rid]
+            deadline = time.ticks_add(time.ticks_ms(), 15000)
+            while not char.subscribed or not ble_keyboard.connected():
+                if time.ticks_diff(deadline, time.ticks_ms()) < 0:
+                    check("report {} at {} ms delivered".format(rid, at), False, "not connected")
+                    break
+                await asyncio.sleep_ms(10)
+            if dropped_at is not None:
+                reconnect_ms = time.ticks_diff(time.ticks_ms(), dropped_at)
+                dropped_at = None
+            app.sent_us = time.ticks_us()
+            char.notify(data)
+            await asyncio.sleep_ms(5)
+        elif action == "drop":
+            peer.drop()
+            dropped_at = time.ticks_ms()
+        elif action == "adv":
+            peer.advertising = arg
+            if arg and dropped_at is not None:
+                dropped_at = time.ticks_ms()    # time the reconnect from here
+    await asyncio.sleep_ms(100)
+
+    names = {v: k for k, v in vars(input_keys).items() if k.startswith(("BLE_KEY", "KEY_S"))}
+    got = [(names.get(k, k), names.get(s, s)) for k, s in app.events]
+    want = [(names[k], names[s]) for k, s in expect]
+    check("reports decode to the expected key events", got == want,
+          "" if got == want else "\n     got  {}\n     want {}".format(got, want))
+    st = ble_keyboard.stats()
+    print("stats:", st)
+    if reconnect_ms is not None:
+        check("reconnected after the link came back", reconnect_ms <= ble_keyboard.RETRY_MAX_MS,
+              "{} ms after advertising resumed".format(reconnect_ms))
+        check("no connect storm while the peer was away", st["failures"] <= 8,
+              "{} failed attempts".format(st["failures"]))
+    check("one subscription per connection", peer.connects == st["connects"])
+    if app.lat:
+        print("notification to on_input: avg {} us, max {} us ({} events)".format(
+            sum(app.lat) // len(app.lat), max(app.lat), len(app.lat)))
+    AppManager.instance().stop()
+
+
+def check_fallback():
+    # The old decoder: status = data[0], x = data[1:3], y = data[3:5]; report 2: data[0:2].
+    reports = compile_map(ble_keyboard._FALLBACK_MAP)
+    r1, r2 = reports[1], reports[2]
+    inp = ble_keyboard._Input(r1)
+    got = []
+    ble_keyboard._callback = lambda kind, data: got.append((kind, tuple(data) if kind == 1 else data))
+    for data in (bytes((7, 0xB5, 0x01, 0x70, 0x01, 0x8E, 0x03, 0x8E, 0x03)), bytes((0, 0x34, 0x12, 0x78, 0x56, 0, 0))):
+        inp.dispatch(data)
+        old = (data[0], data[1] | data[2] << 8, data[3] | data[4] << 8)
+        check("fallback layout decodes like the old decoder", got[-1] == (ble_keyboard.REPORT_POINTER, old),
+              str(got[-1]))
+    ble_keyboard._Input(r2).dispatch(b"\x0a\x00")
+    check("fallback consumer report", got[-1] == (ble_keyboard.REPORT_CONSUMER, 10), str(got[-1]))
+    check("decode reuses its buffer", r1.decode(b"\x01" * 9) is r1.values)
+    ble_keyboard._callback = None
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT
+    check_fallback()
+    app = Recorder()
+
+    async def run():
+        task = asyncio.create_task(replay(path, app))
+        await AppManager.instance().run(app)
+        await task
+
+    asyncio.run(run())
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
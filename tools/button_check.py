@@ -0,0 +1,200 @@
+"""
+Button manager check on the host.
+
+    python tools/button_check.py
+
+Drives simulated GPIO levels under apps/button_manager.py, once with pin
+IRQs and once in the polling fallback:
+- a press and a release that bounce for a few ms give one event each;
+- the press is reported at its first edge (IRQ) or within a poll period;
+- holding gives one "long" at LONG_MS, and "repeat" on a repeat pin;
+- long_ms() moves a key's "long" (the top app's long_press_ms through
+  input_manager), and other keys keep LONG_MS;
+- two quick taps give "double" after the second "pressed";
+- inject() gets the same gestures without a pin.
+Last, it counts how often the consumer task woke up over an idle second
+in each mode.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+import time
+
+import uasyncio as asyncio
+from button_manager import ButtonManager
+from machine import Pin
+
+PIN = 21
+REPEAT_PIN = 22
+failures = 0
+
+
+def check(name, ok, detail=""):
+    global failures
+    if not ok:
+        failures += 1
+    print("{} {}{}".format("ok  " if ok else "FAIL", name, (" - " + detail) if detail else ""))
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, evt):
+        self.events.append((evt["pin"], evt["state"], time.ticks_ms()))
+
+    def states(self, pin=PIN):
+        return [e[1] for e in self.events if e[0] == pin]
+
+    def clear(self):
+        self.events = []
+
+
+async def bounce(pin, level, edges=5):
+    # Contact bounce: alternate levels 1 ms apart, ending on `level`.
+    for i in range(edges):
+        Pin.drive(pin, level if i % 2 == 0 else 1 - level)
+        await asyncio.sleep_ms(1)
+    Pin.drive(pin, level)
+
+
+async def run_mode(use_irq):
+    mode = "irq" if use_irq else "poll"
+    for p in (PIN, REPEAT_PIN):
+        Pin.drive(p, 1)
+    rec = Recorder()
+    mgr = ButtonManager([PIN, REPEAT_PIN], callback=rec, repeat_pins=(REPEAT_PIN, "virt"), use_irq=use_irq)
+    mgr.start()
+    await asyncio.sleep_ms(20)
+    check("{}: started in {} mode".format(mode, mode), mgr.mode == mode)
+
+    # Bouncy tap.
+    t0 = time.ticks_ms()
+    await bounce(PIN, 0)
+    await asyncio.sleep_ms(100)
+    await bounce(PIN, 1)
+    await asyncio.sleep_ms(400)
+    check("{}: bouncy tap is one press and one release".format(mode),
+          rec.states() == ["pressed", "released"], str(rec.states()))
+    latency = time.ticks_diff(rec.events[0][2], t0) if rec.events else -1
+    check("{}: press reported at once".format(mode), 0 <= latency <= (3 if use_irq else mgr.poll_ms + 5),
+          "{} ms".format(latency))
+
+    # Long press.
+    rec.clear()
+    t0 = time.ticks_ms()
+    Pin.drive(PIN, 0)
+    await asyncio.sleep_ms(ButtonManager.LONG_MS + 200)
+    Pin.drive(PIN, 1)
+    await asyncio.sleep_ms(100)
+    long_at = [time.ticks_diff(e[2], t0) for e in rec.events if e[1] == "long"]
+    check("{}: hold gives one long press".format(mode), rec.states() == ["pressed", "long", "released"],
+          str(rec.states()))
+    check("{}: long press on time".format(mode),
+          long_at and ButtonManager.LONG_MS <= long_at[0] <= ButtonManager.LONG_MS + 20, str(long_at))
+
+    # Per-key hold time, e.g. the score game's 2 s new match.
+    rec.clear()
+    mgr.long_ms = lambda key: 2000 if key in (PIN, "virt") else None
+    t0 = time.ticks_ms()
+    Pin.drive(PIN, 0)
+    Pin.drive(REPEAT_PIN, 0)
+    mgr.inject("virt", True)
+    await asyncio.sleep_ms(2200)
+    Pin.drive(PIN, 1)
+    Pin.drive(REPEAT_PIN, 1)
+    mgr.inject("virt", False)
+    await asyncio.sleep_ms(100)
+    mgr.long_ms = None
+    long_at = dict((e[0], time.ticks_diff(e[2], t0)) for e in rec.events if e[1] == "long")
+    check("{}: long_ms() sets a key's hold time".format(mode),
+          2000 <= long_at.get(PIN, 0) <= 2020 and 2000 <= long_at.get("virt", 0) <= 2020, str(long_at))
+    check("{}: other keys keep LONG_MS".format(mode),
+          ButtonManager.LONG_MS <= long_at.get(REPEAT_PIN, 0) <= ButtonManager.LONG_MS + 20, str(long_at))
+
+    # Double click.
+    rec.clear()
+    await asyncio.sleep_ms(ButtonManager.DOUBLE_MS + 50)
+    for _ in range(2):
+        Pin.drive(PIN, 0)
+        await asyncio.sleep_ms(70)
+        Pin.drive(PIN, 1)
+        await asyncio.sleep_ms(80)
+    await asyncio.sleep_ms(100)
+    check("{}: two quick taps give a double click".format(mode),
+          rec.states() == ["pressed", "released", "pressed", "double", "released"], str(rec.states()))
+
+    # Auto-repeat.
+    rec.clear()
+    Pin.drive(REPEAT_PIN, 0)
+    await asyncio.sleep_ms(1000)
+    Pin.drive(REPEAT_PIN, 1)
+    await asyncio.sleep_ms(100)
+    repeats = rec.states(REPEAT_PIN).count("repeat")
+    want = (1000 - ButtonManager.REPEAT_DELAY_MS) // ButtonManager.REPEAT_MS + 1
+    check("{}: held repeat pin repeats".format(mode), abs(repeats - want) <= 1,
+          "{} repeats, expected {}".format(repeats, want))
+    check("{}: no repeat on other pins".format(mode), "repeat" not in rec.states())
+
+    # Injected key.
+    rec.clear()
+    mgr.inject("virt", True)
+    await asyncio.sleep_ms(ButtonManager.LONG_MS + 100)
+    mgr.inject("virt", False)
+    await asyncio.sleep_ms(20)
+    s = rec.states("virt")
+    check("{}: injected key gets long press and repeat".format(mode),
+          s[0] == "pressed" and "long" in s and "repeat" in s and s[-1] == "released", str(s))
+
+    # Idle.
+    await asyncio.sleep_ms(100)
+    w = mgr.wakeups
+    await asyncio.sleep_ms(1000)
+    idle = mgr.wakeups - w
+    for p in (PIN, REPEAT_PIN):
+        Pin(p).irq(handler=None)
+    return idle
+
+
+def check_app_hold_times():
+    import input_manager
+    import board_config as hw
+    from input_keys import GPIO_KEY_ENTER, GPIO_KEY_MENU
+    from manager import AppManager, PopApp
+
+    class Plain(PopApp):
+        pass
+
+    class Game(PopApp):
+        long_press_ms = {GPIO_KEY_MENU: 1200, GPIO_KEY_ENTER: 2000}
+
+    mgr = AppManager.instance()
+    mgr.app_stack = [Plain(), Game()]
+    game = [input_manager.btn_long_ms(p) for p in (hw.GPIO_KEY_3, hw.GPIO_KEY_1, hw.GPIO_KEY_0)]
+    mgr.app_stack.pop()
+    plain = input_manager.btn_long_ms(hw.GPIO_KEY_1)
+    mgr.app_stack = []
+    check("top app's long_press_ms reaches the GPIO keys", game == [1200, 2000, None] and plain is None,
+          "{} then {}".format(game, plain))
+
+
+def main():
+    check_app_hold_times()
+    idle_irq = asyncio.run(run_mode(True))
+    idle_poll = asyncio.run(run_mode(False))
+    print("idle second: {} wakeups with pin IRQs, {} polling".format(idle_irq, idle_poll))
+    check("no wakeups while idle with IRQs", idle_irq == 0)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
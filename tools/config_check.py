@@ -0,0 +1,172 @@
+"""
+Config manager check on the host.
+
+    python tools/config_check.py
+
+Runs apps/config_manager.py in a temporary directory:
+- a burst of set() calls is written once by the write-behind task, after
+  SAVE_DELAY_MS of quiet, and not at all while the burst goes on;
+- a steady stream of changes is still written every SAVE_MAX_MS;
+- power loss is simulated at every step of a save (torn config.tmp,
+  config.json renamed away, config.json corrupted) and the next load
+  must come back with a complete config;
+- a config.json from before the checksum line still loads;
+- ConfigValue follows set() and falls back to the default for a value of
+  the wrong type.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+import json
+import tempfile
+import time
+
+import uasyncio as asyncio
+from config_manager import ConfigManager
+
+failures = 0
+
+
+def check(name, ok, detail=""):
+    global failures
+    if not ok:
+        failures += 1
+    print("{} {}{}".format("ok  " if ok else "FAIL", name, (" - " + detail) if detail else ""))
+
+
+def fresh():
+    ConfigManager._instance = None
+    return ConfigManager()
+
+
+def files():
+    return sorted(f for f in os.listdir(".") if f.startswith("config."))
+
+
+async def write_behind():
+    ConfigManager.SAVE_DELAY_MS = 100
+    ConfigManager.SAVE_MAX_MS = 400
+    cfg = fresh()
+    cfg.start()
+    await asyncio.sleep_ms(20)
+    check("first boot writes the defaults", cfg.saves == 1 and os.path.exists("config.json"))
+
+    # Ten volume presses 30 ms apart.
+    for v in range(10):
+        cfg.set("volume", v)
+        await asyncio.sleep_ms(30)
+    during = cfg.saves
+    await asyncio.sleep_ms(200)
+    check("a burst is saved once, after it ends", during == 1 and cfg.saves == 2,
+          "{} saves during, {} after".format(during - 1, cfg.saves - 1))
+    check("saved value", cfg._read("config.json")["volume"] == 9)
+
+    # Changes every 50 ms for a second: quiet time never reached.
+    saves = cfg.saves
+    t0 = time.ticks_ms()
+    i = 0
+    while time.ticks_diff(time.ticks_ms(), t0) < 1000:
+        i += 1
+        cfg.set("player_loop_mode", i % 3)
+        await asyncio.sleep_ms(50)
+    check("steady changes still saved every SAVE_MAX_MS", 2 <= cfg.saves - saves <= 3,
+          "{} saves".format(cfg.saves - saves))
+    cfg._task.cancel()
+
+
+def crash_safety():
+    ConfigManager._instance = None
+    cfg = fresh()
+    cfg.set("volume", 3)
+    cfg.save()
+    cfg.set("volume", 4)
+    cfg.save()
+    check("save keeps a backup", files() == ["config.bak", "config.json"], str(files()))
+
+    # Power lost while writing config.tmp: config.json is untouched.
+    cfg.set("volume", 5)
+    body = json.dumps(cfg.get_all()).encode()
+    with open("config.tmp", "wb") as f:
+        f.write(body[: len(body) // 2])
+    check("torn temp file ignored", fresh().get("volume") == 4)
+    os.remove("config.tmp")
+
+    # Power lost between the two renames: only config.tmp and config.bak.
+    cfg = fresh()
+    cfg.set("volume", 6)
+    real_rename = os.rename
+
+    def rename(src, dst):
+        if src.endswith(".tmp"):
+            raise OSError("power lost")
+        real_rename(src, dst)
+    os.rename = rename
+    cfg.save()
+    os.rename = real_rename
+    check("power loss between renames leaves no config.json", "config.json" not in files(), str(files()))
+    cfg = fresh()
+    check("recovered from config.tmp", cfg.get("volume") == 6)
+    cfg.save()
+    check("recovery rewrites config.json", "config.json" in files() and fresh().get("volume") == 6)
+
+    # Flash corruption of config.json: checksum catches it, the previous
+    # save is used.
+    cfg.set("volume", 7)
+    cfg.save()
+    with open("config.json", "r+b") as f:
+        f.seek(3)
+        f.write(b"X")
+    check("corrupt config.json falls back to the backup", fresh().get("volume") == 6)
+
+    # Everything gone: defaults.
+    for f in files():
+        os.remove(f)
+    check("no files: defaults", fresh().get("volume") == ConfigManager._default_config["volume"])
+
+    # Plain JSON from the old save().
+    with open("config.json", "w") as f:
+        json.dump({"volume": 2, "players": ["A", "B"]}, f)
+    cfg = fresh()
+    check("old config.json loads", cfg.get("volume") == 2 and cfg.get("players") == ["A", "B"])
+
+
+def values():
+    cfg = fresh()
+    seen = []
+    vol = cfg.value("volume", int, 0, 10, on_change=seen.append)
+    cfg.set("volume", 7)
+    check("ConfigValue follows set()", vol.value == 7 and seen == [7])
+    cfg.set("volume", 99)
+    check("ConfigValue clamps", vol.value == 10)
+    cfg.set("volume", "loud")
+    check("wrong type reads as the default", vol.value == ConfigManager._default_config["volume"])
+    vol.close()
+    cfg.set("volume", 1)
+    check("closed ConfigValue unsubscribed", vol.value != 1 and len(seen) == 3)
+    tts = cfg.value("tts_enable", bool)
+    cfg.set("tts_enable", 0)
+    check("bool value rejects ints", tts.value is True)
+
+
+def main():
+    tmp = tempfile.mkdtemp()
+    os.chdir(tmp)
+    asyncio.run(write_behind())
+    for f in files():
+        os.remove(f)
+    crash_safety()
+    values()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
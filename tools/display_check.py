@@ -0,0 +1,190 @@
+"""
+Display viewport check on the simulated panels.
+
+    python tools/display_check.py
+
+Renders the gui_benchmark scenes (full frame, then a few dirty-rect
+updates) on every panel st7789py supports, in every rotation, and
+compares each frame with the same scene on a plain 240x240 panel:
+- where the 240x240 layout fits (240x240, 240x320 either way) the
+  viewport must be that frame pixel for pixel, centred;
+- where it doesn't (135x240, 128x128) it must be the 2x2 box average of
+  it, centred;
+- the rest of the panel stays black.
+It also turns a 135x240 panel at run time with Display.set_rotation(), and
+scales a 120x120 layout up 2x onto a 240x240 panel against the same
+layout on a 120x120 panel. Last, it prints the SPI bytes per frame for
+each panel.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+import random
+
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+from gui_benchmark import SCENARIOS
+from machine import Pin, SPI
+from sim.display import SimST7789
+from utils import trace
+from utils.trace import DEBUG_ERROR
+
+PANELS = ((240, 240), (240, 320), (135, 240), (128, 128))
+FRAMES = 6
+failures = 0
+
+
+def check(name, ok, detail=""):
+    global failures
+    if not ok:
+        failures += 1
+    print("{} {}{}".format("ok  " if ok else "FAIL", name, (" - " + detail) if detail else ""))
+
+
+def make_display(w, h, rotation, layout=None, custom=None):
+    from gui.core.gui import Display
+
+    tft = SimST7789(SPI(2, baudrate=40_000_000), w, h, dc=Pin(39, Pin.OUT), rotation=rotation,
+                    custom_rotations=custom)
+    return Display(tft) if layout is None else Display(tft, *layout)
+
+
+def render(disp, scene, frames=FRAMES):
+    """Panel framebuffer after the first full frame and after each update."""
+    random.seed(1)
+    screen, step = scene()
+    screen.invalidate()
+    screen.show()
+    out = [bytes(disp.tft.fb)]
+    for i in range(frames):
+        step(i)
+        screen.show()
+        out.append(bytes(disp.tft.fb))
+    return screen, out
+
+
+def expected(ref, lw, lh, disp):
+    """What `disp`'s panel must show for the logical frame `ref` (lw x lh)."""
+    pw, ph = disp.tft.width, disp.tft.height
+    out = bytearray(pw * ph * 2)
+    up, n = disp.up, disp.down
+    for y in range(disp.out_h):
+        for x in range(disp.out_w):
+            if n > 1:
+                r = g = b = 0
+                for dy in range(n):
+                    for dx in range(n):
+                        i = ((y * n + dy) * lw + x * n + dx) * 2
+                        c = ref[i] << 8 | ref[i + 1]
+                        r += c >> 11
+                        g += (c >> 5) & 0x3F
+                        b += c & 0x1F
+                nn = n * n
+                c = (r // nn) << 11 | (g // nn) << 5 | (b // nn)
+            else:
+                i = ((y // up) * lw + x // up) * 2
+                c = ref[i] << 8 | ref[i + 1]
+            o = ((disp.oy + y) * pw + disp.ox + x) * 2
+            out[o] = c >> 8
+            out[o + 1] = c & 0xFF
+    return bytes(out)
+
+
+def first_diff(a, b, w):
+    for i in range(0, len(a), 2):
+        if a[i:i + 2] != b[i:i + 2]:
+            return "first difference at ({}, {})".format((i // 2) % w, (i // 2) // w)
+    return ""
+
+
+def check_panels():
+    refs = {}
+    for name, scene in SCENARIOS:
+        refs[name] = render(make_display(240, 240, 0), scene)[1]
+
+    spi = {}
+    for w, h in PANELS:
+        for rotation in range(4):
+            disp = make_display(w, h, rotation)
+            tag = "{}x{} r{} -> {}x{}".format(w, h, rotation, disp.tft.width, disp.tft.height)
+            bytes_sent = 0
+            frames_sent = 0
+            bad = []
+            for name, scene in SCENARIOS:
+                disp.tft.reset_stats()
+                got = render(disp, scene)[1]
+                bytes_sent += disp.tft.stats()["spi_bytes"]
+                frames_sent += len(got)
+                for k, (frame, ref) in enumerate(zip(got, refs[name])):
+                    want = expected(ref, 240, 240, disp)
+                    if frame != want:
+                        bad.append("{} frame {}: {}".format(name, k, first_diff(frame, want, disp.tft.width)))
+                        break
+            scale = "x{}".format(disp.up) if disp.down == 1 else "/{}".format(disp.down)
+            check("{}: {} viewport {}x{} at ({}, {}) matches 240x240".format(
+                tag, scale, disp.out_w, disp.out_h, disp.ox, disp.oy), not bad, "; ".join(bad))
+            spi[tag] = bytes_sent // frames_sent
+    return refs, spi
+
+
+def check_set_rotation(refs):
+    disp = make_display(135, 240, 0)
+    screen, _ = render(disp, SCENARIOS[0][1], 0)
+    disp.set_rotation(1)
+    screen.invalidate()
+    screen.show()
+    want = expected(refs[SCENARIOS[0][0]][0], 240, 240, disp)
+    check("set_rotation() moves the viewport (135x240 r0 -> r1)",
+          (disp.tft.width, disp.tft.height, disp.ox, disp.oy) == (240, 135, 60, 7) and bytes(disp.tft.fb) == want,
+          "{}x{} at ({}, {})".format(disp.tft.width, disp.tft.height, disp.ox, disp.oy))
+
+
+def scene_small():
+    from gui.core.gui import Screen
+    from gui.fonts import font10
+    from gui.widgets.label import Label
+    from gui.widgets.rectwidget import RectWidget
+
+    screen = Screen(0x0000)
+    rect = RectWidget(5, 5, 50, 30, 0x001F)
+    label = Label(8, 100, "0000", font10, 0xFFFF, w=80)
+    screen.add_list([rect, label])
+
+    def step(i):
+        rect.set_bgcolor((0xF800, 0x07E0, 0x001F)[i % 3])
+        label.set_text("{:04d}".format(i * 37))
+
+    return screen, step
+
+
+def check_upscale():
+    small = make_display(120, 120, 0, layout=(120, 120), custom=((0x00, 120, 120, 0, 0, False),))
+    ref = render(small, scene_small)[1]
+    disp = make_display(240, 240, 0, layout=(120, 120))
+    got = render(disp, scene_small)[1]
+    bad = [k for k, (frame, r) in enumerate(zip(got, ref)) if frame != expected(r, 120, 120, disp)]
+    check("120x120 layout scaled x{} onto 240x240".format(disp.up), disp.up == 2 and not bad,
+          "frames {} differ".format(bad) if bad else "")
+
+
+def main():
+    trace.set_level(DEBUG_ERROR)
+    refs, spi = check_panels()
+    check_set_rotation(refs)
+    check_upscale()
+    print("SPI bytes per frame (all scenes):")
+    for tag, n in spi.items():
+        print("  {:28s} {:7d}".format(tag, n))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Audio DSP kernel checks and benchmark.
+
+    python tools/dsp_benchmark.py            # bit-exact checks, then timings
+    python tools/dsp_benchmark.py --check    # checks only
+
+The checks run apps/audio_dsp.py against the pure-Python model below on
+random and edge-case PCM (full-scale samples, every volume step, mono and
+stereo ramps, odd lengths) and require identical bytes. Volume at constant
+gain must also match the old ptr8 kernel, and the ADPCM decoder must match
+the reference decoder in tools/adpcm_encode.py. The timings compare that kernel
+with the ptr16 ones per 8 KB chunk; on the host viper is emulated, so the
+absolute numbers only mean something on the device.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+import random
+import time
+from array import array
+
+from audio_adpcm import AdpcmDecoder
+from audio_dsp import UNITY, VOLUME_TABLE, apply_gain, apply_ramp
+import adpcm_encode
+
+CHUNK = 8192
+
+
+# ---------------------------
+# reference model
+# ---------------------------
+def _samples(buf, n):
+    a = array("h")
+    a.frombytes(bytes(buf[:n & ~1]))
+    return a
+
+
+def gain_ref(buf, n, gain):
+    gain = max(0, min(UNITY, gain))
+    a = _samples(buf, n)
+    if gain != UNITY:
+        for i in range(len(a)):
+            a[i] = (a[i] * gain) >> 8
+    out = bytearray(buf)
+    out[:len(a) * 2] = a.tobytes()
+    return out
+
+
+def ramp_ref(buf, n, channels, g0, g1):
+    g0 = max(0, min(UNITY, g0))
+    g1 = max(0, min(UNITY, g1))
+    a = _samples(buf, n)
+    frames = len(a) // channels
+    if frames <= 0:
+        return bytearray(buf)
+    if g0 == g1:
+        return gain_ref(buf, frames * channels * 2, g0)
+    # Gain for frame f is g0 + (g1 - g0) * f / frames in Q16, with the
+    # per-frame step truncated towards zero.
+    delta = (g1 - g0) << 16
+    step = abs(delta) // frames * (1 if delta >= 0 else -1)
+    for f in range(frames):
+        g = ((g0 << 16) + f * step) >> 16
+        for c in range(channels):
+            i = f * channels + c
+            a[i] = (a[i] * g) >> 8
+    out = bytearray(buf)
+    out[:frames * channels * 2] = a[:frames * channels].tobytes()
+    return out
+
+
+# ---------------------------
+# previous ptr8 kernel (baseline)
+# ---------------------------
+@micropython.viper
+def adjust_volume_ptr8(buf: ptr8, length: int, volume: int):
+    for i in range(0, length, 2):
+        sample = buf[i] | (buf[i + 1] << 8)
+        if sample >= 32768:
+            sample -= 65536
+        sample = (sample * volume) >> 8
+        if sample > 32767:
+            sample = 32767
+        elif sample < -32768:
+            sample = -32768
+        buf[i] = sample & 0xFF
+        buf[i + 1] = (sample >> 8) & 0xFF
+
+
+@micropython.viper
+def fade16_in_ptr8(buf: ptr8, length: int):
+    samples = length // 2
+    if samples <= 1:
+        return
+    for i in range(samples):
+        idx = i * 2
+        sample = buf[idx] | (buf[idx + 1] << 8)
+        if sample >= 32768:
+            sample -= 65536
+        sample = (sample * i) // samples
+        if sample > 32767:
+            sample = 32767
+        elif sample < -32768:
+            sample = -32768
+        buf[idx] = sample & 0xFF
+        buf[idx + 1] = (sample >> 8) & 0xFF
+
+
+# ---------------------------
+# checks
+# ---------------------------
+def make_pcm(n, rng):
+    a = array("h", (rng.randint(-32768, 32767) for _ in range(n // 2)))
+    # Full-scale edges at both ends catch sign and shift mistakes.
+    for i, v in enumerate((-32768, 32767, -1, 0, 1, -32767)):
+        if i < len(a):
+            a[i] = v
+    return bytearray(a.tobytes())
+
+
+def run_checks(seed=1):
+    rng = random.Random(seed)
+    failures = 0
+    cases = 0
+
+    def expect(name, got, want):
+        nonlocal failures, cases
+        cases += 1
+        if got != want:
+            failures += 1
+            first = next(i for i in range(len(got)) if got[i] != want[i])
+            print("FAIL {}: first differing byte {}".format(name, first))
+
+    for n in (0, 2, 4, 6, 960, 3840, 8190, CHUNK):
+        pcm = make_pcm(n, rng)
+        for gain in VOLUME_TABLE + [-5, 300]:
+            buf = bytearray(pcm)
+            apply_gain(buf, n, gain)
+            expect("gain n={} g={}".format(n, gain), buf, gain_ref(pcm, n, gain))
+            if 0 <= gain <= UNITY:
+                old = bytearray(pcm)
+                adjust_volume_ptr8(old, n, gain)
+                expect("gain vs ptr8 n={} g={}".format(n, gain), buf, old)
+
+        for channels in (1, 2):
+            for g0, g1 in ((0, UNITY), (UNITY, 0), (0, 3), (3, 0), (41, 207), (207, 41), (92, 92), (0, 0)):
+                buf = bytearray(pcm)
+                apply_ramp(buf, n, channels, g0, g1)
+                expect("ramp n={} ch={} {}->{}".format(n, channels, g0, g1), buf,
+                       ramp_ref(pcm, n, channels, g0, g1))
+
+    # Odd byte counts leave the trailing byte alone.
+    pcm = make_pcm(64, rng)
+    buf = bytearray(pcm)
+    apply_gain(buf, 63, 64)
+    expect("gain odd length", buf, gain_ref(pcm, 63, 64))
+
+    # ADPCM: random noise and a full-scale square wave drive the step index
+    # and the predictor into both clamps.
+    dec = AdpcmDecoder()
+    for channels in (1, 2):
+        for per_ch in (8, 256, 512):
+            block_align = per_ch * channels
+            for kind in ("noise", "square"):
+                n = adpcm_encode.samples_per_block(block_align, channels) * channels * 3
+                if kind == "noise":
+                    pcm = array("h", (rng.randint(-32768, 32767) for _ in range(n)))
+                else:
+                    pcm = array("h", (32767 if (i // 37) & 1 else -32768 for i in range(n)))
+                data, _ = adpcm_encode.encode(pcm, channels, block_align)
+                want = adpcm_encode.decode(data, channels, block_align).tobytes()
+                dec.configure(block_align, channels)
+                out = bytearray(len(want) + 4)
+                m = dec.convert(memoryview(data), len(data), out)
+                expect("adpcm ch={} block={} {}".format(channels, block_align, kind),
+                       bytes(out[:m]), want)
+
+    print("dsp checks: {} cases, {} failures".format(cases, failures))
+    return failures == 0
+
+
+# ---------------------------
+# timings
+# ---------------------------
+def _time_us(fn, pcm, repeat):
+    buf = bytearray(pcm)
+    start = time.perf_counter_ns()
+    for _ in range(repeat):
+        buf[:] = pcm
+        fn(buf)
+    return (time.perf_counter_ns() - start) // 1000 // repeat
+
+
+def run_bench(repeat=5, volume=7):
+    pcm = make_pcm(CHUNK, random.Random(2))
+    gain = VOLUME_TABLE[volume]
+    rows = (
+        ("volume ptr8", lambda b: adjust_volume_ptr8(b, CHUNK, gain)),
+        ("volume ptr16", lambda b: apply_gain(b, CHUNK, gain)),
+        ("unity ptr8", lambda b: adjust_volume_ptr8(b, CHUNK, UNITY)),
+        ("unity ptr16", lambda b: apply_gain(b, CHUNK, UNITY)),
+        ("fade+vol ptr8", lambda b: (fade16_in_ptr8(b, CHUNK), adjust_volume_ptr8(b, CHUNK, gain))),
+        ("fade+vol ptr16", lambda b: apply_ramp(b, CHUNK, 2, 0, gain)),
+    )
+    dec = AdpcmDecoder()
+    dec.configure(1024, 2)
+    blocks = CHUNK // dec.out_block
+    adpcm, _ = adpcm_encode.encode(_samples(pcm, CHUNK), 2, 1024)
+    adpcm = bytearray(adpcm) * blocks
+    out = bytearray(CHUNK)
+    print("")
+    print("DSP timings per {} B chunk (host, viper emulated):".format(CHUNK))
+    for name, fn in rows:
+        print("  {:<16} {:>8} us".format(name, _time_us(fn, pcm, repeat)))
+    t = _time_us(lambda b: dec.convert(adpcm, len(adpcm), out), pcm, repeat)
+    print("  {:<16} {:>8} us ({} B out)".format("adpcm decode", t, blocks * dec.out_block))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--check", action="store_true", help="run the bit-exact checks only")
+    p.add_argument("--repeat", type=int, default=5)
+    a = p.parse_args()
+    ok = run_checks()
+    if not a.check:
+        run_bench(a.repeat)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,289 @@
+"""
+GUI rendering benchmark with golden-frame checks.
+
+Runs on the host against the simulated ST7789 (sim.display.SimST7789):
+
+    python tools/gui_benchmark.py                    # run, compare with golden
+    python tools/gui_benchmark.py --out run.json     # also save results
+    python tools/gui_benchmark.py --compare run.json # print deltas vs a run
+    python tools/gui_benchmark.py --update-golden    # accept current output
+
+Each scenario renders a warm-up full frame and then N updates through
+Screen.show(). Per frame it reports host ms, pixels flushed, SPI bytes (and
+the SPI time they cost at the panel clock) and the peak transient heap.
+Every flushed frame is folded into a CRC chain; the chain must match
+tools/gui_golden.json, so an optimisation that changes output fails.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+import json
+import random
+import time
+import tracemalloc
+import zlib
+
+GOLDEN_PATH = os.path.join(ROOT, "tools", "gui_golden.json")
+SPI_BAUDRATE = 40_000_000
+
+
+def make_panel():
+    from machine import Pin, SPI
+    from sim.display import SimST7789
+    from gui.core.gui import Display
+
+    tft = SimST7789(SPI(2, baudrate=SPI_BAUDRATE), 240, 240, dc=Pin(39, Pin.OUT), rotation=1)
+    Display(tft)
+    return tft
+
+
+# ---------------------------
+# scenarios: setup() -> (screen, step(i))
+# ---------------------------
+def scene_fill():
+    from gui.core.gui import Screen
+    from gui.widgets.rectwidget import RectWidget
+
+    screen = Screen(0x0000)
+    rect = RectWidget(0, 0, screen.w, screen.h, 0x001F)
+    screen.add(rect)
+    colors = (0xF800, 0x07E0, 0x001F, 0xFFFF)
+
+    def step(i):
+        rect.set_bgcolor(colors[i % len(colors)])
+
+    return screen, step
+
+
+def scene_labels(n=10):
+    from gui.core.gui import Screen
+    from gui.fonts import font10
+    from gui.widgets.label import Label
+
+    screen = Screen(0x8410)
+    labels = []
+    for i in range(n):
+        lbl = Label(10 + (i % 2) * 120, 10 + (i // 2) * 22, "0000", font10, 0xFFFF, w=100)
+        labels.append(lbl)
+    screen.add_list(labels)
+
+    def step(i):
+        for k, lbl in enumerate(labels):
+            lbl.set_text("{:04d}".format((i * 7 + k * 13) % 10000))
+
+    return screen, step
+
+
+def scene_scoreboard():
+    from config import config
+    from score_game_app import PingPongApp
+
+    config.reset()
+    app = PingPongApp()
+
+    def step(i):
+        app.scoreboard.score_point(1 if (i * 5) % 3 else 2)
+        if app.scoreboard.get_end_status():
+            app.scoreboard.start_new_game()
+        app.update_score_display()
+
+    return app.screen, step
+
+
+def scene_snake():
+    from snake_app import SnakeApp
+
+    random.seed(1)
+    app = SnakeApp()
+    app.reset_game()
+    app.running = True
+
+    def step(i):
+        if i % 5 == 4:
+            app._turn_right()
+        app._step()
+        if app.game_over:
+            app.reset_game()
+            app.running = True
+
+    return app.screen, step
+
+
+def scene_menu():
+    from menu_app import GameMainApp
+
+    app = GameMainApp()
+    app.selected_index = 0
+    app._refresh_selection()
+
+    def step(i):
+        app.selected_index = (app.selected_index + 1) % len(app.apps)
+        app._refresh_selection()
+
+    return app.screen, step
+
+
+def scene_progress():
+    from gui.core.gui import Screen
+    from gui.widgets.progressbar import ProgressBar
+
+    screen = Screen(0x8410)
+    bar = ProgressBar(10, 204, 200, 12, border_color=0xFFFF, fill_color=0xFFE0, empty_color=0xFFFF)
+    screen.add(bar)
+
+    def step(i):
+        bar.set_value((i * 3) % 101)
+
+    return screen, step
+
+
+SCENARIOS = (
+    ("fill", scene_fill),
+    ("labels", scene_labels),
+    ("scoreboard", scene_scoreboard),
+    ("snake", scene_snake),
+    ("menu", scene_menu),
+    ("progress", scene_progress),
+)
+
+
+# ---------------------------
+# runner
+# ---------------------------
+class _Quiet:
+    """Swallow the per-rect prints of Screen.show() while measuring."""
+
+    def __enter__(self):
+        self._stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+
+    def __exit__(self, *exc):
+        sys.stdout.close()
+        sys.stdout = self._stdout
+
+
+def bench_case(name, setup, panel, frames):
+    with _Quiet():
+        screen, step = setup()
+        screen.invalidate()
+        screen.show()
+        crc = zlib.crc32(panel.fb)
+
+        panel.reset_stats()
+        total_us = 0
+        for i in range(frames):
+            start = time.perf_counter_ns()
+            step(i)
+            screen.show()
+            total_us += (time.perf_counter_ns() - start) // 1000
+            crc = zlib.crc32(panel.fb, crc)
+        stats = panel.stats()
+
+        # Allocation pass: tracemalloc slows everything down, keep it separate.
+        alloc_peak = 0
+        tracemalloc.start()
+        for i in range(frames, frames + min(frames, 10)):
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            step(i)
+            screen.show()
+            alloc_peak = max(alloc_peak, tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+
+    return {
+        "name": name,
+        "frames": frames,
+        "ms_per_frame": total_us / frames / 1000,
+        "pixels_per_frame": stats["pixels"] // frames,
+        "spi_bytes_per_frame": stats["spi_bytes"] // frames,
+        "spi_ms_per_frame": stats["spi_bytes"] * 8 * 1000 / SPI_BAUDRATE / frames,
+        "windows_per_frame": stats["windows"] / frames,
+        "alloc_peak_bytes": alloc_peak,
+        "crc": "{:08x}".format(crc & 0xFFFFFFFF),
+    }
+
+
+def print_result(result, golden=None, baseline=None):
+    line = (
+        "{name:<11} {ms_per_frame:>8.2f} ms  {pixels_per_frame:>7} px  "
+        "{spi_bytes_per_frame:>7} B spi ({spi_ms_per_frame:>5.2f} ms)  "
+        "{alloc_peak_bytes:>7} B heap  crc={crc}"
+    ).format(**result)
+    if golden is not None:
+        line += "  ok" if golden == result["crc"] else "  GOLDEN MISMATCH ({})".format(golden)
+    if baseline:
+        base_ms = baseline["ms_per_frame"]
+        if result["ms_per_frame"]:
+            line += "  speedup={:.2f}x".format(base_ms / result["ms_per_frame"])
+        line += "  spi {:+d} B".format(result["spi_bytes_per_frame"] - baseline["spi_bytes_per_frame"])
+    print(line)
+
+
+def _load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except OSError:
+        return {}
+
+
+def run_suite(frames=50, only=None, out=None, compare=None, update_golden=False):
+    panel = make_panel()
+    golden = _load_json(GOLDEN_PATH)
+    baseline = {}
+    if compare:
+        baseline = {r["name"]: r for r in _load_json(compare).get("results", [])}
+
+    print("GUI benchmark: {} frames per scenario, panel {}x{}".format(frames, panel.width, panel.height))
+    print("")
+
+    results = []
+    failed = False
+    for name, setup in SCENARIOS:
+        if only and name not in only:
+            continue
+        result = bench_case(name, setup, panel, frames)
+        results.append(result)
+        key = "{}:{}".format(name, frames)
+        expect = None if update_golden else golden.get(key)
+        if expect is not None and expect != result["crc"]:
+            failed = True
+        print_result(result, expect, baseline.get(name))
+        if update_golden:
+            golden[key] = result["crc"]
+
+    if update_golden:
+        with open(GOLDEN_PATH, "w") as f:
+            json.dump(golden, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("\ngolden frames updated: {}".format(GOLDEN_PATH))
+
+    if out:
+        with open(out, "w") as f:
+            json.dump({"frames": frames, "results": results}, f, indent=2)
+            f.write("\n")
+
+    return not failed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--frames", type=int, default=50)
+    p.add_argument("--only", nargs="*", help="scenario names")
+    p.add_argument("--out", help="write JSON results here")
+    p.add_argument("--compare", help="JSON results of a previous run")
+    p.add_argument("--update-golden", action="store_true")
+    a = p.parse_args()
+    ok = run_suite(a.frames, a.only, a.out, a.compare, a.update_golden)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,400 @@
+"""
+HTTP client and keep-alive pool check against a local server stand-in.
+
+    python tools/http_check.py
+    python tools/http_check.py --connect-ms 300
+
+Starts an HTTP/1.1 server on 127.0.0.1 that serves WAV tracks and a
+playlist with Content-Length, chunked transfer encoding, close-delimited
+bodies and redirects, and answers keep-alive requests on the same socket.
+Content-Length routes honour `Range: bytes=N-` (206), except one that
+ignores it like a server without range support.
+Every accepted connection is delayed by --connect-ms to stand in for the
+cost of a TCP connect on the device. The checks fetch through
+apps/http_client.py, then play the playlist through AudioService and
+report how many connections were opened and the time to first byte of each
+track. Then a track is interrupted by an inserted clip and resumed, and
+skipped ahead, checking both only fetch the bytes from the new offset.
+Large JSON and M3U playlists are streamed into the on-flash index and
+compared entry by entry with a whole-body parse.
+Last, a playlist plays through NetPlayerApp once with one handle per track
+(the old behaviour) and once with the next track prefetched, with every
+response delayed by --ttfb-ms, comparing how often the I2S ring ran dry
+(the sim counts the natural end as one) and the time spent on the list,
+and a key click during a stream must be mixed in without a reconnect.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+import asyncio as aio
+import json
+import tempfile
+import time
+
+import uasyncio as asyncio
+from machine import I2S
+
+from audio_benchmark import make_wav
+from http_client import http_pool
+
+
+class StandInServer:
+    def __init__(self, connect_ms=0, ttfb_ms=0):
+        self.connect_ms = connect_ms
+        self.ttfb_ms = ttfb_ms
+        self.connections = 0
+        self.requests = 0
+        self.ranges = []
+        self.routes = {}
+        self.port = 0
+        self._server = None
+
+    async def start(self):
+        self._server = await aio.start_server(self._client, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def url(self, path):
+        return "http://127.0.0.1:{}{}".format(self.port, path)
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _client(self, reader, writer):
+        self.connections += 1
+        await aio.sleep(self.connect_ms / 1000)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                self.requests += 1
+                lines = head.decode().split("\r\n")
+                path = lines[0].split(" ")[1]
+                keep = "connection: close" not in head.decode().lower()
+                start = 0
+                for line in lines[1:]:
+                    if line.lower().startswith("range: bytes="):
+                        start = int(line.split("=", 1)[1].split("-", 1)[0])
+                        self.ranges.append((path, start))
+                route = self.routes.get(path)
+                await aio.sleep(self.ttfb_ms / 1000)
+                if route is None:
+                    writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                    await writer.drain()
+                    continue
+                kind, body = route
+                if kind == "redirect":
+                    writer.write("HTTP/1.1 302 Found\r\nLocation: {}\r\nContent-Length: 5\r\n\r\nmoved".format(body).encode())
+                elif kind == "chunked":
+                    writer.write(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n")
+                    for i in range(0, len(body), 1000):
+                        part = body[i:i + 1000]
+                        writer.write("{:x};ext=1\r\n".format(len(part)).encode() + part + b"\r\n")
+                    writer.write(b"0\r\nX-Trailer: 1\r\n\r\n")
+                elif kind == "norange" or (kind == "length" and not start):
+                    writer.write("HTTP/1.1 200 OK\r\nContent-Length: {}\r\n\r\n".format(len(body)).encode() + body)
+                elif start >= len(body):
+                    writer.write("HTTP/1.1 416 Range Not Satisfiable\r\nContent-Range: bytes */{}\r\nContent-Length: 0\r\n\r\n".format(len(body)).encode())
+                elif kind == "close":
+                    writer.write(b"HTTP/1.1 200 OK\r\nConnection: close\r\n\r\n" + body)
+                    await writer.drain()
+                    break
+                else:
+                    part = body[start:]
+                    writer.write("HTTP/1.1 206 Partial Content\r\nContent-Range: bytes {}-{}/{}\r\nContent-Length: {}\r\n\r\n".format(
+                        start, len(body) - 1, len(body), len(part)).encode() + part)
+                await writer.drain()
+                if not keep:
+                    break
+        except (aio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+failures = 0
+
+
+def check(name, ok, detail=""):
+    global failures
+    if not ok:
+        failures += 1
+    print("{} {}{}".format("ok  " if ok else "FAIL", name, (" - " + detail) if detail else ""))
+
+
+async def fetch(url):
+    resp = await http_pool.get(url)
+    try:
+        return resp.status, await resp.read_all()
+    finally:
+        await resp.close()
+
+
+def big_playlists(srv, n):
+    """(json body, m3u body, expected entries) with awkward names and URLs."""
+    items = []
+    want = []
+    for i in range(n):
+        url = srv.url("/big/{}.wav?q=[{}]".format(i, i))
+        name = 'Track "{}" {{x}} [\\] \u00e9\u4e2d'.format(i) if i % 3 else ""
+        item = {"name": name, "url": url, "meta": {"tags": ["a", "]}"], "n": i}}
+        if i % 7 == 0:
+            item = {"name": name, "wav_url": url, "url": "ignored"}
+        items.append(item)
+        want.append((url, name))
+    items.insert(5, "not an object")
+    items.insert(9, {"name": "no url"})
+    body = json.dumps(items, ensure_ascii=False).encode()
+    lines = ["#EXTM3U"]
+    for url, name in want:
+        if name:
+            lines.append("#EXTINF:-1,{}".format(name))
+        lines.append(url)
+        lines.append("# comment")
+    m3u = "\r\n".join(lines).encode()
+    return body, m3u, want
+
+
+async def fetch_index(url):
+    from net_player_app import _worker
+
+    t0 = time.perf_counter()
+    index = await _worker._fetch_playlist(url)
+    ms = int((time.perf_counter() - t0) * 1000)
+    got = [index.entry(i) for i in range(len(index))]
+    index.close()
+    return got, ms
+
+
+async def play_playlist(service, app, urls, prefetch):
+    """Drive NetPlayerApp's status poll like its timer would."""
+    from audio_service import PlaybackHandle
+    from playlist_index import MemoryPlaylist
+
+    app.playlist = MemoryPlaylist(urls)
+    app.selected_index = 0
+    service.i2s.capture = bytearray()
+    dry = service.i2s.underruns
+    followed = []
+    t0 = time.ticks_ms()
+    app._play_selected()
+    while app.playing:
+        await asyncio.sleep_ms(50)
+        if prefetch:
+            app._poll_status()
+        elif app._handle.state == PlaybackHandle.STOPPED:
+            # One handle per track: the next starts after this one ended.
+            if app.selected_index + 1 >= len(urls):
+                app._stop()
+            else:
+                app._stop()
+                app.selected_index += 1
+                app._play_selected()
+        if app.selected_index not in followed:
+            followed.append(app.selected_index)
+    ms = time.ticks_diff(time.ticks_ms(), t0)
+    return bytes(service.i2s.capture), service.i2s.underruns - dry, followed, ms
+
+
+async def run(connect_ms, ttfb_ms):
+    srv = StandInServer(connect_ms)
+    await srv.start()
+    tracks = [make_wav(0.5, freq=220 * (i + 1)) for i in range(3)]
+    text = b"hello keep-alive " * 300
+    srv.routes = {
+        "/text": ("length", text),
+        "/chunked": ("chunked", text),
+        "/close": ("close", text),
+        "/moved": ("redirect", "/text"),
+        "/loop": ("redirect", "/loop"),
+        "/list.json": ("length", json.dumps([{"name": "t{}".format(i), "url": srv.url("/t{}.wav".format(i))}
+                                             for i in range(3)]).encode()),
+    }
+    for i, wav in enumerate(tracks):
+        srv.routes["/t{}.wav".format(i)] = ("chunked" if i == 1 else "length", wav)
+
+    status, body = await fetch(srv.url("/text"))
+    check("content-length body", status == 200 and body == text)
+    status, body = await fetch(srv.url("/chunked"))
+    check("chunked body with extensions and trailers", status == 200 and body == text)
+    status, body = await fetch(srv.url("/moved"))
+    check("redirect followed", status == 200 and body == text)
+    check("keep-alive reused across requests and redirect", srv.connections == 1,
+          "{} connections for {} requests".format(srv.connections, srv.requests))
+    status, body = await fetch(srv.url("/close"))
+    check("close-delimited body", status == 200 and body == text)
+    status, body = await fetch(srv.url("/missing"))
+    check("404 reported", status == 404 and body == b"")
+    try:
+        await fetch(srv.url("/loop"))
+        check("redirect loop stopped", False)
+    except ValueError:
+        check("redirect loop stopped", True)
+
+    # Stale pooled connection: the server drops idle sockets.
+    await http_pool.close_all()
+    base = srv.connections
+    await fetch(srv.url("/text"))
+    for w in list(http_pool._idle.values())[0]:
+        w[1].close()
+    status, body = await fetch(srv.url("/text"))
+    check("stale pooled connection retried", status == 200 and body == text,
+          "{} new connections".format(srv.connections - base))
+
+    # Playlist, then every track through AudioService with the jitter buffer.
+    from audio_service import AudioService, PlaybackHandle
+    from net_player_app import _worker
+
+    await http_pool.close_all()
+    srv.connections = 0
+    I2S.SPEED = 8
+    service = AudioService()
+    service.start()
+    tmp = tempfile.mkdtemp()
+    _worker.PLAYLIST_PATH = os.path.join(tmp, "netplaylist")
+    from resume_store import resume_store
+    resume_store.path = os.path.join(tmp, "resume.log")
+    index = await _worker._fetch_playlist(srv.url("/list.json"))
+    urls = [index.url(i) for i in range(len(index))]
+    index.close()
+    ttfb = []
+    for i, url in enumerate(urls):
+        service.i2s.capture = bytearray()
+        t0 = time.perf_counter()
+        handle = service.play_http_wav(url)
+        while not service.i2s.capture and handle.state != PlaybackHandle.STOPPED:
+            await asyncio.sleep_ms(2)
+        ttfb.append(int((time.perf_counter() - t0) * 1000))
+        while handle.state != PlaybackHandle.STOPPED:
+            await asyncio.sleep_ms(10)
+        await asyncio.sleep_ms(20)
+        check("track {} played in full".format(i), len(service.i2s.capture) == len(tracks[i]) - 44)
+    check("playlist and tracks on one connection", srv.connections == 1,
+          "{} connections, time to first byte {} ms".format(srv.connections, ttfb))
+
+    # Large playlists: streamed through the parsers into the index, in
+    # small chunks so every entry is likely split somewhere.
+    body, m3u, want = big_playlists(srv, 3000)
+    srv.routes["/big.json"] = ("chunked", body)
+    srv.routes["/big.m3u"] = ("length", m3u)
+    for path in ("/big.json", "/big.m3u"):
+        got, ms = await fetch_index(srv.url(path))
+        check("{} indexed".format(path[1:]), got == want,
+              "{} of {} entries, {} KB body, {} ms".format(
+                  len(got), len(want), len(srv.routes[path][1]) // 1024, ms))
+
+    # Interrupt a track with an inserted clip; the resume must ask for the
+    # rest of the data only.
+    srv.routes["/long.wav"] = ("length", make_wav(3))
+    srv.routes["/plain.wav"] = ("norange", srv.routes["/long.wav"][1])
+    long_wav = srv.routes["/long.wav"][1]
+    I2S.SPEED = 2
+    srv.ranges = []
+    handle = service.play_http_wav(srv.url("/long.wav"))
+    await asyncio.sleep(0.4)
+    clip = service.play_files(["res/wav/1.wav"], emerge=True)
+    while clip.state != PlaybackHandle.STOPPED:
+        await asyncio.sleep_ms(10)
+    while handle.state != PlaybackHandle.STOPPED:
+        await asyncio.sleep_ms(10)
+    src = handle.source_list[0]
+    check("insert resume used a range request", len(srv.ranges) == 1 and src.discarded == 0,
+          "ranges {}".format(srv.ranges))
+    resumed_at = srv.ranges[0][1] if srv.ranges else 0
+    check("resume offset is inside the data, frame aligned",
+          44 < resumed_at < len(long_wav) and (resumed_at - 44) % 4 == 0)
+
+    # Skip ahead with a known header, on a server with and without ranges.
+    for path, ranged in (("/long.wav", True), ("/plain.wav", False)):
+        srv.ranges = []
+        service.i2s.capture = bytearray()
+        offset = 64000
+        handle = service.play_http_wav(srv.url(path), offset_bytes=offset, info=src.info)
+        while handle.state != PlaybackHandle.STOPPED:
+            await asyncio.sleep_ms(10)
+        await asyncio.sleep_ms(20)
+        s2 = handle.source_list[0]
+        got = bytes(service.i2s.capture)
+        want = long_wav[44 + offset:]
+        check("skip ahead {}".format("with range" if ranged else "by discarding"),
+              len(got) == len(want) and s2.discarded == (0 if ranged else 44 + offset),
+              "{} B played, {} discarded".format(len(got), s2.discarded))
+
+    # Gapless playlist through NetPlayerApp.
+    from machine import Pin, SPI
+    from gui.core.gui import Display
+    from sim.display import SimST7789
+    from app_context import set_audio
+    import net_player_app
+
+    Display(SimST7789(SPI(2), 240, 240, dc=Pin(39), rotation=1))
+    set_audio(service)
+    app = net_player_app.NetPlayerApp()
+    app.set_timer = app.cancel_timer = lambda *args, **kw: None
+    songs = [make_wav(1.5, freq=300 + 100 * i) for i in range(3)]
+    for i, wav in enumerate(songs):
+        srv.routes["/s{}.wav".format(i)] = ("length", wav)
+    urls = [srv.url("/s{}.wav".format(i)) for i in range(3)]
+    want = b"".join(w[44:] for w in songs)
+    I2S.SPEED = 1
+    srv.ttfb_ms = ttfb_ms
+    service.PREFETCH_MS = 1000
+    for prefetch in (False, True):
+        got, dry, followed, ms = await play_playlist(service, app, urls, prefetch)
+        name = "prefetch" if prefetch else "per-track handles"
+        print("{:<18} {} B, {} underruns, {} ms for {} ms of audio, tracks {}".format(
+            name, len(got), dry, ms, len(want) * 1000 // 64000, followed))
+        if prefetch:
+            # Only the first track fades in; everything after is bit-exact.
+            fade = service.sample_rate * service.FADE_MS // 1000 * 4
+            check("gapless playlist is bit-exact and never ran dry",
+                  len(got) == len(want) and got[fade:] == want[fade:] and dry == 1)
+            check("selection followed the playing track", followed == [0, 1, 2] and not app.playing)
+    srv.ttfb_ms = 0
+
+    # A key click while a stream plays is mixed in: no stop, no reconnect.
+    from input_keys import GPIO_KEY_NEXT, KEY_S_PRESSED
+    effects = []
+    play_effect = service.play_effect
+
+    def logged_effect(*args, **kwargs):
+        effects.append(play_effect(*args, **kwargs))
+        return effects[-1]
+    service.play_effect = logged_effect
+    srv.ranges = []
+    handle = service.play_http_wav(srv.url("/long.wav"))
+    await asyncio.sleep(0.4)
+    app.on_input(GPIO_KEY_NEXT, KEY_S_PRESSED)
+    while effects and effects[0].state != PlaybackHandle.STOPPED:
+        await asyncio.sleep_ms(10)
+    check("key click mixed into the stream without a reconnect",
+          len(effects) == 1 and effects[0].mode == PlaybackHandle.MODE_MIX
+          and handle.state == PlaybackHandle.PLAYING and srv.ranges == [],
+          "{} effects, stream state {}, ranges {}".format(len(effects), handle.state, srv.ranges))
+    service.play_effect = play_effect
+    service.stop_handle(handle)
+    while handle.state != PlaybackHandle.STOPPED:
+        await asyncio.sleep_ms(10)
+
+    print("pool:", http_pool.stats())
+    await http_pool.close_all()
+    await srv.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--connect-ms", type=int, default=200, help="delay per accepted connection")
+    p.add_argument("--ttfb-ms", type=int, default=800, help="delay per response in the playlist test")
+    a = p.parse_args()
+    asyncio.run(run(a.connect_ms, a.ttfb_ms))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,407 @@
+"""
+SD library scan check on the host.
+
+    python tools/library_check.py
+    python tools/library_check.py --files 600 --sd-ms 3
+
+Builds a temporary SD card with --files WAVs spread over nested folders,
+mounts it at /sd through the simulator and adds --sd-ms of blocking
+latency to every open/stat/listdir on the card, standing in for SPI SD
+access. It compares the old synchronous scan (listdir of /sd and /sd/wav
+plus a stat and sidecar lookup per file) with WavLibrary, while a ticker
+task measures the longest time the event loop was blocked, i.e. how long
+the UI would freeze. It then checks that a second scan reads no headers
+and does not rewrite the index, and that an added, a resized and a
+removed file are picked up with one header read each.
+
+A second card holds headers at the edges of the index records: a 96 kHz
+WAV, one whose LIST chunk puts the audio past 64 KiB, and one whose
+header can't be stored at all, which must be listed without a header
+while the scan goes on and completes.
+
+Last, a --big card (5000 files by default) is scanned without latency
+and the heap is measured: the peak while scanning (cold, then again
+against the old list) and what the player keeps for its track list,
+both compared with the old in-RAM list of paths and WavInfo objects,
+while paging through every track and looking up paths.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+import argparse
+import builtins
+import shutil
+import struct
+import tempfile
+import time
+import tracemalloc
+
+import json
+
+import uasyncio as asyncio
+
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+from audio_benchmark import make_wav
+from audio_sources.wav import WavInfo, read_wav_info_sized
+
+failures = 0
+
+
+def check(name, ok, detail=""):
+    global failures
+    if not ok:
+        failures += 1
+    print("{} {}{}".format("ok  " if ok else "FAIL", name, (" - " + detail) if detail else ""))
+
+
+def make_card(n, seconds=0.05):
+    root = tempfile.mkdtemp(prefix="sd")
+    wav = make_wav(seconds)
+    dirs = ["", "wav", "wav/albums/a", "wav/albums/b", "music"]
+    for d in dirs:
+        os.makedirs(os.path.join(root, d), exist_ok=True)
+    for i in range(n):
+        d = dirs[i % len(dirs)]
+        with open(os.path.join(root, d, "t{:04d}.wav".format(i)), "wb") as f:
+            f.write(wav)
+    with open(os.path.join(root, "readme.txt"), "w") as f:
+        f.write("not audio")
+    return root
+
+
+def make_list_wav(list_bytes, seconds=0.01):
+    """make_wav() with a LIST chunk of `list_bytes` between fmt and data."""
+    wav = make_wav(seconds)
+    fmt_end = 12 + 8 + 16
+    body = wav[fmt_end:]
+    riff = struct.unpack_from("<I", wav, 4)[0] + 8 + list_bytes
+    return (wav[:4] + struct.pack("<I", riff) + wav[8:fmt_end] + b"LIST" + struct.pack("<I", list_bytes)
+            + bytes(list_bytes) + body)
+
+
+def add_sd_latency(ms):
+    """Blocking delay per card access, like SD over SPI on the device."""
+    def slow(fn):
+        def f(path, *args, **kwargs):
+            if isinstance(path, str) and path.startswith("/sd"):
+                time.sleep(ms / 1000)
+            return fn(path, *args, **kwargs)
+        return f
+    builtins.open = slow(builtins.open)
+    os.stat = slow(os.stat)
+    os.listdir = slow(os.listdir)
+    os.ilistdir = slow(os.ilistdir)
+
+
+class Ticker:
+    """Longest gap between event loop turns while running."""
+
+    def __init__(self):
+        self.max_gap = 0
+        self._run = True
+
+    async def run(self):
+        last = time.perf_counter()
+        while self._run:
+            await asyncio.sleep_ms(1)
+            now = time.perf_counter()
+            self.max_gap = max(self.max_gap, now - last)
+            last = now
+
+    def stop(self):
+        self._run = False
+
+
+class WavIndex:
+    """
+    Per-directory sidecar of parsed WAV headers, as the player kept them
+    before WavLibrary.
+
+    Entries are keyed by file name and validated by file size, so a file
+    that was replaced is parsed again. save() only writes when something
+    changed.
+    """
+    NAME = ".wavindex.json"
+
+    def __init__(self, directory):
+        self.path = directory.rstrip("/") + "/" + self.NAME
+        self._entries = {}
+        self._dirty = False
+        try:
+            with open(self.path, "r") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def get(self, path):
+        """WavInfo for `path`, parsing and recording it on a miss; None if unreadable."""
+        name = path.split("/")[-1]
+        try:
+            size = os.stat(path)[6]
+        except OSError:
+            return None
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == size:
+            return WavInfo.from_list(entry[1:])
+        try:
+            info = read_wav_info_sized(path, size)
+        except (OSError, ValueError) as e:
+            print("[WavIndex] {}: {}".format(path, e))
+            return None
+        self._entries[name] = [size] + info.to_list()
+        self._dirty = True
+        return info
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            with open(self.path, "w") as f:
+                json.dump(self._entries, f)
+            self._dirty = False
+        except OSError as e:
+            print("[WavIndex] save error:", e)
+
+
+def old_scan():
+    # What PlayerApp.on_enter did before the library: all on the UI task.
+    files = []
+    for base in ("/sd", "/sd/wav"):
+        for name in os.listdir(base):
+            if name.lower().endswith(".wav"):
+                files.append(base + "/" + name)
+    files.sort()
+    indexes = {}
+    for f in files:
+        base = f.rsplit("/", 1)[0]
+        idx = indexes.get(base)
+        if idx is None:
+            idx = indexes[base] = WavIndex(base)
+        idx.get(f)
+    for idx in indexes.values():
+        idx.save()
+    return files
+
+
+async def timed(fn):
+    ticker = Ticker()
+    task = asyncio.create_task(ticker.run())
+    await asyncio.sleep_ms(5)
+    t0 = time.perf_counter()
+    result = await fn()
+    dt = time.perf_counter() - t0
+    ticker.stop()
+    await task
+    return result, int(dt * 1000), int(ticker.max_gap * 1000)
+
+
+async def library_scan(lib):
+    batches = []
+
+    def emit(items, done):
+        batches.append((len(items), done))
+
+    parsed = lib.parsed
+    await lib.scan(emit)
+    return batches, lib.parsed - parsed
+
+
+def sim_path(path):
+    from sim import vfs
+    return vfs.map_path(path)
+
+
+async def run(n, sd_ms):
+    from sim import vfs
+    from wav_library import WavLibrary
+
+    card = make_card(n)
+    vfs.register("/sd", card, mounted=True)
+    add_sd_latency(sd_ms)
+    try:
+        async def old():
+            return old_scan()
+        files, ms, gap = await timed(old)
+        print("old scan        {:5d} files {:6d} ms, UI blocked up to {:5d} ms (only /sd and /sd/wav)".format(
+            len(files), ms, gap))
+        # Cold library scan, no index yet.
+        lib = WavLibrary("/sd")
+        (batches, parsed), ms, gap = await timed(lambda: library_scan(lib))
+        tracks = lib.tracks()
+        found = len(tracks)
+        tracks.close()
+        print("library cold    {:5d} files {:6d} ms, UI blocked up to {:5d} ms, {} updates, {} parsed".format(
+            found, ms, gap, len(batches), parsed))
+        check("every wav found, subfolders included", found == n)
+        check("results streamed before the walk ended", len(batches) > 2 and batches[0][1] is False)
+        check("UI never blocked for long", gap < 20 * sd_ms + 50, "{} ms".format(gap))
+
+        # Warm: a fresh object (like after a reboot) opens the index.
+        lib = WavLibrary("/sd")
+        tracks = lib.tracks()
+        check("index opens before the walk", tracks is not None and len(tracks) == n)
+        tracks.close()
+        t_index = os.path.getmtime(sim_path(lib.base + ".json"))
+        (batches, parsed), ms, gap = await timed(lambda: library_scan(lib))
+        print("library warm    {:5d} files {:6d} ms, UI blocked up to {:5d} ms".format(n, ms, gap))
+        check("unchanged card reads no headers", parsed == 0)
+        check("unchanged card does not rewrite the index",
+              lib.written == 0 and os.path.getmtime(sim_path(lib.base + ".json")) == t_index)
+
+        # Add, resize and remove one file each.
+        with open(os.path.join(card, "music", "new.wav"), "wb") as f:
+            f.write(make_wav(0.1))
+        with open(os.path.join(card, "wav", "t0001.wav"), "wb") as f:
+            f.write(make_wav(0.2))
+        os.remove(os.path.join(card, "t0000.wav"))
+        (batches, parsed), ms, gap = await timed(lambda: library_scan(lib))
+        tracks = lib.tracks()
+        files = dict((tracks.path(i), tracks.info(i)) for i in range(len(tracks)))
+        tracks.close()
+        check("changes picked up with one header read each", parsed == 2, "{} parsed".format(parsed))
+        check("added file listed", "/sd/music/new.wav" in files)
+        check("removed file dropped", "/sd/t0000.wav" not in files and len(files) == n)
+        info = files.get("/sd/wav/t0001.wav")
+        check("resized file has its new length", info is not None and info.data_len == 0.2 * 64000)
+        check("new files posted while scanning", sum(b[0] for b in batches if not b[1]) == 2)
+    finally:
+        vfs.umount("/sd")
+        shutil.rmtree(card)
+
+
+async def run_headers():
+    from sim import vfs
+    import wav_library
+    from wav_library import WavLibrary
+
+    card = tempfile.mkdtemp(prefix="sd")
+    with open(os.path.join(card, "a_96k.wav"), "wb") as f:
+        f.write(make_wav(0.01, rate=96000))
+    with open(os.path.join(card, "b_list.wav"), "wb") as f:
+        f.write(make_list_wav(70000))
+    with open(os.path.join(card, "c_huge.wav"), "wb") as f:
+        f.write(make_wav(0.01))
+    with open(os.path.join(card, "d_plain.wav"), "wb") as f:
+        f.write(make_wav(0.01))
+    vfs.register("/sd", card, mounted=True)
+
+    # A header the records can't hold (a data length past 4 GiB).
+    real = wav_library.read_wav_info_sized
+
+    def reader(path, size):
+        info = real(path, size)
+        if path.endswith("c_huge.wav"):
+            info.data_len = 1 << 32
+        return info
+
+    wav_library.read_wav_info_sized = reader
+    try:
+        lib = WavLibrary("/sd")
+        batches, _ = await library_scan(lib)
+        check("scan completes past a header the index can't hold", batches and batches[-1][1] is True)
+        lib = WavLibrary("/sd")
+        tracks = lib.tracks()
+        info = dict((tracks.path(i), tracks.info(i)) for i in range(len(tracks)))
+        tracks.close()
+        hi = info.get("/sd/a_96k.wav")
+        check("96 kHz rate kept", hi is not None and hi.rate == 96000 and hi.channels == 2,
+              repr(hi))
+        big = info.get("/sd/b_list.wav")
+        check("data offset past 64 KiB kept", big is not None and big.data_offset == 70052
+              and big.data_len == 0.01 * 64000, repr(big))
+        check("unstorable header listed without info", "/sd/c_huge.wav" in info and info["/sd/c_huge.wav"] is None)
+        check("files after it indexed", info.get("/sd/d_plain.wav") is not None)
+    finally:
+        wav_library.read_wav_info_sized = real
+        vfs.umount("/sd")
+        shutil.rmtree(card)
+
+
+async def run_big(n):
+    from sim import vfs
+    from wav_library import WavLibrary
+
+    card = make_card(n, seconds=0.002)
+    vfs.register("/sd", card, mounted=True)
+    try:
+        lib = WavLibrary("/sd")
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        await lib.scan(lambda items, done: None)
+        scan_peak = tracemalloc.get_traced_memory()[1] - base
+
+        # Rescan against the old list with a change near the start, so the
+        # whole list is compared and rewritten.
+        with open(os.path.join(card, "t0000.wav"), "ab") as f:
+            f.write(bytes(4))
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        await lib.scan(lambda items, done: None)
+        rescan_peak = tracemalloc.get_traced_memory()[1] - base
+
+        # What the player keeps: the open TrackList with its page cache.
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        tracks = lib.tracks()
+        paths = []
+        for i in range(len(tracks)):
+            if i % 97 == 0:
+                paths.append(tracks.path(i))
+            tracks.info(i)
+        kept = tracemalloc.get_traced_memory()[0] - base - sys.getsizeof(paths) - sum(map(sys.getsizeof, paths))
+        view_peak = tracemalloc.get_traced_memory()[1] - base
+        t0 = time.perf_counter()
+        found = all(tracks.path(tracks.find(p)) == p for p in paths)
+        find_us = (time.perf_counter() - t0) * 1e6 / len(paths)
+        count = len(tracks)
+        tracks.close()
+
+        # The old model: every path and WavInfo in RAM.
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        tracks = lib.tracks()
+        files = [tracks.path(i) for i in range(len(tracks))]
+        wav_info = dict((f, tracks.info(i)) for i, f in enumerate(files))
+        total = dict((f, wav_info[f].data_len) for f in files)
+        tracks.close()
+        old_kept = tracemalloc.get_traced_memory()[0] - base
+        del files, wav_info, total
+        tracemalloc.stop()
+
+        print("big library     {:5d} files, scan peak {} KB (rescan {} KB), track list keeps {} KB "
+              "(peak {} KB paging all), old lists {} KB, find {:.0f} us".format(
+                  count, scan_peak // 1024, rescan_peak // 1024, kept // 1024, view_peak // 1024,
+                  old_kept // 1024, find_us))
+        check("big library indexed", count == n)
+        check("scan peak is a fraction of the old lists", max(scan_peak, rescan_peak) * 4 < old_kept)
+        check("path lookups", found)
+        check("track list keeps a fraction of the old lists", kept * 20 < old_kept)
+    finally:
+        vfs.umount("/sd")
+        shutil.rmtree(card)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--files", type=int, default=400)
+    p.add_argument("--sd-ms", type=float, default=2, help="blocking latency per SD access")
+    p.add_argument("--big", type=int, default=5000, help="files in the heap check, 0 to skip")
+    a = p.parse_args()
+    asyncio.run(run(a.files, a.sd_ms))
+    asyncio.run(run_headers())
+    if a.big:
+        asyncio.run(run_big(a.big))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
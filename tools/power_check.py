@@ -0,0 +1,245 @@
+"""
+Power manager check on the host, on the simulated clock.
+
+    python tools/power_check.py
+
+Runs AppManager with a test app, the ButtonManager on pin IRQs and the
+power manager. machine.lightsleep advances the simulated ticks instead
+of sleeping (sim.clock.virtual_sleep), so minutes of idle run at once:
+- idle with no app timers: the backlight dims and turns off on time, and
+  the CPU is in light sleep for almost all of it;
+- a key press while the screen is off wakes it and is not delivered to the
+  app, and the next press is;
+- a press of any key in the middle of a light sleep (sim.clock.at) ends
+  the sleep at once;
+- an app with a 500 ms timer still gets every tick, and sleeps in between;
+- while a busy check (audio playing) holds, it never sleeps;
+- an app with keep_screen_on keeps the backlight on;
+- with the BLE keyboard switched off, its scans keep their backoff
+  schedule while the CPU sleeps in between, and it reconnects within one
+  retry period of the keyboard coming back.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+import tempfile
+import time
+
+os.chdir(tempfile.mkdtemp())    # config.json of this run
+
+import aioble
+import uasyncio as asyncio
+
+import ble_keyboard
+from button_manager import ButtonManager
+from config import config
+from input_keys import KEY_S_PRESSED, KEY_S_RELEASED
+from machine import PWM, Pin
+from manager import AppManager, PopApp, launch, exit_app, send_input_event
+from power_manager import BL_DIM, BL_FULL, BL_OFF, power
+from sim import clock
+from utils import trace
+
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+from ble_replay import DEFAULT as BLE_RECORDING, load, make_peer
+
+KEY_PIN = 21
+KEY_PINS = (KEY_PIN, 22, 23)
+BL_PIN = 38
+DIM_S = 20
+OFF_S = 21
+failures = 0
+
+
+def check(name, ok, detail=""):
+    global failures
+    if not ok:
+        failures += 1
+    print("{} {}{}".format("ok  " if ok else "FAIL", name, (" - " + detail) if detail else ""))
+
+
+class TestApp(PopApp):
+    def __init__(self):
+        super().__init__()
+        self.inputs = []
+        self.ticks = 0
+
+    def on_input(self, key, status):
+        self.inputs.append((key, status))
+
+    def on_timer(self, timer_id):
+        self.ticks += 1
+
+
+class ScoreLikeApp(PopApp):
+    keep_screen_on = True
+
+
+def on_button(evt):
+    if evt["state"] in ("pressed", "released"):
+        send_input_event(evt["pin"], KEY_S_PRESSED if evt["state"] == "pressed" else KEY_S_RELEASED)
+
+
+async def until(ms):
+    # Wait for the simulated ticks to pass `ms`.
+    while time.ticks_diff(ms, time.ticks_ms()) > 0:
+        await asyncio.sleep_ms(2)
+
+
+async def tap():
+    Pin.drive(KEY_PIN, 0)
+    await asyncio.sleep_ms(80)
+    Pin.drive(KEY_PIN, 1)
+    await asyncio.sleep_ms(80)
+
+
+def backlight():
+    if BL_PIN in PWM.active:
+        return BL_DIM
+    return BL_FULL if Pin(BL_PIN).value() else BL_OFF
+
+
+async def scenario(app, busy):
+    steps = []
+    orig = power._set_backlight
+
+    def logged(level):
+        steps.append((time.ticks_ms(), level))
+        orig(level)
+    power._set_backlight = logged
+
+    # 1. Idle for ten minutes.
+    t0 = time.ticks_ms()
+    power._last_input = t0
+    s0, ms0 = power.sleeps, power.slept_ms
+    await until(time.ticks_add(t0, 600000))
+    elapsed = time.ticks_diff(time.ticks_ms(), t0)
+    asleep = (power.slept_ms - ms0) / elapsed
+    print("idle 10 min: {} sleeps, asleep {:.2%} of the time, backlight steps {}".format(
+        power.sleeps - s0, asleep, [(time.ticks_diff(t, t0), l) for t, l in steps]))
+    dim_at = [time.ticks_diff(t, t0) for t, l in steps if l == BL_DIM]
+    off_at = [time.ticks_diff(t, t0) for t, l in steps if l == BL_OFF]
+    check("backlight dims on time", dim_at and DIM_S * 1000 <= dim_at[0] <= DIM_S * 1000 + 100, str(dim_at))
+    check("backlight turns off on time", off_at and OFF_S * 1000 <= off_at[0] <= OFF_S * 1000 + 100, str(off_at))
+    check("backlight pin off", backlight() == BL_OFF)
+    check("asleep most of the idle time", asleep > 0.95, "{:.2%}".format(asleep))
+
+    # 2. A key while the screen is off.
+    app.inputs = []
+    await tap()
+    check("waking key turns the backlight on", backlight() == BL_FULL)
+    check("waking key not delivered", app.inputs == [], str(app.inputs))
+    await tap()
+    check("next key delivered", app.inputs == [(KEY_PIN, KEY_S_PRESSED), (KEY_PIN, KEY_S_RELEASED)],
+          str(app.inputs))
+
+    # 3. Any key wakes the CPU from the middle of a light sleep.
+    late = []
+    for pin in KEY_PINS:
+        await asyncio.sleep_ms(100)
+        app.inputs = []
+        s0 = power.sleeps
+        at = time.ticks_add(time.ticks_ms(), 3000)
+        clock.at(at, lambda pin=pin: Pin.drive(pin, 0))
+        while not app.inputs and time.ticks_diff(time.ticks_ms(), at) < 30000:
+            clock.run_due()
+            await asyncio.sleep_ms(2)
+        late.append((pin, time.ticks_diff(time.ticks_ms(), at), power.sleeps > s0))
+        Pin.drive(pin, 1)
+    check("any key ends a light sleep", all(ms <= 20 and slept for _, ms, slept in late),
+          "(pin, ms late, slept) {}".format(late))
+
+    # 4. A 500 ms app timer for a minute.
+    app.set_timer(1, 500, repeat=True)
+    t0 = time.ticks_ms()
+    app.ticks = 0
+    s0 = power.sleeps
+    await until(time.ticks_add(t0, 60000))
+    app.cancel_timer(1)
+    got = app.ticks
+    want = time.ticks_diff(time.ticks_ms(), t0) // 500
+    check("timer ticks kept while sleeping between them", abs(got - want) <= 1,
+          "{} ticks in {} ms".format(got, time.ticks_diff(time.ticks_ms(), t0)))
+    check("slept between ticks", power.sleeps - s0 >= got - 2, "{} sleeps".format(power.sleeps - s0))
+
+    # 5. Busy (audio playing): no light sleep.
+    busy[0] = True
+    s0 = power.sleeps
+    await asyncio.sleep_ms(1500)
+    check("no sleep while busy", power.sleeps == s0)
+    busy[0] = False
+
+    # 6. keep_screen_on.
+    await tap()
+    launch(ScoreLikeApp())
+    await asyncio.sleep_ms(20)
+    t0 = time.ticks_ms()
+    await until(time.ticks_add(t0, (OFF_S + 30) * 1000))
+    check("keep_screen_on app keeps the backlight on", backlight() == BL_FULL)
+
+    # 7. The BLE keyboard is off, with a score game up: five minutes of
+    # reconnect attempts, then the keyboard comes back.
+    peer = make_peer(load(BLE_RECORDING)[0], (1, 2))[0]
+    peer.advertising = False
+    ble_keyboard.SCAN_MS = 200
+    scans = []
+    scan = aioble.scan
+
+    def logged_scan(*args, **kwargs):
+        scans.append(time.ticks_ms())
+        return scan(*args, **kwargs)
+    aioble.scan = logged_scan
+    ble_keyboard.start(lambda kind, data: None)
+    t0 = time.ticks_ms()
+    ms0 = power.slept_ms
+    await until(time.ticks_add(t0, 300000))
+    elapsed = time.ticks_diff(time.ticks_ms(), t0)
+    asleep = (power.slept_ms - ms0) / elapsed
+    gap = max(time.ticks_diff(b, a) for a, b in zip(scans, scans[1:])) if len(scans) > 1 else elapsed
+    print("keyboard off 5 min: {} scans, longest gap {} ms, asleep {:.2%} of the time".format(
+        len(scans), gap, asleep))
+    check("keyboard off: scans keep their backoff", gap <= ble_keyboard.RETRY_MAX_MS + 1000, "{} ms".format(gap))
+    check("keyboard off: asleep between scans", asleep > 0.9, "{:.2%}".format(asleep))
+    peer.advertising = True
+    t0 = time.ticks_ms()
+    while not ble_keyboard.connected() and time.ticks_diff(time.ticks_ms(), t0) < 2 * ble_keyboard.RETRY_MAX_MS:
+        await asyncio.sleep_ms(20)
+    dt = time.ticks_diff(time.ticks_ms(), t0)
+    check("keyboard back: reconnected within a retry period",
+          ble_keyboard.connected() and dt <= ble_keyboard.RETRY_MAX_MS + 1000, "{} ms".format(dt))
+    aioble.scan = scan
+    exit_app()
+    power._set_backlight = orig
+    AppManager.instance().stop()
+
+
+async def main():
+    clock.virtual_sleep = True
+    trace.set_level(trace.DEBUG_INFO | trace.DEBUG_ERROR)
+    config.set("screen_dim_s", DIM_S)
+    config.set("screen_off_s", OFF_S)
+    for pin in KEY_PINS:
+        Pin.drive(pin, 1)
+    buttons = ButtonManager(KEY_PINS, callback=on_button)
+    buttons.start()
+    busy = [False]
+    power.setup(backlight=BL_PIN, buttons=buttons, checks=(lambda: busy[0], ble_keyboard.busy),
+                deadlines=(ble_keyboard.next_retry_ms,))
+    app = TestApp()
+    task = asyncio.create_task(scenario(app, busy))
+    await AppManager.instance().run(app)
+    await task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,156 @@
+"""
+Resume store check on the host.
+
+    python tools/resume_check.py
+
+Exercises apps/resume_store.py against a temporary log file:
+- positions survive a reload (a new store replays the log);
+- a record cut short by a power loss is ignored;
+- set() only writes on flush(), and the log is compacted before it grows
+  past COMPACT_RECORDS;
+- at most MAX_ENTRIES keys are kept, least recently used first out.
+
+It then plays a WAV through AudioService with the handle tracked, stops
+it halfway and checks that the flushed position resumes there, and that
+playing to the end forgets the position. Last, it prints the flash bytes
+written for an hour of 500 ms position ticks, flushed every FLUSH_MS,
+next to rewriting config.json on every tick.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+import json
+import tempfile
+
+import uasyncio as asyncio
+
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+from audio_benchmark import make_wav
+from resume_store import ResumeStore
+
+failures = 0
+
+
+def check(name, ok, detail=""):
+    global failures
+    if not ok:
+        failures += 1
+    print("{} {}{}".format("ok  " if ok else "FAIL", name, (" - " + detail) if detail else ""))
+
+
+def store_checks(tmp):
+    path = os.path.join(tmp, "resume.log")
+    s = ResumeStore(path)
+    s.set("/sd/a.wav", 1000)
+    s.set("/sd/b.wav", 2000)
+    s.set("/sd/a.wav", 3000)
+    check("nothing written before flush", not os.path.exists(path))
+    s.flush()
+    s.clear("/sd/b.wav")
+    s.set("http://host/c.wav", 4096)
+    s.flush()
+    r = ResumeStore(path)
+    check("positions survive a reload", (r.get("/sd/a.wav"), r.get("/sd/b.wav"), r.get("http://host/c.wav"))
+          == (3000, 0, 4096))
+    check("one append per flush", s.flushes == 2 and os.path.getsize(path) == 5 * 8)
+
+    # Power lost halfway through a record.
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")
+    r = ResumeStore(path)
+    check("torn record ignored", r.get("/sd/a.wav") == 3000 and r.get("http://host/c.wav") == 4096)
+
+    # Long use: the log stays bounded.
+    s = ResumeStore(path)
+    biggest = 0
+    for i in range(2000):
+        s.set("/sd/t{}.wav".format(i % 10), 1000 + i)
+        if i % 3 == 0:
+            s.flush()
+            biggest = max(biggest, os.path.getsize(path))
+    s.flush()
+    r = ResumeStore(path)
+    check("log compacted", s.compactions > 0 and biggest <= ResumeStore.COMPACT_RECORDS * 8,
+          "{} compactions, log at most {} B".format(s.compactions, biggest))
+    check("compacted log has the latest positions", all(r.get("/sd/t{}.wav".format(k)) == 1000 + 1990 + k
+                                                        for k in range(10)))
+
+    # LRU bound.
+    s = ResumeStore(os.path.join(tmp, "lru.log"), max_entries=8)
+    for i in range(8):
+        s.set("/sd/l{}.wav".format(i), 100 + i)
+    s.get("/sd/l0.wav")                       # recently used again
+    for i in range(8, 12):
+        s.set("/sd/l{}.wav".format(i), 100 + i)
+    s.flush()
+    r = ResumeStore(s.path, max_entries=8)
+    kept = [i for i in range(12) if s.get("/sd/l{}.wav".format(i))]
+    check("entry count bounded, least recently used dropped", kept == [0] + list(range(5, 12)), str(kept))
+    r.get("/sd/l0.wav")
+    check("reload keeps the bound", len(r._entries) == 8)
+
+
+async def handle_checks(tmp):
+    from audio_service import AudioService, PlaybackHandle
+    from machine import I2S
+
+    I2S.SPEED = 8
+    wav_path = os.path.join(tmp, "song.wav")
+    with open(wav_path, "wb") as f:
+        f.write(make_wav(2))
+    store = ResumeStore(os.path.join(tmp, "handles.log"))
+    service = AudioService()
+    service.start()
+
+    handle = service.play_file(wav_path)
+    store.track(wav_path, handle)
+    while handle.bytes_played < 64000:
+        await asyncio.sleep_ms(5)
+    store.flush()                           # e.g. the player went to the background
+    service.stop_fg()
+    await asyncio.sleep_ms(20)
+    saved = ResumeStore(store.path).get(wav_path)
+    check("tracked position flushed", 64000 <= saved < 128000, "{} B".format(saved))
+
+    handle = service.play_file(wav_path, offset_bytes=saved)
+    store.track(wav_path, handle)
+    while handle.state != PlaybackHandle.STOPPED:
+        await asyncio.sleep_ms(10)
+    store.flush()
+    check("played to the end forgets the position", ResumeStore(store.path).get(wav_path) == 0)
+
+
+def write_volume():
+    # An hour of playback with the position updated on every 500 ms tick.
+    ticks = 3600 * 2
+    cfg = dict(volume=10, players=["Ciya", "Qiang"], player_loop_mode=2, net_buffer_kb=32)
+    config_bytes = 0
+    for i in range(ticks):
+        cfg["resume"] = {"/sd/wav/some/track.wav": i * 32000}
+        config_bytes += len(json.dumps(cfg))
+    flushes = ticks * 500 // ResumeStore.FLUSH_MS
+    log_bytes = flushes * 8
+    print("an hour of position ticks: config.json rewrite {} KB in {} writes, resume log {} B in {} appends".format(
+        config_bytes // 1024, ticks, log_bytes, flushes))
+    check("log writes a fraction of the config rewrites", log_bytes * 100 < config_bytes)
+
+
+def main():
+    tmp = tempfile.mkdtemp()
+    store_checks(tmp)
+    asyncio.run(handle_checks(tmp))
+    write_volume()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Trace module check on the host.
+
+    python tools/trace_check.py
+
+Exercises utils/trace.py:
+- a log() below the console and ring levels prints nothing and never
+  builds its text (callable messages are not called);
+- levels are per category;
+- the ring keeps the last RING_RECORDS records with their integer
+  arguments, oldest first, and crash() writes it to a file;
+- Screen.show() at the default device levels prints nothing.
+Last, it times a disabled log() against the old eager f-string dprint.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import sim
+
+sim.install()
+
+import contextlib
+import io
+import tempfile
+import time
+
+from utils import trace
+from utils.trace import CAT_AUDIO, CAT_GUI, DEBUG_DBG, DEBUG_ERROR, DEBUG_INFO
+
+failures = 0
+
+
+def check(name, ok, detail=""):
+    global failures
+    if not ok:
+        failures += 1
+    print("{} {}{}".format("ok  " if ok else "FAIL", name, (" - " + detail) if detail else ""))
+
+
+def captured(fn):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        fn()
+    return out.getvalue()
+
+
+def check_levels():
+    trace.set_level(DEBUG_INFO | DEBUG_ERROR)
+    trace.clear()
+    called = []
+
+    def text():
+        called.append(1)
+        return "costly"
+
+    out = captured(lambda: trace.log(CAT_GUI, DEBUG_DBG, text, 1, 2))
+    check("disabled level prints nothing", out == "", repr(out))
+    check("disabled level does not build the text", not called)
+    check("disabled level is not in the ring", trace.records() == [])
+
+    out = captured(lambda: trace.log(CAT_GUI, DEBUG_INFO, text, 1, 2))
+    check("enabled level prints", "gui: costly 1 2" in out, repr(out))
+
+    trace.set_level(DEBUG_ERROR, CAT_AUDIO)
+    out = captured(lambda: (trace.log(CAT_AUDIO, DEBUG_INFO, "audio info"),
+                            trace.log(CAT_GUI, DEBUG_INFO, "gui info")))
+    check("levels are per category", "audio info" not in out and "gui info" in out, repr(out))
+    check("ring keeps what the console drops", [r[3] for r in trace.records()][-2:] == ["audio info", "gui info"])
+    trace.set_level(DEBUG_INFO | DEBUG_ERROR)
+
+
+def check_ring():
+    trace.set_level(trace.DEBUG_NONE)
+    trace.clear()
+    n = trace.RING_RECORDS + 10
+    for i in range(n):
+        trace.log(CAT_AUDIO, DEBUG_INFO, "chunk", i, i * 2, -i, "not an int")
+    recs = trace.records()
+    check("ring holds RING_RECORDS", len(recs) == trace.RING_RECORDS, str(len(recs)))
+    check("ring is oldest first", recs[0][4][0] == 10 and recs[-1][4][0] == n - 1,
+          "{} .. {}".format(recs[0][4], recs[-1][4]))
+    check("ring keeps integer arguments", recs[-1][1:] == ("audio", DEBUG_INFO, "chunk", (n - 1, 2 * n - 2, 1 - n, 0)),
+          str(recs[-1]))
+
+    path = os.path.join(tempfile.mkdtemp(), "crash.log")
+    try:
+        raise ValueError("boom")
+    except ValueError as e:
+        captured(lambda: trace.crash(e, path))
+    with open(path) as f:
+        text = f.read()
+    lines = text.splitlines()
+    check("crash() saves the exception and the ring", "boom" in lines[0] and "--- trace ring ---" in text
+          and lines[-1].endswith("audio: chunk {} {} {} 0".format(n - 1, 2 * n - 2, 1 - n)), lines[-1])
+    trace.set_level(DEBUG_INFO | DEBUG_ERROR)
+
+
+def check_screen():
+    from machine import Pin, SPI
+    from sim.display import SimST7789
+    from gui.core.gui import Display, Screen
+    from gui.widgets.rectwidget import RectWidget
+
+    Display(SimST7789(SPI(2, baudrate=40_000_000), 240, 240, dc=Pin(39, Pin.OUT), rotation=1))
+    screen = Screen(0x0000)
+    rect = RectWidget(10, 10, 50, 50, 0x001F)
+    screen.add(rect)
+
+    def frames():
+        for i in range(5):
+            rect.bgcolor = 0xF800 if i & 1 else 0x07E0
+            rect.invalidate()
+            screen.show()
+
+    out = captured(frames)
+    check("Screen.show prints nothing at INFO", out == "", repr(out[:80]))
+    trace.set_level(DEBUG_DBG | DEBUG_INFO | DEBUG_ERROR, CAT_GUI)
+    out = captured(frames)
+    check("Screen.show traces rects and costs at DBG", out.count("show rect") == 5 and "show cost" in out)
+    trace.set_level(DEBUG_INFO | DEBUG_ERROR)
+
+
+def bench():
+    trace.set_level(DEBUG_INFO | DEBUG_ERROR)
+    legacy_level = DEBUG_INFO | DEBUG_ERROR
+    n = 20000
+    r = (12, 34, 56, 78)
+
+    def old_dprint(level, *args):
+        if legacy_level & level:
+            prefixes = {DEBUG_ERROR: "[ERR]", DEBUG_INFO: "[INF]", DEBUG_DBG: "[DBG]"}
+            print(time.ticks_ms(), prefixes.get(level, "[DBG]"), *args)
+
+    t0 = time.perf_counter()
+    for _ in range(n):
+        old_dprint(DEBUG_DBG, f"Show dirty rect:{r[0]},{r[1]},{r[2]},{r[3]}")
+    old = (time.perf_counter() - t0) / n * 1e6
+    t0 = time.perf_counter()
+    for _ in range(n):
+        trace.log(CAT_GUI, DEBUG_DBG, "show rect", r[0], r[1], r[2], r[3])
+    new = (time.perf_counter() - t0) / n * 1e6
+    print("disabled trace call: eager f-string dprint {:.2f} us, log() {:.2f} us".format(old, new))
+    check("disabled log() is cheaper than the eager f-string", new < old)
+
+
+def main():
+    check_levels()
+    check_ring()
+    check_screen()
+    bench()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,12 @@ GAME_STOP = 'game_stop.wav'
 SET_FINISH = 'set_finish.wav'
 GAME_PINGPONG = 'pingpong.wav'
 
+WAV_DIR = 'res/wav/'
+
+# Clips used by score announcements; preloaded into the audio clip cache.
+SCORE_VOICE_FILES = ['0.wav', '1.wav', '2.wav', '3.wav', '4.wav', '5.wav',
+                     '6.wav', '7.wav', '8.wav', '9.wav', 'shi.wav', 'bi.wav']
+
 def number_to_voice_files(num):
     # 定义数字和单位对应的音频文件
     units = ['', 'shi.wav', 'bai.wav', 'qian.wav', 'wan.wav']
@@ -1,14 +1,185 @@
+"""
+Debug tracing by subsystem, with a binary ring log for crash dumps.
+
+    from utils import trace
+    from utils.trace import CAT_GUI, DEBUG_DBG
+
+    _TRACE = const(1)       # const(0) compiles the guarded calls out
+
+    if _TRACE:
+        trace.log(CAT_GUI, DEBUG_DBG, "show rect", r.x, r.y, r.w, r.h)
+
+log() checks the level before doing anything else and takes up to four
+fixed arguments, so a disabled call formats nothing and allocates
+nothing. Text is only built when the line is printed: pass values as
+arguments, not pre-formatted strings, or a callable returning the text
+for anything costly. on(cat, level) guards work that is only needed for
+a trace.
+
+MicroPython folds a module's own `_NAME = const(0)` into `if _NAME:` and
+drops the block at compile time. The constant does not fold across an
+import, so each hot module declares its own `_TRACE`.
+
+Every call at a level in `ring_levels` (errors and info by default) is
+also stored in a preallocated ring of RING_RECORDS records: ticks,
+category, level, message and the integer arguments. dump() prints it
+oldest first. crash() writes the exception and the ring to crash.log.
+
+dprint() is the older interface and logs under CAT_APP.
+"""
+
+import sys
 import time
+from array import array
 
 DEBUG_NONE = 0
 DEBUG_DBG = 1
 DEBUG_INFO = 2
 DEBUG_ERROR = 4
 
-DEBUG_LEVEL = DEBUG_ERROR | DEBUG_INFO | DEBUG_DBG
+CAT_APP = 0
+CAT_INPUT = 1
+CAT_GUI = 2
+CAT_AUDIO = 3
+CAT_NET = 4
+CAT_BLE = 5
+CAT_POWER = 6
+CAT_CONFIG = 7
+
+CAT_NAMES = ("app", "input", "gui", "audio", "net", "ble", "power", "config")
+_PREFIXES = ("", "[DBG]", "[INF]", "", "[ERR]")
+
+RING_RECORDS = 128
+_WORDS = 6          # ticks, cat | level << 8 | nargs << 12 | msg << 16, 4 args
+_MAX_MSGS = 512
+
+_NO = object()      # argument not given
+
+# Console level mask per category
+levels = bytearray([DEBUG_ERROR | DEBUG_INFO | DEBUG_DBG] * len(CAT_NAMES))
+ring_levels = DEBUG_ERROR | DEBUG_INFO
+
+_ring = array("i", bytes(4 * _WORDS * RING_RECORDS))
+_head = 0
+_count = 0
+_msgs = ["?"]
+_msg_ids = {"?": 0}
+
+
+def set_level(level, cat=None):
+    """Console level mask of one category, or of all of them."""
+    if cat is None:
+        for i in range(len(levels)):
+            levels[i] = level
+    else:
+        levels[cat] = level
+
+
+def on(cat, level):
+    """True if a log() at this category and level would do anything."""
+    return bool(levels[cat] & level or ring_levels & level)
+
+
+def log(cat, level, msg, a=_NO, b=_NO, c=_NO, d=_NO):
+    show = levels[cat] & level
+    if not show and not ring_levels & level:
+        return
+    if ring_levels & level:
+        _record(cat, level, msg, a, b, c, d)
+    if show:
+        if not isinstance(msg, str):
+            msg = msg()
+        if d is not _NO:
+            print(time.ticks_ms(), _PREFIXES[level], CAT_NAMES[cat] + ":", msg, a, b, c, d)
+        elif c is not _NO:
+            print(time.ticks_ms(), _PREFIXES[level], CAT_NAMES[cat] + ":", msg, a, b, c)
+        elif b is not _NO:
+            print(time.ticks_ms(), _PREFIXES[level], CAT_NAMES[cat] + ":", msg, a, b)
+        elif a is not _NO:
+            print(time.ticks_ms(), _PREFIXES[level], CAT_NAMES[cat] + ":", msg, a)
+        else:
+            print(time.ticks_ms(), _PREFIXES[level], CAT_NAMES[cat] + ":", msg)
+
 
 def dprint(level, *args):
-    if DEBUG_LEVEL & level:
-        prefixes = {DEBUG_ERROR: "[ERR]", DEBUG_INFO: "[INF]", DEBUG_DBG: "[DBG]"}
-        timestamp = time.ticks_ms()
-        print(timestamp, prefixes.get(level, "[DBG]"), *args)
\ No newline at end of file
+    if levels[CAT_APP] & level:
+        print(time.ticks_ms(), _PREFIXES[level] if level < len(_PREFIXES) else "[DBG]", *args)
+
+
+# ---------- ring ----------
+def _int(v):
+    if isinstance(v, int) and -0x80000000 <= v <= 0x7FFFFFFF:
+        return v
+    return 0
+
+
+def _record(cat, level, msg, a, b, c, d):
+    global _head, _count
+    if not isinstance(msg, str):
+        msg = "(lazy)"
+    mid = _msg_ids.get(msg)
+    if mid is None:
+        mid = 0
+        if len(_msgs) < _MAX_MSGS:
+            mid = len(_msgs)
+            _msgs.append(msg)
+            _msg_ids[msg] = mid
+    nargs = 4 if d is not _NO else 3 if c is not _NO else 2 if b is not _NO else 1 if a is not _NO else 0
+    i = _head * _WORDS
+    r = _ring
+    r[i] = time.ticks_ms() & 0x3FFFFFFF
+    r[i + 1] = cat | level << 8 | nargs << 12 | mid << 16
+    r[i + 2] = _int(a) if nargs > 0 else 0
+    r[i + 3] = _int(b) if nargs > 1 else 0
+    r[i + 4] = _int(c) if nargs > 2 else 0
+    r[i + 5] = _int(d) if nargs > 3 else 0
+    _head = (_head + 1) % RING_RECORDS
+    if _count < RING_RECORDS:
+        _count += 1
+
+
+def records():
+    """The ring, oldest first, as (ticks, cat name, level, msg, args)."""
+    out = []
+    start = (_head - _count) % RING_RECORDS
+    for k in range(_count):
+        i = ((start + k) % RING_RECORDS) * _WORDS
+        w = _ring[i + 1]
+        nargs = (w >> 12) & 0xF
+        mid = (w >> 16) & 0xFFFF
+        out.append((_ring[i], CAT_NAMES[w & 0xFF], (w >> 8) & 0xF,
+                    _msgs[mid] if mid < len(_msgs) else "?", tuple(_ring[i + 2:i + 2 + nargs])))
+    return out
+
+
+def dump(f=None):
+    """Write the ring, oldest first, to a file object (default: console)."""
+    for t, cat, level, msg, args in records():
+        line = "{} {} {}: {} {}\n".format(t, _PREFIXES[level] if level < len(_PREFIXES) else "[?]",
+                                         cat, msg, " ".join(str(a) for a in args))
+        if f is None:
+            print(line, end="")
+        else:
+            f.write(line)
+
+
+def clear():
+    global _head, _count
+    _head = 0
+    _count = 0
+
+
+def crash(e, path="crash.log"):
+    """Save the exception and the ring to `path`."""
+    try:
+        with open(path, "w") as f:
+            pe = getattr(sys, "print_exception", None)
+            if pe is not None:
+                pe(e, f)
+            else:
+                f.write("{}: {}\n".format(type(e).__name__, e))
+            f.write("--- trace ring ---\n")
+            dump(f)
+        print("[trace] crash saved to", path)
+    except Exception as e2:
+        print("[trace] crash dump error:", e2)